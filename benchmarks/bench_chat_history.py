@@ -0,0 +1,154 @@
+"""Chat insert latency and memory after many messages, bounded vs unbounded.
+
+Appends a long synthetic conversation to the append-only chat history and
+reports append throughput, search and export time and the memory of its
+offsets index next to the old in-memory list. With a display it also
+feeds the same messages to a ScrolledText twice, once through the bounded
+ChatView and once inserting everything like the old chat, and reports
+insert latency over the last messages and resident memory growth. Without
+a display the UI part is skipped.
+
+Usage:
+    python benchmarks/bench_chat_history.py --messages 10000 --window 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary
+
+from chat_history import ChatHistory, format_message
+
+WORDS = ("dose", "patient", "infusion", "renal", "contraindicated", "monitor", "weekly", "adverse",
+         "hepatic", "titrate", "baseline", "interaction", "pediatric", "clearance", "tablet", "guideline")
+
+
+def conversation(count, seed):
+    """(text, tag, label, fields) tuples alternating questions and long answers"""
+    rng = random.Random(seed)
+    messages = []
+    while len(messages) < count:
+        query = " ".join(rng.choices(WORDS, k=rng.randint(5, 14))) + "?"
+        answer = "\n".join(" ".join(rng.choices(WORDS, k=rng.randint(20, 60))) for _ in range(rng.randint(2, 6)))
+        messages.append((query, "user", "You", {}))
+        messages.append((answer, "assistant", "Assistant", {'query': query}))
+    return messages[:count]
+
+
+def resident_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def measure_ui(messages, workdir, window, tail):
+    """Latency and memory of adding messages to the chat, bounded and unbounded
+
+    Bounded is the app's add_to_chat: save to the history, then show it in
+    the view. Unbounded inserts into the widget like the old chat did.
+    """
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from chat_view import ChatView
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"⚠️ No display, skipping the chat widget ({e})")
+        return {}
+    root.geometry("900x600")
+    metrics = {}
+    for mode in ("bounded", "unbounded"):
+        text = scrolledtext.ScrolledText(root, wrap=tk.WORD, state=tk.DISABLED)
+        text.pack(fill=tk.BOTH, expand=True)
+        history = ChatHistory(os.path.join(workdir, f"{mode}.jsonl"))
+        view = ChatView(text, history, window=window)
+        root.update()
+        before = resident_mb()
+        timings = []
+        for message_text, tag, label, fields in messages:
+            start = time.perf_counter()
+            if mode == "bounded":
+                view.append(history.append(message_text, tag, label=label, **fields))
+            else:
+                message = {'time': "2026-01-01T12:00:00", 'label': label, 'text': message_text}
+                text.config(state=tk.NORMAL)
+                text.insert(tk.END, format_message(message) + "\n\n", tag)
+                text.config(state=tk.DISABLED)
+                text.see(tk.END)
+            # Layout and redraw are where a growing widget gets slow.
+            root.update_idletasks()
+            timings.append(time.perf_counter() - start)
+        metrics.update(latency_summary(f"{mode}.insert_last{tail}", timings[-tail:]))
+        metrics[f"{mode}.widget_lines"] = int(text.index("end-1c").split(".")[0])
+        metrics[f"{mode}.memory_growth_mb"] = resident_mb() - before
+        text.destroy()
+        history.close()
+    root.destroy()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000, help="Messages in the conversation.")
+    parser.add_argument("--window", type=int, default=200, help="Messages the bounded view keeps rendered.")
+    parser.add_argument("--tail", type=int, default=500, help="Last inserts the latency is reported over.")
+    parser.add_argument("--searches", type=int, default=20, help="Searches timed.")
+    parser.add_argument("--no-ui", action="store_true", help="Skip the chat widget even with a display.")
+    add_common_arguments(parser, "benchmarks/results/chat_history.json")
+    args = parser.parse_args()
+
+    messages = conversation(args.messages, args.seed)
+    metrics = {"messages": len(messages)}
+    with tempfile.TemporaryDirectory(prefix="rag_chat_") as workdir:
+        path = os.path.join(workdir, "chat_history.jsonl")
+        history = ChatHistory(path)
+        appends = []
+        for text, tag, label, fields in messages:
+            start = time.perf_counter()
+            history.append(text, tag, label=label, **fields)
+            appends.append(time.perf_counter() - start)
+        history.close()
+        metrics["history.append_per_sec"] = len(appends) / sum(appends)
+        metrics.update(latency_summary("history.append", appends))
+        metrics["history.file_mb"] = os.path.getsize(path) / (1024 * 1024)
+
+        with Stage(trace_memory=True) as stage:
+            history = ChatHistory(path)
+        metrics["history.open_seconds"] = stage.seconds
+        metrics["history.index_mb"] = stage.peak_mb
+        # What the old chat kept in memory for the whole session.
+        with Stage(trace_memory=True) as stage:
+            in_memory = [{'timestamp': message['time'], 'query': message['query'], 'response': message['text']}
+                         for message in history.iter_messages() if 'query' in message]
+        metrics["list.memory_mb"] = stage.peak_mb
+        del in_memory
+
+        rng = random.Random(args.seed)
+        searches = []
+        for _ in range(args.searches):
+            needle = " ".join(rng.choices(WORDS, k=2))
+            start = time.perf_counter()
+            history.search(needle)
+            searches.append(time.perf_counter() - start)
+        metrics.update(latency_summary("history.search", searches))
+
+        with Stage() as stage:
+            exported = history.export(os.path.join(workdir, "export.json"))
+        metrics["history.export_seconds"] = stage.seconds
+        metrics["history.exported"] = exported
+
+        if not args.no_ui:
+            metrics.update(measure_ui(messages, workdir, args.window, min(args.tail, len(messages))))
+        history.close()
+
+    return finish(build_report("chat_history", vars(args), metrics), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
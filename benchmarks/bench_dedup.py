@@ -0,0 +1,124 @@
+"""Index size, build time and result diversity with near-duplicate collapsing.
+
+Builds the same redundant corpus (a disclaimer page on every document and
+lightly edited second revisions of some documents) with deduplication off
+and at each threshold, and reports embeddings computed, storage on disk,
+build time, the time to then ingest one more document, query latency and
+how many of the top-k chunks are distinct.
+
+Also checks that a dosing table whose numbers changed between revisions is
+never collapsed at any threshold, and exits with status 1 if it is.
+
+Usage:
+    python benchmarks/bench_dedup.py --thresholds 1.0 0.85 0.7 --revisions 0.25
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from langchain.schema.document import Document
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+from dedup import collapse_near_duplicates
+from fakes import FakeEmbeddings
+from shards import release_shards, search_shards, shard_path
+from synthetic import duplicated_documents, sample_questions
+
+
+# Renal dosing rows of two revisions, identical apart from the dose and interval.
+DOSING_TABLE = ("Renal dose adjustment | Creatinine clearance 30 to 50 mL/min | Vancomycin | {dose} mg "
+                "every {hours} hours | Monitor trough levels before the fourth dose and adjust the interval "
+                "if the trough exceeds 20 mg/L | Reassess renal function every 48 hours during therapy")
+
+
+def changed_numbers_collapsed(threshold):
+    """Whether a revised dose is collapsed into the old one at this threshold"""
+    chunks = [Document(page_content=DOSING_TABLE.format(dose=500, hours=12), metadata={'id': "old.pdf:3:0"}),
+              Document(page_content=DOSING_TABLE.format(dose=750, hours=8), metadata={'id': "new.pdf:3:0"})]
+    kept, _merged, _report = collapse_near_duplicates(chunks, threshold)
+    return len(kept) < len(chunks)
+
+
+def directory_mb(path):
+    total = 0
+    for folder, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=48, help="Documents in the corpus.")
+    parser.add_argument("--pages", type=int, default=6, help="Pages per document.")
+    parser.add_argument("--revisions", type=float, default=0.25, help="Share of documents with a second revision.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[1.0, 0.85, 0.7],
+                        help="Dedup thresholds to compare with no dedup.")
+    parser.add_argument("--queries", type=int, default=30, help="Queries timed per configuration.")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    add_common_arguments(parser, "benchmarks/results/dedup.json")
+    args = parser.parse_args()
+
+    documents = duplicated_documents(args.documents, args.pages, seed=args.seed, revisions=args.revisions)
+    # Ingested on its own after the build, like the watcher does with a new file.
+    extra = [doc for doc in documents if doc.metadata['source'] == documents[0].metadata['source']]
+    extra = [Document(page_content=doc.page_content, metadata={**doc.metadata, 'source': "extra.pdf"})
+             for doc in extra]
+    questions = sample_questions(args.queries, seed=args.seed)
+    metrics = {}
+
+    for threshold in [None] + args.thresholds:
+        name = "no_dedup" if threshold is None else f"threshold_{threshold:g}"
+        print(f"⏱️ {name}...")
+        embeddings = FakeEmbeddings()
+        with tempfile.TemporaryDirectory(prefix="rag_dedup_") as root:
+            # add_to_chroma writes IDs and duplicate lists into the chunk metadata.
+            chunks = database.split_documents([Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+                                               for doc in documents])
+            with quiet(), Stage() as build:
+                database.add_to_chroma(chunks, chroma_path=shard_path("bench", root), embeddings=embeddings,
+                                       dedup_threshold=threshold)
+            size = directory_mb(root)
+            embedded = embeddings.texts_embedded
+
+            with quiet(), Stage() as incremental:
+                database.add_to_chroma(database.split_documents(extra), chroma_path=shard_path("bench", root),
+                                       embeddings=embeddings, dedup_threshold=threshold)
+
+            search_shards(questions[0], embeddings, k=args.k, shards=["bench"], root=root)
+            timings, distinct = [], []
+            for question in questions:
+                with Stage() as query:
+                    results = search_shards(question, embeddings, k=args.k, shards=["bench"], root=root)
+                timings.append(query.seconds)
+                distinct.append(len({doc.page_content for doc, _score in results}) / max(1, len(results)))
+            release_shards()
+
+        metrics[f"{name}.chunks"] = len(chunks)
+        metrics[f"{name}.embeddings"] = embedded
+        metrics[f"{name}.store_mb"] = size
+        metrics[f"{name}.build_seconds"] = build.seconds
+        metrics[f"{name}.incremental_add_seconds"] = incremental.seconds
+        metrics[f"{name}.distinct_top_k_ratio"] = sum(distinct) / len(distinct)
+        metrics.update({f"{name}.{key}": value for key, value in latency_summary("query", timings).items()})
+        if threshold is not None:
+            metrics[f"{name}.embeddings_saved_ratio"] = 1 - embedded / metrics["no_dedup.embeddings"]
+            metrics[f"{name}.storage_saved_ratio"] = 1 - size / metrics["no_dedup.store_mb"]
+
+    collapsed = [threshold for threshold in [database.DEDUP_THRESHOLD] + args.thresholds
+                 if changed_numbers_collapsed(threshold)]
+    metrics["changed_numbers_kept"] = not collapsed
+
+    report = build_report("dedup", vars(args), metrics)
+    status = finish(report, args)
+    if collapsed:
+        print(f"❌ A changed dose was collapsed into the old one at threshold(s) {collapsed}")
+        return 1
+    print("✅ Chunks with changed numbers were kept apart at every threshold")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
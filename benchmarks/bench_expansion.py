@@ -0,0 +1,89 @@
+"""Cost and effect of multi-query expansion.
+
+Each question is retrieved once as-is and once with reformulations fused by
+reciprocal rank. Fake embeddings charge a fixed latency per call, like a
+network round trip, so batching the reformulations into one call shows up.
+For every question the report lists the latency overhead, the unique
+candidates seen and how much of the fused top-k the plain search also found.
+
+Usage:
+    python benchmarks/bench_expansion.py --expand 3 --embed-latency 0.15
+"""
+import argparse
+import sys
+import tempfile
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+import rag_system
+from fakes import FakeEmbeddings, FakeLLM
+from shards import shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=64, help="Documents in the corpus.")
+    parser.add_argument("--shards", type=int, default=2, help="Shards the corpus is split over.")
+    parser.add_argument("--queries", type=int, default=20, help="Questions retrieved.")
+    parser.add_argument("--expand", type=int, default=3, help="Reformulations per question.")
+    parser.add_argument("--mode", choices=["template", "llm"], default="template", help="How to reformulate.")
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="Fake embedding call latency.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM latency, for --mode llm.")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per question.")
+    add_common_arguments(parser, "benchmarks/results/expansion.json")
+    args = parser.parse_args()
+
+    questions = sample_questions(args.queries, seed=args.seed)
+    llm = FakeLLM(latency=args.llm_latency)
+
+    with tempfile.TemporaryDirectory(prefix="rag_expansion_") as root:
+        with quiet():
+            chunks = database.split_documents(synthetic_documents(args.documents, 4, seed=args.seed))
+            for index in range(args.shards):
+                database.add_to_chroma(chunks[index::args.shards], chroma_path=shard_path(f"s{index}", root),
+                                       embeddings=FakeEmbeddings())
+        embeddings = FakeEmbeddings(latency=args.embed_latency)
+        rag_system.retrieve(questions[0], chroma_path=root, embeddings=embeddings)
+
+        single_times, expanded_times, per_query = [], [], []
+        for question in questions:
+            with Stage() as single:
+                rag_system.retrieve(question, k=args.k, chroma_path=root, embeddings=embeddings)
+            stats = {}
+            calls_before = embeddings.calls
+            with Stage() as expanded:
+                rag_system.retrieve(question, k=args.k, chroma_path=root, embeddings=embeddings,
+                                    expand=args.expand, expand_mode=args.mode, llm=llm, stats=stats)
+            single_times.append(single.seconds)
+            expanded_times.append(expanded.seconds)
+            per_query.append({
+                "question": question,
+                "queries": len(stats["queries"]),
+                "embedding_calls": embeddings.calls - calls_before,
+                "candidates": stats["candidates"],
+                "overlap": round(stats["overlap"], 3),
+                "overhead_ms": round((expanded.seconds - single.seconds) * 1000, 2),
+            })
+
+    for row in per_query:
+        print(f"{row['overhead_ms']:>8.1f} ms overhead  {row['candidates']:>3} candidates  "
+              f"{row['overlap']:>5.0%} overlap  {row['question']}")
+
+    metrics = {}
+    metrics.update(latency_summary("single_query", single_times))
+    metrics.update(latency_summary("expanded_query", expanded_times))
+    metrics["overhead_ms"] = sum(row["overhead_ms"] for row in per_query) / len(per_query)
+    metrics["expanded_to_single_cost"] = sum(expanded_times) / sum(single_times)
+    metrics["overlap_mean"] = sum(row["overlap"] for row in per_query) / len(per_query)
+    metrics["candidates_per_query"] = sum(row["candidates"] for row in per_query) / len(per_query)
+    metrics["embedding_calls_per_query"] = sum(row["embedding_calls"] for row in per_query) / len(per_query)
+
+    report = build_report("expansion", vars(args), metrics)
+    report["queries"] = per_query
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
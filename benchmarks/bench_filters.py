@@ -0,0 +1,78 @@
+"""Filtered against unfiltered retrieval.
+
+Times the same questions with no filter and with each kind of metadata
+filter, and reports how much each one shrinks the searchable chunks and the
+context that would be sent to the LLM.
+
+Usage:
+    python benchmarks/bench_filters.py --documents 64
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+from fakes import FakeEmbeddings
+from filters import build_where
+from shards import open_shard, search_shards, shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=64, help="Documents in the corpus.")
+    parser.add_argument("--pages", type=int, default=8, help="Pages per document.")
+    parser.add_argument("--queries", type=int, default=30, help="Queries timed per filter.")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    add_common_arguments(parser, "benchmarks/results/filters.json")
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.documents, args.pages, seed=args.seed)
+    for doc in documents:
+        doc.metadata['filename'] = os.path.basename(doc.metadata['source'])
+    first_file = documents[0].metadata['filename']
+
+    variants = {
+        "unfiltered": None,
+        "one_document": build_where(filenames=[first_file]),
+        "page_range": build_where(page_range=(1, 2)),
+        "tables_only": build_where(tables_only=True),
+        "combined": build_where(filenames=[first_file], page_range=(1, 4), tables_only=True),
+    }
+
+    questions = sample_questions(args.queries, seed=args.seed)
+    embeddings = FakeEmbeddings()
+    metrics = {}
+
+    with tempfile.TemporaryDirectory(prefix="rag_filters_") as root:
+        with quiet():
+            chunks = database.split_documents(documents)
+            database.add_to_chroma(chunks, chroma_path=shard_path("bench", root), embeddings=embeddings)
+        db = open_shard("bench", embeddings, root)
+        search_shards(questions[0], embeddings, k=args.k, shards=["bench"], root=root)
+
+        for name, where in variants.items():
+            matching = len(db.get(where=where, include=[])["ids"])
+            timings = []
+            context_chars = []
+            for question in questions:
+                with Stage() as query:
+                    results = search_shards(question, embeddings, k=args.k, shards=["bench"],
+                                            root=root, where=where)
+                timings.append(query.seconds)
+                context_chars.append(sum(len(doc.page_content) for doc, _score in results))
+
+            metrics.update({f"{name}.{key}": value for key, value in latency_summary("query", timings).items()})
+            metrics[f"{name}.searchable_chunks"] = matching
+            metrics[f"{name}.search_space_fraction"] = matching / len(chunks)
+            metrics[f"{name}.mean_context_chars"] = sum(context_chars) / len(context_chars)
+
+    report = build_report("filters", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Query latency and recall@k before and after tuning the HNSW index.
+
+Builds a Chroma shard from a synthetic corpus with Chroma's default index
+settings, runs the tuner on its stored embeddings plus one set of
+questions, applies the chosen settings and measures both indexes on a
+separate set of questions against an exact brute-force search. The latency versus recall curves of every swept
+setting are written to the report under "curves".
+
+Usage:
+    python benchmarks/bench_index_tuning.py --documents 256
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+import index_tuning
+from expansion import embed_queries
+from fakes import FakeEmbeddings
+from shards import release_shards, search_shards, shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def time_queries(questions, truth, embeddings, k, root):
+    """Per-query timings and the recall@k against the exact distances"""
+    timings, found = [], []
+    for question in questions:
+        with Stage() as query:
+            results = search_shards(question, embeddings, k=k, shards=["bench"], root=root)
+        timings.append(query.seconds)
+        found.append([distance for _doc, distance in results])
+    return timings, index_tuning.recall_at_k(found, truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=256, help="Documents in the corpus.")
+    parser.add_argument("--pages", type=int, default=8, help="Pages per document.")
+    parser.add_argument("--queries", type=int, default=100, help="Questions timed per index.")
+    parser.add_argument("--sample", type=int, default=index_tuning.TUNING_SAMPLE, help="Held-out tuning queries.")
+    parser.add_argument("--target-recall", type=float, default=index_tuning.TARGET_RECALL)
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    add_common_arguments(parser, "benchmarks/results/index_tuning.json")
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.documents, args.pages, seed=args.seed)
+    questions = sample_questions(args.queries, seed=args.seed)
+    embeddings = FakeEmbeddings()
+    metrics = {}
+
+    with tempfile.TemporaryDirectory(prefix="rag_tuning_bench_") as workdir:
+        root = os.path.join(workdir, "chroma")
+        config_path = os.path.join(workdir, "index_config.json")
+        index_tuning.INDEX_CONFIG_PATH = config_path
+
+        with quiet():
+            chunks = database.split_documents(documents)
+            database.add_to_chroma(chunks, chroma_path=shard_path("bench", root), embeddings=embeddings)
+
+        vectors = index_tuning.stored_vectors(["bench"], root)
+        queries = np.asarray(embed_queries(embeddings, questions), dtype=np.float32)
+        _indices, truth = index_tuning.exact_neighbors(vectors, queries, args.k)
+
+        for name in ("default", "tuned"):
+            if name == "tuned":
+                with quiet(), Stage() as tuning:
+                    tuning_questions = sample_questions(args.queries, seed=args.seed + 1)
+                    config = index_tuning.tune_index(shards=["bench"], root=root, k=args.k, sample=args.sample,
+                                                     target_recall=args.target_recall, seed=args.seed,
+                                                     question_vectors=embed_queries(embeddings, tuning_questions))
+                    index_tuning.apply_index_config(config, root=root)
+                metrics["tuning_seconds"] = tuning.seconds
+            release_shards()
+            search_shards(questions[0], embeddings, k=args.k, shards=["bench"], root=root)
+            timings, recall = time_queries(questions, truth, embeddings, args.k, root)
+            metrics[f"{name}.top_k_recall"] = recall
+            metrics.update({f"{name}.{key}": value for key, value in latency_summary("query", timings).items()})
+        release_shards()
+
+    metrics["chunks"] = len(vectors)
+    report = build_report("index_tuning", vars(args), metrics)
+    report["chosen"] = {key: config[key] for key in index_tuning.DEFAULT_INDEX_CONFIG}
+    report["pareto"] = config["tuning"]["pareto"]
+    report["curves"] = config["tuning"]["curves"]
+    for curve in config["tuning"]["curves"]:
+        print(index_tuning.format_curve(curve, args.k))
+    print(f"Chosen: {report['chosen']}")
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
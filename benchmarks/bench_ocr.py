@@ -0,0 +1,81 @@
+"""OCR throughput and cache effectiveness on a synthetic scanned corpus.
+
+The corpus mixes image-only (scanned) pages with normal text pages. Each PDF
+is passed through ocr.ocr_document twice: the first pass OCRs every scanned
+page, the second should be served entirely from the page-image cache. A copy
+of one PDF is included to show identical pages are never OCR'd twice.
+
+The default engine is a fake that sleeps per page so the numbers don't depend
+on Tesseract being installed; use --engine tesseract for the real thing.
+
+Usage:
+    python benchmarks/bench_ocr.py --documents 8 --pages 6 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from functools import partial
+
+from harness import Stage, add_common_arguments, build_report, finish, quiet
+
+import ocr
+from fakes import fake_ocr
+from synthetic import generate_scanned_pdf
+
+
+def run_pass(paths, engine, cache_path):
+    stats = {}
+    with quiet(), Stage() as stage:
+        for path in paths:
+            ocr.ocr_document(path, engine=engine, cache_path=cache_path, stats=stats)
+    return stage.seconds, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=8, help="Scanned PDFs in the corpus.")
+    parser.add_argument("--pages", type=int, default=6, help="Pages per PDF.")
+    parser.add_argument("--scanned-every", type=int, default=2, help="Every Nth page is an image-only scan.")
+    parser.add_argument("--workers", type=int, default=ocr.OCR_WORKERS, help="OCR worker processes.")
+    parser.add_argument("--engine", choices=["fake", "tesseract"], default="fake")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Seconds per page for the fake engine.")
+    add_common_arguments(parser, "benchmarks/results/ocr.json")
+    args = parser.parse_args()
+
+    ocr.OCR_WORKERS = args.workers
+    engine = ocr.tesseract_ocr if args.engine == "tesseract" else partial(fake_ocr, latency=args.fake_latency)
+
+    with tempfile.TemporaryDirectory(prefix="rag_ocr_") as workdir:
+        paths = []
+        for index in range(args.documents):
+            path = os.path.join(workdir, f"scanned_{index:04d}.pdf")
+            paths.append(generate_scanned_pdf(path, pages=args.pages, seed=args.seed * 1000 + index,
+                                              scanned_every=args.scanned_every))
+        duplicate = os.path.join(workdir, "scanned_copy.pdf")
+        shutil.copy(paths[0], duplicate)
+        paths.append(duplicate)
+
+        cache_path = os.path.join(workdir, "ocr_cache")
+        # Start the worker processes before timing anything.
+        ocr._get_pool().submit(int).result()
+
+        cold_seconds, cold = run_pass(paths, engine, cache_path)
+        warm_seconds, warm = run_pass(paths, engine, cache_path)
+
+    metrics = {
+        "scanned_pages": cold["pages"],
+        "cold.ocr_runs": cold["ocr_runs"],
+        "cold.pages_per_sec": cold["pages"] / cold_seconds,
+        "cold.cache_hit_ratio": cold["cache_hits"] / cold["pages"] if cold["pages"] else 0.0,
+        "warm.pages_per_sec": warm["pages"] / warm_seconds,
+        "warm.cache_hit_ratio": warm["cache_hits"] / warm["pages"] if warm["pages"] else 0.0,
+        "warm.ocr_runs": warm["ocr_runs"],
+    }
+    report = build_report("ocr", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
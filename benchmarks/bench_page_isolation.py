@@ -0,0 +1,91 @@
+"""Ingest time with pathological pages, isolated in supervised page workers.
+
+Loads a synthetic corpus through database.load_documents twice: once clean
+and once with faults injected into a few pages (a hang, a hard crash, a
+runaway allocation and an exception). Every faulty page must fall back on
+its own and be listed in the quarantine report, while all other pages keep
+their full extraction. Exits with status 1 if that isn't the case.
+
+Usage:
+    python benchmarks/bench_page_isolation.py --documents 8 --pages 6 --timeout 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+from functools import partial
+
+from harness import Stage, add_common_arguments, build_report, finish, quiet
+
+import database
+import page_extraction
+from fakes import faulty_extract
+from synthetic import generate_corpus
+
+FAULTS = ("hang", "crash", "memory", "error")
+
+
+def load(folder, extractor):
+    page_extraction.PAGE_EXTRACTOR = extractor
+    with quiet(), Stage() as stage:
+        documents = database.load_documents(folder)
+    return documents, stage.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=8, help="PDFs in the corpus.")
+    parser.add_argument("--pages", type=int, default=6, help="Pages per PDF.")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Seconds allowed per page.")
+    parser.add_argument("--memory-limit", type=int, default=512, help="Worker memory headroom in MB.")
+    parser.add_argument("--workers", type=int, default=page_extraction.PAGE_WORKERS, help="Page worker processes.")
+    add_common_arguments(parser, "benchmarks/results/page_isolation.json")
+    args = parser.parse_args()
+
+    page_extraction.PAGE_TIMEOUT_SECONDS = args.timeout
+    page_extraction.PAGE_MEMORY_LIMIT_MB = args.memory_limit
+    page_extraction.PAGE_WORKERS = args.workers
+
+    with tempfile.TemporaryDirectory(prefix="rag_pages_") as workdir:
+        folder = os.path.join(workdir, "content")
+        paths = generate_corpus(folder, args.documents, args.pages, seed=args.seed)
+        database.IMAGES_PATH = os.path.join(workdir, "images")
+        page_extraction.QUARANTINE_PATH = os.path.join(workdir, "quarantine.json")
+
+        # One fault per file on the first few files, on a page in the middle.
+        faults = {(os.path.basename(path), args.pages // 2): fault for path, fault in zip(paths, FAULTS)}
+        clean, clean_seconds = load(folder, page_extraction.extract_page)
+        faulty, faulty_seconds = load(folder, partial(faulty_extract, faults=faults))
+        quarantine = page_extraction.load_quarantine()
+
+    expected = set(faults)
+    fell_back = {(doc.metadata['filename'], doc.metadata['page']) for doc in faulty
+                 if doc.metadata.get('extraction') != 'full'}
+    quarantined = {(os.path.basename(path), failure['page'])
+                   for path, entry in quarantine.items() for failure in entry['pages']}
+    reasons = sorted(failure['reason'] for entry in quarantine.values() for failure in entry['pages'])
+
+    metrics = {
+        "pages": len(clean),
+        "clean.load_seconds": clean_seconds,
+        "clean.pages_per_sec": len(clean) / clean_seconds,
+        "faulty.load_seconds": faulty_seconds,
+        "faulty.pages_per_sec": len(faulty) / faulty_seconds,
+        "faulty.fallback_pages": len(fell_back),
+        "faulty.quarantined_files": len(quarantine),
+        "isolated": fell_back == expected and quarantined == expected and len(faulty) == len(clean),
+    }
+    report = build_report("page_isolation", vars(args), metrics)
+    report["quarantine_reasons"] = reasons
+    print(f"Quarantined: {reasons}")
+    status = finish(report, args)
+    if not metrics["isolated"]:
+        print(f"❌ Expected fallbacks on {sorted(expected)}, got {sorted(fell_back)}; "
+              f"quarantined {sorted(quarantined)}")
+        return 1
+    print("✅ Every faulty page fell back on its own")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
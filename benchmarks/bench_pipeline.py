@@ -0,0 +1,87 @@
+"""Ingestion and query throughput on synthetic corpora of increasing size.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 2 8 32 --output benchmarks/results/pipeline.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/results/pipeline.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from harness import (Stage, add_common_arguments, build_report, finish, latency_summary,
+                     peak_rss_mb, quiet)
+
+import database
+import rag_system
+from shards import DEFAULT_SHARD, shard_path
+from fakes import FakeEmbeddings, FakeLLM
+from synthetic import generate_corpus, sample_questions
+
+
+def run_size(documents, pages, queries, seed, trace_memory):
+    metrics = {}
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as workdir:
+        content_path = os.path.join(workdir, "content")
+        chroma_path = os.path.join(workdir, "chroma")
+        database.IMAGES_PATH = os.path.join(workdir, "images")
+        generate_corpus(content_path, documents=documents, pages=pages, seed=seed)
+
+        embeddings = FakeEmbeddings()
+        llm = FakeLLM()
+
+        with quiet(), Stage(trace_memory) as load:
+            loaded = database.load_documents(content_path)
+        with quiet(), Stage(trace_memory) as split:
+            chunks = database.split_documents(loaded)
+        with quiet(), Stage(trace_memory) as insert:
+            database.add_to_chroma(chunks, chroma_path=shard_path(DEFAULT_SHARD, chroma_path),
+                                   embeddings=embeddings)
+
+        timings = []
+        with quiet():
+            for question in sample_questions(queries, seed=seed):
+                with Stage() as query:
+                    rag_system.query_rag(question, chroma_path=chroma_path,
+                                         embeddings=embeddings, llm=llm)
+                timings.append(query.seconds)
+
+        metrics["pages"] = len(loaded)
+        metrics["chunks"] = len(chunks)
+        metrics["load_pages_per_sec"] = len(loaded) / load.seconds
+        metrics["split_chunks_per_sec"] = len(chunks) / split.seconds
+        metrics["add_inserts_per_sec"] = len(chunks) / insert.seconds
+        metrics.update(latency_summary("query", timings))
+        for name, stage in (("load", load), ("split", split), ("add", insert)):
+            if stage.peak_mb is not None:
+                metrics[f"{name}_peak_mb"] = stage.peak_mb
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 8, 32],
+                        help="Corpus sizes, in documents.")
+    parser.add_argument("--pages", type=int, default=4, help="Pages per synthetic document.")
+    parser.add_argument("--queries", type=int, default=20, help="Queries timed per corpus size.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record per-stage Python peak memory with tracemalloc (slows the run).")
+    add_common_arguments(parser, "benchmarks/results/pipeline.json")
+    args = parser.parse_args()
+
+    # One throwaway pass so Chroma and pdfplumber start-up cost isn't charged to the first size.
+    run_size(1, 1, 1, args.seed, trace_memory=False)
+
+    metrics = {}
+    for size in args.sizes:
+        print(f"⏱️ Benchmarking {size} document(s) x {args.pages} page(s)...")
+        for name, value in run_size(size, args.pages, args.queries, args.seed, args.trace_memory).items():
+            metrics[f"docs_{size}.{name}"] = value
+    metrics["process_peak_rss_mb"] = peak_rss_mb()
+
+    report = build_report("pipeline", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Throughput, ordering and cancellation of the shared query engine.
+
+Submits a burst of questions at several worker counts, with fake embeddings
+and a streaming fake LLM that have network-like latency. Reports questions
+per second, whether answers were delivered in the order asked, how long
+Stop takes to settle a full queue, and how many questions a full queue
+turns away.
+
+Usage:
+    python benchmarks/bench_query_engine.py --workers 1 2 4 --queries 16
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+
+from harness import Stage, add_common_arguments, build_report, finish, quiet
+
+import database
+from fakes import FakeEmbeddings, FakeLLM
+from query_engine import QueryEngine, QueryQueueFull
+from shards import shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def run_burst(questions, workers, root, embeddings, llm):
+    delivered = []
+    engine = QueryEngine(workers=workers, max_pending=len(questions), on_done=delivered.append,
+                         chroma_path=root, embeddings=embeddings, llm=llm)
+    with Stage() as burst:
+        jobs = [engine.submit(question) for question in questions]
+        for job in jobs:
+            job.wait()
+    engine.shutdown(wait=True)
+
+    in_order = [job.id for job in delivered] == sorted(job.id for job in delivered)
+    done = sum(job.status == 'done' for job in delivered)
+    return burst.seconds, in_order, done
+
+
+def run_stop(questions, workers, root, embeddings, llm, after):
+    """Submit a burst, press Stop after `after` seconds, time until everything is delivered"""
+    engine = QueryEngine(workers=workers, max_pending=len(questions), chroma_path=root,
+                         embeddings=embeddings, llm=llm)
+    jobs = [engine.submit(question) for question in questions]
+    time.sleep(after)
+    with Stage() as stop:
+        engine.cancel_all()
+        for job in jobs:
+            job.wait()
+    engine.shutdown(wait=True)
+    return stop.seconds, sum(job.status == 'cancelled' for job in jobs)
+
+
+def run_overflow(questions, root, embeddings, llm, max_pending):
+    engine = QueryEngine(workers=1, max_pending=max_pending, chroma_path=root, embeddings=embeddings, llm=llm)
+    accepted = []
+    for question in questions:
+        try:
+            accepted.append(engine.submit(question))
+        except QueryQueueFull:
+            pass
+    engine.cancel_all()
+    for job in accepted:
+        job.wait()
+    engine.shutdown(wait=True)
+    return engine.stats['rejected']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to test.")
+    parser.add_argument("--queries", type=int, default=16, help="Questions per burst.")
+    parser.add_argument("--documents", type=int, default=32, help="Documents in the corpus.")
+    parser.add_argument("--embed-latency", type=float, default=0.1, help="Fake embedding call latency.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM latency, spread over the stream.")
+    parser.add_argument("--max-pending", type=int, default=4, help="Queue bound for the overflow test.")
+    add_common_arguments(parser, "benchmarks/results/query_engine.json")
+    args = parser.parse_args()
+
+    questions = sample_questions(args.queries, seed=args.seed)
+    llm = FakeLLM(latency=args.llm_latency)
+    metrics = {}
+
+    with tempfile.TemporaryDirectory(prefix="rag_query_engine_") as root:
+        with quiet():
+            chunks = database.split_documents(synthetic_documents(args.documents, 4, seed=args.seed))
+            database.add_to_chroma(chunks, chroma_path=shard_path("default", root), embeddings=FakeEmbeddings())
+        embeddings = FakeEmbeddings(latency=args.embed_latency)
+
+        for workers in args.workers:
+            print(f"⏱️ {workers} worker(s)...")
+            seconds, in_order, done = run_burst(questions, workers, root, embeddings, llm)
+            stop_seconds, cancelled = run_stop(questions, workers, root, embeddings, llm,
+                                               after=args.llm_latency / 2)
+            prefix = f"workers_{workers}"
+            metrics[f"{prefix}.questions_per_sec"] = done / seconds
+            metrics[f"{prefix}.in_order_ratio"] = float(in_order)
+            metrics[f"{prefix}.stop_to_idle_ms"] = stop_seconds * 1000
+            metrics[f"{prefix}.cancelled"] = cancelled
+
+        metrics["overflow_rejected"] = run_overflow(questions, root, embeddings, llm, args.max_pending)
+        metrics["active_threads_after"] = threading.active_count()
+
+    report = build_report("query_engine", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Retrieval latency as the same corpus is spread over more shards.
+
+For each shard count the corpus is split evenly, then queries are timed
+fanning out across every shard and targeting a single shard. Rebuilding one
+shard is timed too, since that's what sharding buys for ingestion.
+
+Usage:
+    python benchmarks/bench_shards.py --shards 1 2 4 8 --documents 64
+"""
+import argparse
+import sys
+import tempfile
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+from fakes import FakeEmbeddings
+from shards import search_shards, shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def build_shards(root, documents, shard_count, embeddings):
+    names = [f"shard{index:02d}" for index in range(shard_count)]
+    per_shard = {name: [] for name in names}
+    for index, doc in enumerate(documents):
+        per_shard[names[index % shard_count]].append(doc)
+
+    chunks_by_shard = {}
+    with quiet():
+        for name, docs in per_shard.items():
+            chunks = database.split_documents(docs)
+            database.add_to_chroma(chunks, chroma_path=shard_path(name, root), embeddings=embeddings)
+            chunks_by_shard[name] = chunks
+    return chunks_by_shard
+
+
+def time_queries(questions, embeddings, k, shards, root):
+    timings = []
+    for question in questions:
+        with Stage() as query:
+            search_shards(question, embeddings, k=k, shards=shards, root=root)
+        timings.append(query.seconds)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="Shard counts to test.")
+    parser.add_argument("--documents", type=int, default=64, help="Documents in the whole corpus.")
+    parser.add_argument("--pages", type=int, default=4, help="Pages per document.")
+    parser.add_argument("--queries", type=int, default=30, help="Queries timed per configuration.")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    add_common_arguments(parser, "benchmarks/results/shards.json")
+    args = parser.parse_args()
+
+    corpus = synthetic_documents(args.documents, args.pages, seed=args.seed)
+    questions = sample_questions(args.queries, seed=args.seed)
+    embeddings = FakeEmbeddings()
+
+    metrics = {}
+    for shard_count in args.shards:
+        print(f"⏱️ Benchmarking {shard_count} shard(s)...")
+        with tempfile.TemporaryDirectory(prefix="rag_shards_") as root:
+            chunks_by_shard = build_shards(root, corpus, shard_count, embeddings)
+            names = sorted(chunks_by_shard)
+
+            # Warm every shard once so client start-up isn't measured.
+            time_queries(questions[:1], embeddings, args.k, names, root)
+
+            fanout = time_queries(questions, embeddings, args.k, names, root)
+            single = time_queries(questions, embeddings, args.k, names[:1], root)
+
+            target = names[0]
+            with quiet(), Stage() as rebuild:
+                database.clear_database(shard_path(target, root))
+                database.add_to_chroma(chunks_by_shard[target], chroma_path=shard_path(target, root),
+                                       embeddings=embeddings)
+
+        prefix = f"shards_{shard_count}"
+        metrics.update({f"{prefix}.{name}": value for name, value in latency_summary("fanout_query", fanout).items()})
+        metrics.update({f"{prefix}.{name}": value for name, value in latency_summary("single_shard_query", single).items()})
+        metrics[f"{prefix}.rebuild_one_shard_seconds"] = rebuild.seconds
+
+    report = build_report("shards", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Concurrency check and savings of single-flight coalescing.
+
+Uses fake embedding and LLM backends that are slow enough for requests to
+overlap, and checks that:
+  * identical questions asked at the same moment reach each backend once
+    and all get the same answer, while distinct questions are not merged;
+  * a caller that cancels while sharing an answer leaves at once, and the
+    shared LLM call only stops when every caller has cancelled;
+  * repeated chunk texts (headers, footers) are embedded once per batch.
+Exits with status 1 if any check fails.
+
+Usage:
+    python benchmarks/bench_singleflight.py --callers 8
+"""
+import argparse
+import sys
+import tempfile
+import threading
+
+from langchain.schema.document import Document
+
+from harness import Stage, add_common_arguments, build_report, finish, quiet
+
+import database
+import rag_system
+from embedding_function import CoalescingEmbeddings
+from fakes import FakeEmbeddings, FakeLLM
+from shards import shard_path
+from synthetic import sample_questions, synthetic_documents
+
+BOILERPLATE = "Example Hospital - Confidential clinical document. Do not distribute without approval."
+
+
+def run_together(callers, fn):
+    """Start fn(index) on `callers` threads at the same moment; return results and wall time"""
+    barrier = threading.Barrier(callers)
+    results, errors = [None] * callers, []
+
+    def target(index):
+        barrier.wait()
+        try:
+            results[index] = fn(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(callers)]
+    with Stage() as wall:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return results, wall.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=8, help="Concurrent identical requests.")
+    parser.add_argument("--documents", type=int, default=16, help="Documents in the corpus.")
+    parser.add_argument("--embed-latency", type=float, default=0.2, help="Fake embedding call latency.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM latency.")
+    add_common_arguments(parser, "benchmarks/results/singleflight.json")
+    args = parser.parse_args()
+
+    checks = {}
+    metrics = {}
+    question = sample_questions(1, seed=args.seed)[0]
+
+    with tempfile.TemporaryDirectory(prefix="rag_singleflight_") as root:
+        # Ingestion: every document carries the same boilerplate page.
+        documents = synthetic_documents(args.documents, 2, seed=args.seed)
+        for index in range(args.documents):
+            documents.append(Document(page_content=BOILERPLATE,
+                                      metadata={'source': f"content/synthetic_{index:04d}.pdf", 'page': 99}))
+        backend = FakeEmbeddings()
+        ingest_embeddings = CoalescingEmbeddings(backend)
+        with quiet():
+            chunks = database.split_documents(documents)
+            database.add_to_chroma(chunks, chroma_path=shard_path("default", root), embeddings=ingest_embeddings)
+        metrics["ingest.chunks"] = len(chunks)
+        metrics["ingest.texts_embedded"] = backend.texts_embedded
+        metrics["ingest.saved_ratio"] = ingest_embeddings.stats['duplicate_texts'] / len(chunks)
+        checks["ingest_duplicates_skipped"] = backend.texts_embedded == len({chunk.page_content for chunk in chunks})
+
+        # Identical questions at the same moment.
+        backend = FakeEmbeddings(latency=args.embed_latency)
+        embeddings = CoalescingEmbeddings(backend)
+        llm = FakeLLM(latency=args.llm_latency)
+
+        def ask(_index, text=question):
+            retrieved = rag_system.retrieve(text, chroma_path=root, embeddings=embeddings)
+            return rag_system.generate_answer(text, retrieved, llm=llm).content
+
+        answers, identical_seconds = run_together(args.callers, ask)
+        metrics["identical.embedding_calls"] = backend.calls
+        metrics["identical.llm_calls"] = llm.calls
+        metrics["identical.wall_seconds"] = identical_seconds
+        checks["identical_share_calls"] = backend.calls == 1 and llm.calls == 1
+        checks["identical_same_answer"] = len(set(answers)) == 1
+
+        # Distinct questions must not be merged.
+        questions = sample_questions(args.callers, seed=args.seed + 1)
+        backend.calls = llm.calls = 0
+        _answers, distinct_seconds = run_together(args.callers, lambda index: ask(index, questions[index]))
+        metrics["distinct.embedding_calls"] = backend.calls
+        metrics["distinct.llm_calls"] = llm.calls
+        metrics["distinct.wall_seconds"] = distinct_seconds
+        checks["distinct_not_merged"] = backend.calls == len(set(questions)) and llm.calls == len(set(questions))
+
+        # Cancellation: one caller leaves early, the others still get the answer.
+        retrieved = rag_system.retrieve(question, chroma_path=root, embeddings=embeddings)
+        events = [threading.Event() for _ in range(3)]
+        outcomes = [None] * 3
+
+        def answer(index):
+            status = "done"
+            with Stage() as stage:
+                try:
+                    rag_system.generate_answer(question, retrieved, llm=llm, cancel_event=events[index])
+                except rag_system.QueryCancelled:
+                    status = "cancelled"
+            outcomes[index] = (status, stage.seconds)
+
+        threads = [threading.Thread(target=answer, args=(index,)) for index in range(3)]
+        llm.calls = 0
+        for thread in threads:
+            thread.start()
+        threading.Timer(args.llm_latency / 4, events[2].set).start()
+        for thread in threads:
+            thread.join()
+        metrics["cancel.follower_left_after_seconds"] = outcomes[2][1]
+        checks["cancel_one_of_three"] = ([outcome[0] for outcome in outcomes] == ["done", "done", "cancelled"]
+                                         and llm.calls == 1)
+
+        # Everyone cancels: the shared stream stops early.
+        for event in events:
+            event.clear()
+        threads = [threading.Thread(target=answer, args=(index,)) for index in range(3)]
+        for thread in threads:
+            thread.start()
+        for event in events:
+            threading.Timer(args.llm_latency / 4, event.set).start()
+        for thread in threads:
+            thread.join()
+        metrics["cancel_all.slowest_seconds"] = max(outcome[1] for outcome in outcomes)
+        checks["cancel_all_stops_stream"] = (all(outcome[0] == "cancelled" for outcome in outcomes)
+                                             and metrics["cancel_all.slowest_seconds"] < args.llm_latency)
+
+    metrics.update({f"coalescing.{name}.{counter}": value
+                    for name, counters in rag_system.coalescing_stats().items()
+                    for counter, value in counters.items()})
+    metrics["checks_passed"] = sum(checks.values())
+    metrics["checks_total"] = len(checks)
+
+    report = build_report("singleflight", vars(args), metrics)
+    report["checks"] = checks
+    status = finish(report, args)
+    for name, passed in checks.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    return status or int(not all(checks.values()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
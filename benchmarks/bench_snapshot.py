@@ -0,0 +1,99 @@
+"""Cold start from a snapshot bundle against rebuilding or reopening Chroma.
+
+Builds a Chroma shard from a synthetic corpus, exports it, and imports it
+into a second root. Reports the build, export and import times, the time to
+open each store and answer a first question, steady-state query latency,
+and the recall of Chroma's approximate search against the snapshot's exact one.
+
+Usage:
+    python benchmarks/bench_snapshot.py --documents 128
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+import snapshot
+from fakes import FakeEmbeddings
+from shards import release_shards, search_shards, shard_path
+from synthetic import sample_questions, synthetic_documents
+
+
+def time_queries(questions, embeddings, k, root):
+    timings, results = [], []
+    for question in questions:
+        with Stage() as query:
+            found = search_shards(question, embeddings, k=k, shards=["bench"], root=root)
+        timings.append(query.seconds)
+        results.append([doc.metadata["id"] for doc, _score in found])
+    return timings, results
+
+
+def bundle_size_mb(path):
+    total = 0
+    for folder, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=128, help="Documents in the corpus.")
+    parser.add_argument("--pages", type=int, default=8, help="Pages per document.")
+    parser.add_argument("--queries", type=int, default=30, help="Queries timed per store.")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query.")
+    add_common_arguments(parser, "benchmarks/results/snapshot.json")
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.documents, args.pages, seed=args.seed)
+    questions = sample_questions(args.queries, seed=args.seed)
+    embeddings = FakeEmbeddings()
+    metrics = {}
+
+    with tempfile.TemporaryDirectory(prefix="rag_snapshot_") as workdir:
+        chroma_root = os.path.join(workdir, "chroma")
+        snapshot_root = os.path.join(workdir, "imported")
+        bundle = os.path.join(workdir, "bundle")
+
+        with quiet():
+            chunks = database.split_documents(documents)
+            with Stage() as build:
+                database.add_to_chroma(chunks, chroma_path=shard_path("bench", chroma_root), embeddings=embeddings)
+            with Stage() as export:
+                snapshot.export_snapshot(bundle, root=chroma_root, embedding_model="fake")
+            with Stage() as load:
+                snapshot.import_snapshot(bundle, root=snapshot_root, embedding_model="fake")
+
+        stores = {"chroma": chroma_root, "snapshot": snapshot_root}
+        results = {}
+        for name, root in stores.items():
+            # Drop cached clients and stores so the first query pays the open.
+            release_shards()
+            with Stage() as first:
+                search_shards(questions[0], embeddings, k=args.k, shards=["bench"], root=root)
+            timings, results[name] = time_queries(questions, embeddings, args.k, root)
+            metrics[f"{name}.first_query_seconds"] = first.seconds
+            metrics.update({f"{name}.{key}": value for key, value in latency_summary("query", timings).items()})
+
+        # Snapshot search is brute force, so it is the ground truth here.
+        overlap = [len(set(approximate) & set(exact)) / max(1, len(exact))
+                   for approximate, exact in zip(results["chroma"], results["snapshot"])]
+        metrics.update({
+            "chunks": len(chunks),
+            "build_from_embeddings_seconds": build.seconds,
+            "export_seconds": export.seconds,
+            "import_seconds": load.seconds,
+            "bundle_size_mb": bundle_size_mb(bundle),
+            "chroma.top_k_recall": sum(overlap) / len(overlap),
+        })
+        release_shards()
+
+    report = build_report("snapshot", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Perceived latency saved by speculative retrieval while typing.
+
+Simulates a user typing each question with realistic keystroke gaps, pausing,
+then submitting. Submission-to-answer time is measured with and without the
+SpeculativeRetriever, using fake embeddings and LLM with network-like latency.
+
+Usage:
+    python benchmarks/bench_speculative.py --pause 0.8 --embed-latency 0.15
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+from harness import Stage, add_common_arguments, build_report, finish, latency_summary, quiet
+
+import database
+import rag_system
+from fakes import FakeEmbeddings, FakeLLM
+from shards import shard_path
+from speculative import SpeculativeRetriever
+from synthetic import sample_questions, synthetic_documents
+
+
+def type_and_submit(question, speculative, retrieve, llm, keystroke_gap, pause):
+    """Type a question, pause, submit; return submission-to-answer seconds"""
+    if speculative is not None:
+        for length in range(1, len(question) + 1):
+            speculative.update(question[:length])
+            time.sleep(keystroke_gap)
+    time.sleep(pause)
+
+    with Stage() as submit:
+        if speculative is not None:
+            speculative.reserve(question)
+            prefetched = speculative.take(question)
+        else:
+            prefetched = None
+        retrieved = prefetched[0] if prefetched else retrieve(question, ())
+        rag_system.generate_answer(question, retrieved, llm=llm)
+    return submit.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=32, help="Documents in the corpus.")
+    parser.add_argument("--queries", type=int, default=8, help="Questions typed.")
+    parser.add_argument("--keystroke-gap", type=float, default=0.02, help="Seconds between keystrokes.")
+    parser.add_argument("--pause", type=float, default=0.8, help="Seconds between the last keystroke and submit.")
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="Fake embedding call latency.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM call latency.")
+    add_common_arguments(parser, "benchmarks/results/speculative.json")
+    args = parser.parse_args()
+
+    questions = sample_questions(args.queries, seed=args.seed)
+    llm = FakeLLM(latency=args.llm_latency)
+
+    with tempfile.TemporaryDirectory(prefix="rag_speculative_") as root:
+        with quiet():
+            chunks = database.split_documents(synthetic_documents(args.documents, 4, seed=args.seed))
+            database.add_to_chroma(chunks, chroma_path=shard_path("default", root), embeddings=FakeEmbeddings())
+        embeddings = FakeEmbeddings(latency=args.embed_latency)
+
+        def retrieve(question, _options):
+            return rag_system.retrieve(question, chroma_path=root, embeddings=embeddings)
+
+        with quiet():
+            baseline = [type_and_submit(q, None, retrieve, llm, args.keystroke_gap, args.pause)
+                        for q in questions]
+            speculative = SpeculativeRetriever(retrieve)
+            prefetched = [type_and_submit(q, speculative, retrieve, llm, args.keystroke_gap, args.pause)
+                          for q in questions]
+            speculative.shutdown()
+
+    metrics = {}
+    metrics.update(latency_summary("baseline_answer", baseline))
+    metrics.update(latency_summary("speculative_answer", prefetched))
+    metrics["saved_per_query_ms"] = speculative.stats["saved_seconds"] * 1000 / len(questions)
+    metrics["prefetch_hit_ratio"] = speculative.stats["hits"] / len(questions)
+    metrics["prefetches"] = speculative.stats["prefetches"]
+    report = build_report("speculative", vars(args), metrics)
+    return finish(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import math
+import re
+import time
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings, no network needed"""
+
+    def __init__(self, dimensions=256, latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts, task_type=None):
+        # task_type mirrors Gemini's signature; queries and documents embed alike here.
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class FakeLLM:
+    """Stands in for ChatGoogleGenerativeAI, echoes a summary of the prompt"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return AIMessage(content=self._answer(prompt))
+
+    def stream(self, prompt):
+        """Yields the same answer word by word, spreading the latency across them"""
+        self.calls += 1
+        words = self._answer(prompt).split(" ")
+        for index, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            yield AIMessageChunk(content=word if index == 0 else f" {word}")
+
+    def _answer(self, prompt):
+        digest = hashlib.md5(str(prompt).encode("utf-8")).hexdigest()[:8]
+        return f"Fake answer {digest} from a {len(str(prompt))} character prompt"
+
+
+def fake_ocr(png_bytes, latency=0.05):
+    """Picklable stand-in for Tesseract, costs a fixed time per page"""
+    time.sleep(latency)
+    digest = hashlib.md5(png_bytes).hexdigest()
+    return f"Scanned page {digest[:12]} patient clinical results"
+
+
+def faulty_extract(pdf, page_num, faults=None, hang_seconds=3600):
+    """Page extractor that misbehaves on chosen pages
+
+    faults maps (PDF file name, page index) to 'hang', 'crash', 'memory' or
+    'error'; every other page is extracted normally.
+    """
+    from page_extraction import extract_page
+
+    fault = (faults or {}).get((os.path.basename(pdf.stream.name), page_num))
+    if fault == 'hang':
+        time.sleep(hang_seconds)
+    elif fault == 'crash':
+        os._exit(1)
+    elif fault == 'memory':
+        hog = []
+        while True:
+            hog.append(bytearray(64 * 1024 * 1024))
+    elif fault == 'error':
+        raise ValueError("malformed content stream")
+    return extract_page(pdf, page_num)
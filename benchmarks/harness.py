@@ -0,0 +1,159 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Make the repo root importable when a benchmark is run as a plain script.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# database.py reads the key at import time; the fake backends never use it.
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-fake-key")
+
+# Metric name suffixes decide which direction counts as a regression.
+HIGHER_IS_BETTER = ("_per_sec", "_ratio", "_recall")
+LOWER_IS_BETTER = ("_ms", "_mb", "_seconds")
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the progress prints from database.py while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class Stage:
+    """Times a block and optionally records its Python peak memory"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = 0.0
+        self.peak_mb = None
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        if self.trace_memory:
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.peak_mb = peak / (1024 * 1024)
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(prefix, seconds):
+    """Mean/p50/p95 in milliseconds for a list of timings"""
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        f"{prefix}_mean_ms": sum(milliseconds) / len(milliseconds) if milliseconds else 0.0,
+        f"{prefix}_p50_ms": percentile(milliseconds, 0.5),
+        f"{prefix}_p95_ms": percentile(milliseconds, 0.95),
+    }
+
+
+def build_report(name, config, metrics):
+    return {
+        "benchmark": name,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "metrics": metrics,
+    }
+
+
+def write_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def compare_reports(current, baseline, tolerance=0.2):
+    """Return a list of regressions of current metrics against a saved baseline"""
+    regressions = []
+    for name, base_value in baseline.get("metrics", {}).items():
+        value = current.get("metrics", {}).get(name)
+        if value is None or not base_value:
+            continue
+
+        if name.endswith(HIGHER_IS_BETTER):
+            change = (base_value - value) / base_value
+        elif name.endswith(LOWER_IS_BETTER):
+            change = (value - base_value) / base_value
+        else:
+            continue
+
+        if change > tolerance:
+            regressions.append({
+                "metric": name,
+                "baseline": base_value,
+                "current": value,
+                "worse_by": round(change, 4),
+            })
+    return regressions
+
+
+def add_common_arguments(parser, default_output):
+    parser.add_argument("--output", default=default_output, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", help="Saved results to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before a metric counts as a regression.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus.")
+
+
+def finish(report, args):
+    """Write the report, print it, and compare against a baseline if one was given"""
+    write_report(report, args.output)
+    for name, value in sorted(report["metrics"].items()):
+        print(f"{name:<48} {value:>14.3f}" if isinstance(value, float) else f"{name:<48} {value!s:>14}")
+    print(f"📄 Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_reports(report, baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 0
+
+    print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+    for item in regressions:
+        print(f"   {item['metric']}: {item['baseline']:.3f} -> {item['current']:.3f} "
+              f"({item['worse_by']:.0%} worse)")
+    return 1
@@ -0,0 +1,189 @@
+import os
+import random
+
+import fitz
+from langchain.schema.document import Document
+
+VOCABULARY = [
+    "patient", "clinical", "dose", "trial", "cohort", "diagnosis", "therapy",
+    "outcome", "symptom", "protocol", "baseline", "follow-up", "adverse",
+    "event", "placebo", "randomized", "biomarker", "imaging", "cardiac",
+    "renal", "hepatic", "infection", "treatment", "response", "survival",
+    "accuracy", "precision", "recall", "evaluation", "performance", "results",
+    "sample", "analysis", "method", "significant", "increase", "reduction",
+]
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+
+
+def _sentence(rng, min_words=8, max_words=18):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng, sentences=5):
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _draw_table(page, rng, top, rows=4, columns=3):
+    """Draw a ruled table that pdfplumber's line strategy will pick up"""
+    cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+    cell_height = 20
+    for row in range(rows):
+        for column in range(columns):
+            rect = fitz.Rect(
+                MARGIN + column * cell_width,
+                top + row * cell_height,
+                MARGIN + (column + 1) * cell_width,
+                top + (row + 1) * cell_height,
+            )
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            if row == 0:
+                text = rng.choice(VOCABULARY).title()
+            else:
+                text = f"{rng.uniform(0, 100):.1f}%"
+            page.insert_text((rect.x0 + 4, rect.y1 - 6), text, fontsize=9)
+    return top + rows * cell_height
+
+
+def _image_pixmap(rng, size=64):
+    """Build a small deterministic RGB pixmap to embed as an image"""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, size, size), False)
+    pixmap.set_rect(pixmap.irect, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    return pixmap
+
+
+def generate_pdf(path, pages=4, seed=0, table_every=2, image_every=3):
+    """Write one synthetic PDF with text on every page plus periodic tables and images"""
+    rng = random.Random(seed)
+    document = fitz.open()
+
+    for page_num in range(pages):
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        top = MARGIN
+
+        text_rect = fitz.Rect(MARGIN, top, PAGE_WIDTH - MARGIN, top + 300)
+        page.insert_textbox(text_rect, _paragraph(rng, sentences=10), fontsize=10)
+        top += 320
+
+        if table_every and page_num % table_every == 0:
+            top = _draw_table(page, rng, top) + 20
+
+        if image_every and page_num % image_every == 0:
+            image_rect = fitz.Rect(MARGIN, top, MARGIN + 96, top + 96)
+            page.insert_image(image_rect, pixmap=_image_pixmap(rng))
+            top += 116
+
+        text_rect = fitz.Rect(MARGIN, top, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN)
+        page.insert_textbox(text_rect, _paragraph(rng, sentences=6), fontsize=10)
+
+    document.save(path)
+    document.close()
+    return path
+
+
+def generate_scanned_pdf(path, pages=4, seed=0, scanned_every=1, dpi=100):
+    """Write a PDF whose pages are images with no text layer, like a scan
+
+    Every scanned_every-th page is rasterised, the rest keep their text.
+    """
+    source_path = f"{path}.source.pdf"
+    generate_pdf(source_path, pages=pages, seed=seed)
+
+    source = fitz.open(source_path)
+    document = fitz.open()
+    for page_num, source_page in enumerate(source):
+        if page_num % scanned_every == 0:
+            page = document.new_page(width=source_page.rect.width, height=source_page.rect.height)
+            page.insert_image(page.rect, pixmap=source_page.get_pixmap(dpi=dpi))
+        else:
+            document.insert_pdf(source, from_page=page_num, to_page=page_num)
+    document.save(path)
+    document.close()
+    source.close()
+    os.remove(source_path)
+    return path
+
+
+def generate_corpus(directory, documents=4, pages=4, seed=0):
+    """Generate a reproducible folder of synthetic PDFs and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(documents):
+        path = os.path.join(directory, f"synthetic_{seed}_{index:04d}.pdf")
+        generate_pdf(path, pages=pages, seed=seed * 100003 + index)
+        paths.append(path)
+    return paths
+
+
+def sample_questions(count=5, seed=0):
+    """Deterministic questions drawn from the same vocabulary as the corpus"""
+    rng = random.Random(seed)
+    return [f"What does the study report about {rng.choice(VOCABULARY)} and {rng.choice(VOCABULARY)}?"
+            for _ in range(count)]
+
+
+def synthetic_documents(documents=4, pages=4, seed=0, table_every=2, image_every=3, prefix="content"):
+    """Page-level Documents shaped like load_documents output, without PDF parsing
+
+    Useful when a benchmark is about retrieval rather than extraction.
+    """
+    rng = random.Random(seed)
+    result = []
+    for index in range(documents):
+        source = f"{prefix}/synthetic_{seed}_{index:04d}.pdf"
+        for page_num in range(pages):
+            text = _paragraph(rng, sentences=16)
+            tables = 1 if table_every and page_num % table_every == 0 else 0
+            images = 1 if image_every and page_num % image_every == 0 else 0
+            if tables:
+                rows = [" | ".join(rng.choice(VOCABULARY).title() for _ in range(3))]
+                rows += [" | ".join(f"{rng.uniform(0, 100):.1f}%" for _ in range(3)) for _ in range(3)]
+                text += "\n\n[TABLE 1]\n" + "\n".join(rows) + "\n[/TABLE]\n\n"
+            result.append(Document(
+                page_content=text,
+                metadata={
+                    'source': source,
+                    'page': page_num,
+                    'total_pages': pages,
+                    'processing_type': 'enhanced',
+                    'images_found': images,
+                    'images_extracted': images,
+                    'tables_found': tables,
+                    'has_table_keywords': any(word in text.lower() for word in ('accuracy', 'precision', 'recall')),
+                },
+            ))
+    return result
+
+
+DISCLAIMER = ("This document is intended for qualified healthcare professionals only. The information is "
+              "provided for educational purposes and does not replace clinical judgement. Reproduction or "
+              "distribution without written permission of the publisher is prohibited. All rights reserved.")
+
+
+def duplicated_documents(documents=16, pages=4, seed=0, revisions=0.25, edit_ratio=0.02):
+    """synthetic_documents plus the redundancy real collections have
+
+    Every document gets a disclaimer page, and a `revisions` share of the
+    documents get a second revision whose pages differ in `edit_ratio` of
+    their words.
+    """
+    rng = random.Random(seed)
+    result = synthetic_documents(documents, pages, seed=seed)
+    sources = sorted({doc.metadata['source'] for doc in result})
+
+    for source in sources:
+        result.append(Document(page_content=DISCLAIMER,
+                               metadata={'source': source, 'page': pages, 'total_pages': pages + 1}))
+
+    for source in sources[:int(len(sources) * revisions)]:
+        revised_source = source.replace(".pdf", "_rev2.pdf")
+        for doc in [doc for doc in result if doc.metadata['source'] == source]:
+            words = doc.page_content.split(" ")
+            for _ in range(max(1, int(len(words) * edit_ratio))):
+                words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+            result.append(Document(page_content=" ".join(words),
+                                   metadata={**doc.metadata, 'source': revised_source}))
+    return result
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from array import array
+from datetime import datetime
+
+# Every chat message is appended here as one JSON line, so the history
+# survives restarts without ever being rewritten.
+CHAT_HISTORY_PATH = "chat_history.jsonl"
+SEARCH_LIMIT = 100
+
+
+def format_message(message):
+    """The text shown in the chat for a stored message"""
+    if message.get('label'):
+        return f"[{message['time'][11:19]}] {message['label']}: {message['text']}"
+    return message['text']
+
+
+class ChatHistory:
+    """Append-only JSONL log of chat messages
+
+    Only the byte offset of each line is kept in memory, so any message can
+    be read back by position without loading the whole history. Messages
+    are dicts with 'time', 'tag' (the chat style: 'user', 'assistant' or
+    'sources'), 'text' and an optional 'label' such as "You"; answers also
+    carry the 'query' they answer.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or CHAT_HISTORY_PATH
+        self._lock = threading.Lock()
+        self._offsets = array("q", [0])
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._file = open(self.path, "ab")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                self._offsets.append(end)
+        # Drop a line left half-written by a crash, appends start clean.
+        if os.path.getsize(self.path) != end:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def append(self, text, tag, label=None, **fields):
+        """Add a message and return its index"""
+        message = {'time': datetime.now().isoformat(timespec="seconds"), 'tag': tag, 'text': text, **fields}
+        if label:
+            message['label'] = label
+        line = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._offsets.append(self._offsets[-1] + len(line))
+            return len(self._offsets) - 2
+
+    def read(self, start, stop):
+        """Messages start..stop-1 as a list"""
+        start, stop = max(0, start), min(len(self), stop)
+        if start >= stop:
+            return []
+        with self._lock, open(self.path, "rb") as f:
+            f.seek(self._offsets[start])
+            data = f.read(self._offsets[stop] - self._offsets[start])
+        return [json.loads(line) for line in data.splitlines()]
+
+    def iter_messages(self, chunk=1000):
+        for start in range(0, len(self), chunk):
+            yield from self.read(start, start + chunk)
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Indices of messages containing text (case-insensitive), newest first"""
+        needle = text.lower()
+        matches = []
+        with self._lock:
+            count = len(self)
+        for index in range(count - 1, -1, -1000):
+            start = max(0, index - 999)
+            for offset, message in enumerate(reversed(self.read(start, index + 1))):
+                if needle in message['text'].lower():
+                    matches.append(index - offset)
+                    if len(matches) >= limit:
+                        return matches
+        return matches
+
+    def export(self, path):
+        """Write the questions and answers to a .json or .txt file, streaming
+
+        Returns the number of answers written.
+        """
+        written = 0
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                f.write("[")
+            for message in self.iter_messages():
+                if 'query' not in message:
+                    continue
+                entry = {'timestamp': message['time'], 'query': message['query'], 'response': message['text']}
+                if path.endswith(".json"):
+                    f.write(("," if written else "") + "\n  " + json.dumps(entry, ensure_ascii=False))
+                else:
+                    f.write(f"[{entry['timestamp']}]\nQ: {entry['query']}\nA: {entry['response']}\n\n")
+                written += 1
+            if path.endswith(".json"):
+                f.write("\n]\n" if written else "]\n")
+        return written
+
+    def clear(self):
+        with self._lock:
+            self._file.close()
+            self._file = open(self.path, "wb")
+            self._offsets = array("q", [0])
+
+    def close(self):
+        with self._lock:
+            self._file.close()
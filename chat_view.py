@@ -0,0 +1,154 @@
+import tkinter as tk
+from collections import deque
+
+from chat_history import format_message
+
+# Messages kept in the Text widget at once; the rest stay on disk.
+CHAT_WINDOW_MESSAGES = 200
+# Messages paged in when the view is scrolled to either end.
+CHAT_PAGE_MESSAGES = 50
+
+
+class ChatView:
+    """Shows a sliding window of a ChatHistory in a ScrolledText widget
+
+    Inserting into a Tk Text widget and scrolling it slow down as its
+    content grows, so only `window` messages are rendered. Scrolling to
+    the top pages older messages in (dropping the newest from the bottom)
+    and scrolling back down pages newer ones in again.
+    """
+
+    def __init__(self, text, history, window=CHAT_WINDOW_MESSAGES, page=CHAT_PAGE_MESSAGES):
+        self.text = text
+        self.history = history
+        self.window = window
+        self.page = page
+        self.first = 0             # index of the first rendered message
+        self.lines = deque()       # text lines of each rendered message
+        self._paging = False
+        self.text.tag_configure("match", background="#FFF3B0")
+        self.text.configure(yscrollcommand=self._on_yscroll)
+
+    @property
+    def last(self):
+        """Index just past the last rendered message"""
+        return self.first + len(self.lines)
+
+    def _edit(self, action):
+        self.text.config(state=tk.NORMAL)
+        try:
+            action()
+        finally:
+            self.text.config(state=tk.DISABLED)
+
+    def _insert(self, position, messages):
+        """Insert messages in one call; returns the line count of each"""
+        args, lines = [], []
+        for message in messages:
+            rendered = format_message(message) + "\n\n"
+            args.extend((rendered, message['tag']))
+            lines.append(rendered.count("\n"))
+        if args:
+            self.text.insert(position, *args)
+        return lines
+
+    def _drop_first(self, count):
+        lines = sum(self.lines.popleft() for _ in range(count))
+        self.text.delete("1.0", f"{lines + 1}.0")
+        self.first += count
+
+    def _drop_last(self, count):
+        for _ in range(count):
+            self.lines.pop()
+        self.text.delete(f"{sum(self.lines) + 1}.0", tk.END)
+
+    def show(self, start):
+        """Render the window starting at message `start`"""
+        start = max(0, min(start, len(self.history) - self.window))
+
+        def render():
+            self.text.delete("1.0", tk.END)
+            self.first = start
+            self.lines = deque(self._insert(tk.END, self.history.read(start, start + self.window)))
+        self._edit(render)
+
+    def show_latest(self):
+        self.show(len(self.history) - self.window)
+        self.text.see(tk.END)
+
+    def append(self, index):
+        """Show message `index`, just added to the history"""
+        if index != self.last:
+            # Paged back into older messages: jump to the newest again.
+            self.show_latest()
+            return
+
+        def add():
+            self.lines.extend(self._insert(tk.END, self.history.read(index, index + 1)))
+            if len(self.lines) > self.window:
+                self._drop_first(len(self.lines) - self.window)
+        self._edit(add)
+        self.text.see(tk.END)
+
+    def highlight(self, index):
+        """Scroll to message `index` and mark it, e.g. a search result"""
+        if not self.first <= index < self.last:
+            self.show(index - self.window // 2)
+        start = sum(list(self.lines)[:index - self.first]) + 1
+        self.text.tag_remove("match", "1.0", tk.END)
+        self.text.tag_add("match", f"{start}.0", f"{start + self.lines[index - self.first] - 1}.0")
+        self.text.see(f"{start}.0")
+
+    def clear(self):
+        self._edit(lambda: self.text.delete("1.0", tk.END))
+        self.first = 0
+        self.lines.clear()
+
+    def page_older(self):
+        count = min(self.page, self.first)
+        if not count:
+            return
+
+        def prepend():
+            lines = self._insert("1.0", self.history.read(self.first - count, self.first))
+            self.first -= count
+            self.lines.extendleft(reversed(lines))
+            if len(self.lines) > self.window:
+                self._drop_last(len(self.lines) - self.window)
+            # Keep the message that was at the top where it was.
+            self.text.yview(f"{sum(lines) + 1}.0")
+        self._edit(prepend)
+
+    def page_newer(self):
+        count = min(self.page, len(self.history) - self.last)
+        if not count:
+            return
+
+        def extend():
+            lines = self._insert(tk.END, self.history.read(self.last, self.last + count))
+            self.lines.extend(lines)
+            if len(self.lines) > self.window:
+                self._drop_first(len(self.lines) - self.window)
+            self.text.see(f"{sum(self.lines) - sum(lines) + 1}.0")
+        self._edit(extend)
+
+    def _on_yscroll(self, first, last):
+        self.text.vbar.set(first, last)
+        if self._paging:
+            return
+        # Only when there is something to scroll, or a short window would page forever.
+        if float(first) <= 0.0 and float(last) < 1.0 and self.first > 0:
+            self._schedule(self.page_older)
+        elif float(last) >= 1.0 and float(first) > 0.0 and self.last < len(self.history):
+            self._schedule(self.page_newer)
+
+    def _schedule(self, action):
+        # Paging changes the view, which calls back into _on_yscroll.
+        self._paging = True
+
+        def run():
+            try:
+                action()
+            finally:
+                self._paging = False
+        self.text.after_idle(run)
@@ -6,6 +6,16 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
 from embedding_function import embedding_function
 from langchain_community.vectorstores import Chroma
+from shards import (CHROMA_PATH, DEFAULT_SHARD, new_shard_version, open_shard, publish_shard_version,
+                    release_shards, shard_lock, shard_path, valid_shard_name)
+from filters import chunk_has_table
+from dedup import (DEDUP_THRESHOLD, add_duplicates, collapse_near_duplicates, copy_locations, fingerprint,
+                   load_fingerprints, save_fingerprints, without_sources)
+from index_tuning import collection_metadata
+from ocr import needs_ocr, ocr_document
+from page_extraction import shared_extractor, update_quarantine
+from snapshot import restore_snapshot
+from snapshot_store import SNAPSHOT_FILE
 from dotenv import load_dotenv
 import pdfplumber
 from PIL import Image
@@ -15,9 +25,24 @@ load_dotenv()
 
 genai.api_key = os.environ['GEMINI_API_KEY']
 
-CHROMA_PATH = "chroma"
 DATA_PATH = "content"
 IMAGES_PATH = "images"
+EMBEDDING_BATCH_SIZE = 64
+
+class RebuildCancelled(Exception):
+    """Raised inside a build when its cancel event has been set"""
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise RebuildCancelled("Database rebuild cancelled")
+
+def report_progress(progress, stage, done, total, detail=""):
+    """Forward a progress event if a callback was given.
+
+    stage is one of "shard", "files", "pages", "chunks", "embedding" or "swap".
+    """
+    if progress is not None:
+        progress(stage, done, total, detail)
 
 # def load_db(file, chain_type, k):
 #     # load documents
@@ -118,119 +143,310 @@ def extract_images_from_pdf(pdf_path, filename_base):
 
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--shard", action="append",
+                        help="Only build this shard (repeatable). Defaults to every shard.")
+    parser.add_argument("--reset", action="store_true",
+                        help="Clear the selected shards before rebuilding them.")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help=f"Similarity at which chunks are stored once (default {DEDUP_THRESHOLD}, "
+                             "identical words only). Lower values also collapse edited copies.")
+    parser.add_argument("--no-dedup", action="store_true", help="Store every chunk, even exact copies.")
     args = parser.parse_args()
 
-    documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    build_database(shards=args.shard, reset=args.reset,
+                   dedup_threshold=None if args.no_dedup else args.dedup_threshold)
+
+def discover_shards(data_path=None):
+    """Map shard names to content folders.
+
+    PDFs directly in the content folder go to the default shard; every
+    sub-folder (e.g. content/cardiology) becomes a shard of its own.
+    """
+    data_path = data_path or DATA_PATH
+    shards = {}
+
+    if any(f.endswith('.pdf') for f in os.listdir(data_path)):
+        shards[DEFAULT_SHARD] = data_path
+
+    for name in sorted(os.listdir(data_path)):
+        folder = os.path.join(data_path, name)
+        if (valid_shard_name(name) and os.path.isdir(folder)
+                and any(f.endswith('.pdf') for f in os.listdir(folder))):
+            shards[name] = folder
+
+    return shards
+
+def build_database(shards=None, reset=False, data_path=None, chroma_root=None, embeddings=None,
+                   progress=None, cancel_event=None, dedup_threshold=DEDUP_THRESHOLD):
+    """Build every shard, or only the named ones, independently
+
+    Each shard is built into a new staging version and swapped in only once
+    it is complete, so queries keep using the previous version meanwhile.
+    Setting cancel_event stops the build and discards the unfinished version.
+    """
+    selected = [(shard, folder) for shard, folder in discover_shards(data_path).items()
+                if not shards or shard in shards]
+
+    for index, (shard, folder) in enumerate(selected):
+        report_progress(progress, "shard", index, len(selected), shard)
+        build_shard(shard, folder, reset=reset, chroma_root=chroma_root, embeddings=embeddings,
+                    progress=progress, cancel_event=cancel_event, dedup_threshold=dedup_threshold)
+        report_progress(progress, "swap", index + 1, len(selected), shard)
+
+def shard_for_file(file_path, data_path=None):
+    """Return the (shard, folder) a PDF in the content folder belongs to"""
+    data_path = data_path or DATA_PATH
+    folder = os.path.dirname(file_path)
+    if os.path.normpath(folder) == os.path.normpath(data_path):
+        return DEFAULT_SHARD, folder
+    return os.path.basename(folder), folder
+
+def indexed_sources(shard, chroma_root=None):
+    """Source paths of every PDF a shard holds, including collapsed copies"""
+    data = open_shard(shard, root=chroma_root).get(include=["metadatas"])
+    return {location["source"] for metadata in data["metadatas"] for location in copy_locations(metadata)
+            if location.get("source")}
+
+def ingest_files(changed=(), removed=(), data_path=None, chroma_root=None, embeddings=None,
+                 progress=None, cancel_event=None, dedup_threshold=DEDUP_THRESHOLD):
+    """Re-index only the given PDFs instead of rebuilding whole shards
+
+    changed: paths of new or modified PDFs, their old chunks are replaced.
+    removed: paths of deleted PDFs, their chunks are dropped.
+    """
+    groups = {}
+    for file_path, is_removed in [(path, False) for path in changed] + [(path, True) for path in removed]:
+        shard, folder = shard_for_file(file_path, data_path)
+        group = groups.setdefault(shard, {'folder': folder, 'changed': [], 'removed': []})
+        group['removed' if is_removed else 'changed'].append(os.path.basename(file_path))
+
+    for index, (shard, group) in enumerate(sorted(groups.items())):
+        report_progress(progress, "shard", index, len(groups), shard)
+        build_shard(shard, group['folder'], filenames=group['changed'], removed=group['removed'],
+                    chroma_root=chroma_root, embeddings=embeddings,
+                    progress=progress, cancel_event=cancel_event, dedup_threshold=dedup_threshold)
+        report_progress(progress, "swap", index + 1, len(groups), shard)
+
+def build_shard(shard, folder, filenames=None, removed=(), reset=False, chroma_root=None,
+                embeddings=None, progress=None, cancel_event=None, dedup_threshold=DEDUP_THRESHOLD):
+    """Build one shard into a staging version and publish it
+
+    With filenames, only those PDFs are (re)loaded and any chunks they had
+    before are replaced; removed lists PDFs whose chunks are dropped.
+    """
+    with shard_lock(shard, chroma_root):
+        check_cancelled(cancel_event)
+        print(f"🗂️ Building shard '{shard}' from {folder}")
+
+        live = shard_path(shard, chroma_root)
+        staging = new_shard_version(shard, chroma_root)
+        try:
+            # Incremental builds start from a copy of the live version.
+            if not reset and os.path.exists(os.path.join(live, "chroma.sqlite3")):
+                shutil.copytree(live, staging)
+            elif not reset and os.path.exists(os.path.join(live, SNAPSHOT_FILE)):
+                restore_snapshot(live, staging)
+
+            replaced = list(filenames or []) + list(removed)
+            if replaced and os.path.exists(staging):
+                remove_sources(staging, [os.path.join(folder, filename) for filename in replaced])
+
+            documents = []
+            if filenames is None or filenames:
+                documents = load_documents(folder, filenames=filenames,
+                                           progress=progress, cancel_event=cancel_event)
+            for doc in documents:
+                doc.metadata['shard'] = shard
+            chunks = split_documents(documents)
+            report_progress(progress, "chunks", len(chunks), len(chunks), shard)
+            add_to_chroma(chunks, chroma_path=staging, embeddings=embeddings,
+                          progress=progress, cancel_event=cancel_event, dedup_threshold=dedup_threshold)
+            check_cancelled(cancel_event)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        publish_shard_version(shard, staging, chroma_root)
+        print(f"✅ Shard '{shard}' is live")
+
+def remove_sources(chroma_path, sources):
+    """Delete every chunk that came from the given source paths
+
+    A stored chunk that near-duplicates from other files were collapsed into
+    is handed over to one of those copies rather than deleted with its file.
+    """
+    db = Chroma(persist_directory=chroma_path)
+    stale_ids = db.get(where={"source": {"$in": list(sources)}}, include=[])["ids"]
+
+    collapsed = db.get(where={"duplicate_count": {"$gt": 0}}, include=["metadatas", "documents", "embeddings"])
+    promoted = []
+    for chunk_id, metadata, text, vector in zip(collapsed["ids"], collapsed["metadatas"],
+                                                collapsed["documents"], collapsed["embeddings"]):
+        kept = without_sources(chunk_id, metadata, sources)
+        if kept is None:
+            continue
+        new_id, new_metadata = kept
+        if new_id != chunk_id:
+            promoted.append((new_id, vector, text, new_metadata))
+        elif new_metadata != metadata:
+            db._collection.update(ids=[chunk_id], metadatas=[new_metadata])
+
+    if stale_ids:
+        print(f"🧹 Removing {len(stale_ids)} outdated chunk(s)")
+        db.delete(ids=stale_ids)
+    if promoted:
+        db._collection.add(
+            ids=[new_id for new_id, _vector, _text, _metadata in promoted],
+            embeddings=[vector for _new_id, vector, _text, _metadata in promoted],
+            documents=[text for _new_id, _vector, text, _metadata in promoted],
+            metadatas=[metadata for _new_id, _vector, _text, metadata in promoted],
+        )
 
-def load_documents():
+def load_documents(data_path=None, filenames=None, progress=None, cancel_event=None):
+    data_path = data_path or DATA_PATH
     documents = []
+    pdf_files = [filename for filename in os.listdir(data_path)
+                 if filename.endswith('.pdf') and (filenames is None or filename in filenames)]
     
-    for filename in os.listdir(DATA_PATH):
-        if filename.endswith('.pdf'):
-            file_path = os.path.join(DATA_PATH, filename)
-            filename_base = os.path.splitext(filename)[0]
-            print(f"📑 Processing {filename} with enhanced extraction...")
+    for file_index, filename in enumerate(pdf_files):
+        check_cancelled(cancel_event)
+        report_progress(progress, "files", file_index, len(pdf_files), filename)
+        file_path = os.path.join(data_path, filename)
+        filename_base = os.path.splitext(filename)[0]
+        print(f"📑 Processing {filename} with enhanced extraction...")
+    
+        # Extract images first
+        print(f"  🖼️ Extracting images...")
+        extracted_images = extract_images_from_pdf(file_path, filename_base)
+        if extracted_images:
+            saved_images = [img for img in extracted_images if img.get('path')]
+            detected_images = [img for img in extracted_images if not img.get('path')]
+        
+            if saved_images:
+                print(f"    ✅ Saved {len(saved_images)} image(s) to '{IMAGES_PATH}' folder")
+            if detected_images:
+                print(f"    📋 Detected {len(detected_images)} image(s) (metadata only)")
+        else:
+            print(f"    📋 No images found")
+    
+        # OCR pages that have no text layer (scans), cached by page image
+        ocr_stats = {}
+        try:
+            ocr_texts = ocr_document(file_path, stats=ocr_stats, cancel_event=cancel_event)
+            if ocr_stats['pages']:
+                print(f"  🔍 OCR: {ocr_stats['pages']} scanned page(s), {ocr_stats['cache_hits']} from cache")
+        except Exception as e:
+            print(f"  ⚠️ OCR failed for {filename}: {e}")
+            ocr_texts = {}
+    
+        try:
+            with fitz.open(file_path) as pdf:
+                page_count = len(pdf)
+            # Text and tables come from supervised workers, so a page that hangs
+            # or exhausts memory falls back on its own instead of failing the file.
+            # The workers are kept for every later load in this process.
+            with shared_extractor() as extractor:
+                pages, failures = extractor.extract(
+                    file_path, page_count, cancel_event=cancel_event,
+                    on_page=lambda done, total: report_progress(progress, "pages", done, total, filename))
+            check_cancelled(cancel_event)
+            if failures:
+                print(f"  🚧 {len(failures)} page(s) fell back to plain text: "
+                      + ", ".join(f"{failure['page'] + 1} ({failure['reason']})" for failure in failures))
+            update_quarantine(file_path, failures)
+        
+            for page_num, extracted in enumerate(pages):
+                text = extracted['text']
+                ocr_used = needs_ocr(text) and page_num in ocr_texts
+                if ocr_used:
+                    text = ocr_texts[page_num]
             
-            # Extract images first
-            print(f"  🖼️ Extracting images...")
-            extracted_images = extract_images_from_pdf(file_path, filename_base)
-            if extracted_images:
-                saved_images = [img for img in extracted_images if img.get('path')]
-                detected_images = [img for img in extracted_images if not img.get('path')]
+                # Enhanced image content with extraction info
+                image_content = ""
+                page_images = [img for img in extracted_images if img['page'] == page_num + 1]
+                if page_images:
+                    print(f"  🖼️ Page {page_num + 1}: Found {len(page_images)} image(s)")
+                    image_descriptions = []
+                    for img in page_images:
+                        if img.get('path'):
+                            desc = f"Image: {img['filename']} ({img['width']}x{img['height']} pixels) - Saved to: {img['path']}"
+                        else:
+                            desc = f"Image detected: {img['width']}x{img['height']} pixels (metadata only)"
+                        image_descriptions.append(desc)
                 
-                if saved_images:
-                    print(f"    ✅ Saved {len(saved_images)} image(s) to '{IMAGES_PATH}' folder")
-                if detected_images:
-                    print(f"    📋 Detected {len(detected_images)} image(s) (metadata only)")
-            else:
-                print(f"    📋 No images found")
+                    image_content = f"\\n\\n[IMAGES ON THIS PAGE]\\n" + "\\n".join(image_descriptions) + "\\n[/IMAGES]\\n\\n"
             
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    for page_num, page in enumerate(pdf.pages):
-                        # Extract text with better formatting
-                        text = page.extract_text() or ""
-                        
-                        # Enhanced image content with extraction info
-                        image_content = ""
-                        page_images = [img for img in extracted_images if img['page'] == page_num + 1]
-                        if page_images:
-                            print(f"  🖼️ Page {page_num + 1}: Found {len(page_images)} image(s)")
-                            image_descriptions = []
-                            for img in page_images:
-                                if img.get('path'):
-                                    desc = f"Image: {img['filename']} ({img['width']}x{img['height']} pixels) - Saved to: {img['path']}"
-                                else:
-                                    desc = f"Image detected: {img['width']}x{img['height']} pixels (metadata only)"
-                                image_descriptions.append(desc)
-                            
-                            image_content = f"\\n\\n[IMAGES ON THIS PAGE]\\n" + "\\n".join(image_descriptions) + "\\n[/IMAGES]\\n\\n"
-                        
-                        # Try to extract tables (even if not perfectly structured)
-                        tables = page.extract_tables()
-                        table_content = ""
-                        if tables:
-                            print(f"  📊 Page {page_num + 1}: Found {len(tables)} table(s)")
-                            for i, table in enumerate(tables):
-                                table_content += f"\\n\\n[TABLE {i+1}]\\n"
-                                for row in table:
-                                    if row and any(cell for cell in row if cell):  # Skip empty rows
-                                        clean_row = [str(cell).strip() if cell else "" for cell in row]
-                                        table_content += " | ".join(clean_row) + "\\n"
-                                table_content += "[/TABLE]\\n\\n"
-                        
-                        # Look for table-like patterns in text (fallback)
-                        table_keywords = ['accuracy', 'precision', 'recall', 'f1-score', 'results', 'evaluation', 'performance']
-                        if any(keyword in text.lower() for keyword in table_keywords) and not tables:
-                            # Mark potential table sections
-                            lines = text.split('\\n')
-                            for i, line in enumerate(lines):
-                                if any(keyword in line.lower() for keyword in table_keywords):
-                                    # Check surrounding lines for numeric data
-                                    context_start = max(0, i-2)
-                                    context_end = min(len(lines), i+3)
-                                    context = lines[context_start:context_end]
-                                    
-                                    # Look for lines with numbers/percentages
-                                    numeric_lines = [l for l in context if any(c.isdigit() for c in l) and '%' in l]
-                                    if numeric_lines:
-                                        table_content += f"\\n\\n[POTENTIAL_TABLE_SECTION]\\n"
-                                        table_content += "\\n".join(numeric_lines)
-                                        table_content += "\\n[/POTENTIAL_TABLE_SECTION]\\n\\n"
-                                        break
-                        
-                        # Combine all content
-                        full_content = text + image_content + table_content
+                # Try to extract tables (even if not perfectly structured)
+                tables = extracted['tables']
+                table_content = ""
+                if tables:
+                    print(f"  📊 Page {page_num + 1}: Found {len(tables)} table(s)")
+                    for i, table in enumerate(tables):
+                        table_content += f"\\n\\n[TABLE {i+1}]\\n"
+                        for row in table:
+                            if row and any(cell for cell in row if cell):  # Skip empty rows
+                                clean_row = [str(cell).strip() if cell else "" for cell in row]
+                                table_content += " | ".join(clean_row) + "\\n"
+                        table_content += "[/TABLE]\\n\\n"
+            
+                # Look for table-like patterns in text (fallback)
+                table_keywords = ['accuracy', 'precision', 'recall', 'f1-score', 'results', 'evaluation', 'performance']
+                if any(keyword in text.lower() for keyword in table_keywords) and not tables:
+                    # Mark potential table sections
+                    lines = text.split('\\n')
+                    for i, line in enumerate(lines):
+                        if any(keyword in line.lower() for keyword in table_keywords):
+                            # Check surrounding lines for numeric data
+                            context_start = max(0, i-2)
+                            context_end = min(len(lines), i+3)
+                            context = lines[context_start:context_end]
                         
-                        # Create document with enhanced metadata
-                        doc = Document(
-                            page_content=full_content,
-                            metadata={
-                                'source': file_path,
-                                'page': page_num,
-                                'total_pages': len(pdf.pages),
-                                'processing_type': 'enhanced',
-                                'images_found': len(page_images),
-                                'images_extracted': len([img for img in page_images if img.get('path')]),
-                                'tables_found': len(tables) if tables else 0,
-                                'has_table_keywords': any(keyword in text.lower() for keyword in table_keywords)
-                            }
-                        )
-                        documents.append(doc)
-                
-                print(f"  ✅ Processing completed: {len(pdf.pages)} pages")
-                
-            except Exception as e:
-                print(f"  ⚠️ Processing failed for {filename}: {e}")
-                print(f"  🔄 Falling back to standard processing...")
-                # Fallback to standard processing
-                from langchain_community.document_loaders import PyPDFLoader
-                loader = PyPDFLoader(file_path)
-                fallback_docs = loader.load()
-                documents.extend(fallback_docs)
+                            # Look for lines with numbers/percentages
+                            numeric_lines = [l for l in context if any(c.isdigit() for c in l) and '%' in l]
+                            if numeric_lines:
+                                table_content += f"\\n\\n[POTENTIAL_TABLE_SECTION]\\n"
+                                table_content += "\\n".join(numeric_lines)
+                                table_content += "\\n[/POTENTIAL_TABLE_SECTION]\\n\\n"
+                                break
+            
+                # Combine all content
+                full_content = text + image_content + table_content
+            
+                # Create document with enhanced metadata
+                doc = Document(
+                    page_content=full_content,
+                    metadata={
+                        'source': file_path,
+                        'filename': filename,
+                        'page': page_num,
+                        'total_pages': page_count,
+                        'processing_type': 'enhanced',
+                        'images_found': len(page_images),
+                        'images_extracted': len([img for img in page_images if img.get('path')]),
+                        'tables_found': len(tables) if tables else 0,
+                        'has_table_keywords': any(keyword in text.lower() for keyword in table_keywords),
+                        'ocr': ocr_used,
+                        'extraction': extracted['extraction']
+                    }
+                )
+                documents.append(doc)
     
+            print(f"  ✅ Processing completed: {page_count} pages")
+        
+        except RebuildCancelled:
+            raise
+        except Exception as e:
+            print(f"  ⚠️ Processing failed for {filename}: {e}")
+            print(f"  🔄 Falling back to standard processing...")
+            # Fallback to standard processing
+            from langchain_community.document_loaders import PyPDFLoader
+            loader = PyPDFLoader(file_path)
+            fallback_docs = loader.load()
+            for doc in fallback_docs:
+                doc.metadata['filename'] = filename
+            documents.extend(fallback_docs)
+
+    report_progress(progress, "files", len(pdf_files), len(pdf_files))
     return documents
 
 def split_documents(documents: list[Document]):
@@ -250,12 +466,24 @@ def split_documents(documents: list[Document]):
             " ",                     # Word breaks
         ]
     )
-    return text_splitter.split_documents(documents)
+    chunks = text_splitter.split_documents(documents)
 
-def add_to_chroma(chunks: list[Document]):
+    # Page metadata says whether the page had tables; record it per chunk so
+    # table-only queries don't pull in the prose chunks of those pages.
+    for chunk in chunks:
+        chunk.metadata['chunk_has_table'] = chunk_has_table(chunk.page_content)
+
+    return chunks
+
+def add_to_chroma(chunks: list[Document], chroma_path=None, embeddings=None, progress=None, cancel_event=None,
+                  dedup_threshold=DEDUP_THRESHOLD):
     # Load the existing database.
+    # New collections get the tuned HNSW settings, see index_tuning.py.
+    chroma_path = chroma_path or shard_path(DEFAULT_SHARD)
     db = Chroma(
-        persist_directory=CHROMA_PATH, embedding_function=embedding_function()
+        persist_directory=chroma_path,
+        embedding_function=embeddings or embedding_function(),
+        collection_metadata=collection_metadata()
     )
 
     # Calculate Page IDs.
@@ -272,11 +500,32 @@ def add_to_chroma(chunks: list[Document]):
         if chunk.metadata["id"] not in existing_ids:
             new_chunks.append(chunk)
 
+    # Store near-identical chunks (boilerplate, repeated tables) once.
+    dedup_report = None
+    new_fingerprints = {}
+    if dedup_threshold and new_chunks:
+        existing, new_fingerprints = stored_fingerprints(db, chroma_path, existing_ids)
+        new_chunks, merged, dedup_report = collapse_near_duplicates(new_chunks, dedup_threshold, existing.items(),
+                                                                    fingerprints=new_fingerprints)
+        if merged:
+            stored = db.get(ids=list(merged), include=["metadatas"])
+            db._collection.update(ids=stored["ids"], metadatas=[
+                add_duplicates(metadata, merged[chunk_id])
+                for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+            ])
+
     if len(new_chunks):
         print(f"👉 Adding new documents: {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
+        # Embed and insert in batches so progress can be reported and a
+        # cancelled rebuild stops between batches.
+        total_batches = (len(new_chunks) + EMBEDDING_BATCH_SIZE - 1) // EMBEDDING_BATCH_SIZE
+        for batch_index in range(total_batches):
+            check_cancelled(cancel_event)
+            batch = new_chunks[batch_index * EMBEDDING_BATCH_SIZE:(batch_index + 1) * EMBEDDING_BATCH_SIZE]
+            db.add_documents(batch, ids=[chunk.metadata["id"] for chunk in batch])
+            report_progress(progress, "embedding", batch_index + 1, total_batches)
         db.persist()
+        save_fingerprints(chroma_path, new_fingerprints)
         
         # Show summary of enhanced content
         enhanced_chunks = [c for c in new_chunks if c.metadata.get('processing_type') == 'enhanced']
@@ -292,6 +541,37 @@ def add_to_chroma(chunks: list[Document]):
                 print(f"   📁 Images saved to: {os.path.abspath(IMAGES_PATH)}")
     else:
         print("✅ No new documents to add")
+        save_fingerprints(chroma_path, new_fingerprints)
+
+    if dedup_report and dedup_report['collapsed']:
+        # Only embeddings: the fingerprint files can outweigh the text and vectors not stored.
+        print(f"🧬 Collapsed {dedup_report['collapsed']} near-duplicate chunk(s): embedded "
+              f"{dedup_report['stored']} of {dedup_report['chunks']} "
+              f"({dedup_report['collapsed'] / dedup_report['chunks']:.0%} fewer embeddings)")
+    return dedup_report
+
+def stored_fingerprints(db, chroma_path, existing_ids):
+    """Fingerprints of the stored chunks, for deduplicating new ones against
+
+    They are read from the file saved with the shard; only chunks missing
+    from it (older shards, imported snapshots, chunks promoted when a file
+    was removed) are read back and hashed. Returns ({chunk_id:
+    fingerprint}, the newly computed ones, which still need saving).
+    """
+    saved = load_fingerprints(chroma_path)
+    existing = {chunk_id: saved[chunk_id] for chunk_id in existing_ids if chunk_id in saved}
+    if not saved or len(saved) > 2 * len(existing):
+        # Missing, unreadable or mostly deleted chunks by now: rewrite with the live ones.
+        save_fingerprints(chroma_path, existing, append=False)
+
+    missing = [chunk_id for chunk_id in existing_ids if chunk_id not in existing]
+    computed = {}
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE * 16):
+        batch = db.get(ids=missing[start:start + EMBEDDING_BATCH_SIZE * 16], include=["documents"])
+        for chunk_id, text in zip(batch["ids"], batch["documents"]):
+            computed[chunk_id] = fingerprint(text)
+    existing.update(computed)
+    return existing, computed
 
 def calculate_chunk_ids(chunks):
     last_page_id = None
@@ -317,9 +597,11 @@ def calculate_chunk_ids(chunks):
 
     return chunks
 
-def clear_database():
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+def clear_database(chroma_path=None):
+    chroma_path = chroma_path or CHROMA_PATH
+    if os.path.exists(chroma_path):
+        release_shards()
+        shutil.rmtree(chroma_path)
 
 if __name__ == "__main__":
     main()
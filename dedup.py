@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+import numpy as np
+
+# Chunks whose estimated Jaccard similarity (over word shingles) reaches this
+# are stored once. 1.0, the default, only collapses copies whose words are
+# identical; lower values also collapse edited copies and are opt-in, since
+# the edit may be what matters. Chunks with different numbers (doses,
+# intervals, lab values) are never collapsed at any threshold.
+DEDUP_THRESHOLD = 1.0
+NUM_PERMUTATIONS = 128
+SHINGLE_WORDS = 3
+_SEED = 20240601
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,:/]\d+)*")
+
+# Fingerprints of the stored chunks, kept next to each shard version so an
+# ingest doesn't re-read and re-hash the whole shard. Appended to, and
+# rewritten once most of the entries belong to deleted chunks.
+FINGERPRINTS_FILE = "dedup_fingerprints.bin"
+FINGERPRINT_IDS_FILE = "dedup_fingerprint_ids.txt"
+_FINGERPRINT = np.dtype([('signature', np.uint32, NUM_PERMUTATIONS), ('text', np.uint64), ('numbers', np.uint64)])
+
+_rng = np.random.default_rng(_SEED)
+# Multiply-shift hashing: odd 64-bit multipliers, wrap-around is intended.
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def normalized_words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def shingles(words, size=SHINGLE_WORDS):
+    """Hashes of the overlapping `size`-word windows of a list of words"""
+    if len(words) <= size:
+        windows = [" ".join(words)]
+    else:
+        windows = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.array(sorted({zlib.crc32(window.encode("utf-8")) for window in windows}), dtype=np.uint64)
+
+
+def minhash(words):
+    """MinHash signature of a list of words, NUM_PERMUTATIONS 32-bit values"""
+    hashes = shingles(words)
+    with np.errstate(over="ignore"):
+        permuted = (_MULTIPLIERS[:, None] * hashes[None, :] + _OFFSETS[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def fingerprint(text):
+    """(MinHash signature, hash of the words, hash of the numbers) of a chunk"""
+    words = normalized_words(text)
+    return minhash(words), _hash64(" ".join(words)), _hash64(" ".join(NUMBER_PATTERN.findall(text)))
+
+
+def choose_bands(threshold, permutations=NUM_PERMUTATIONS):
+    """(bands, rows) whose LSH S-curve turns at the threshold
+
+    Pairs at similarity s become candidates with probability
+    1 - (1 - s**rows)**bands, which rises steeply around (1/bands)**(1/rows).
+    """
+    options = [(permutations // rows, rows) for rows in range(1, permutations + 1) if permutations % rows == 0]
+    # Turn slightly below the threshold so near misses are still checked.
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold * 0.95))
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index over chunk fingerprints
+
+    At threshold 1.0 only chunks with the same words match. Below it, texts
+    sharing any band of their signature are candidates, and a candidate is a
+    near-duplicate when the share of equal signature values (an estimate of
+    the Jaccard similarity) reaches the threshold. Either way the numbers in
+    both texts must be the same.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.exact = threshold >= 1.0
+        self.bands, self.rows = (0, 0) if self.exact else choose_bands(threshold)
+        self.buckets = [{} for _ in range(self.bands)]
+        self.fingerprints = {}
+        self.by_text = {}
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, fingerprint):
+        signature, text_hash, _number_hash = fingerprint
+        self.fingerprints[key] = fingerprint
+        self.by_text.setdefault((text_hash, fingerprint[2]), key)
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def match(self, fingerprint):
+        """The most similar indexed key at or above the threshold, or None"""
+        signature, text_hash, number_hash = fingerprint
+        if self.exact:
+            return self.by_text.get((text_hash, number_hash))
+
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(band_key, ()))
+
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            stored_signature, _text_hash, stored_number_hash = self.fingerprints[key]
+            # "500 mg every 12 hours" is not a copy of "750 mg every 8 hours".
+            if stored_number_hash != number_hash:
+                continue
+            similarity = float(np.mean(stored_signature == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+
+def chunk_source(chunk_id):
+    """The source path part of a "source:page:index" chunk ID"""
+    return chunk_id.rsplit(":", 2)[0]
+
+
+def collapse_near_duplicates(chunks, threshold=DEDUP_THRESHOLD, existing=None, fingerprints=None):
+    """Keep one chunk per group of near-identical chunks
+
+    existing: (chunk_id, fingerprint) pairs already stored, which act as the
+    representatives for new copies of themselves. fingerprints, when given,
+    is filled with the fingerprint of every kept chunk.
+
+    Returns (kept, merged, report). Kept chunks carry 'duplicate_ids' and
+    'sources' (JSON lists) and 'duplicate_count' when copies were collapsed
+    into them. merged maps IDs of existing chunks to the new chunk IDs
+    collapsed into them, whose stored metadata still needs updating.
+    """
+    index = NearDuplicateIndex(threshold)
+    for chunk_id, stored in existing or ():
+        index.add(chunk_id, stored)
+
+    kept, copies, by_id = [], {}, {}
+    for chunk in chunks:
+        chunk_id = chunk.metadata["id"]
+        chunk_fingerprint = fingerprint(chunk.page_content)
+        representative = index.match(chunk_fingerprint)
+        if representative is None:
+            index.add(chunk_id, chunk_fingerprint)
+            if fingerprints is not None:
+                fingerprints[chunk_id] = chunk_fingerprint
+            kept.append(chunk)
+            by_id[chunk_id] = chunk
+        else:
+            copies.setdefault(representative, []).append(chunk)
+
+    merged = {}
+    for representative, duplicates in copies.items():
+        duplicate_ids = [chunk.metadata["id"] for chunk in duplicates]
+        if representative in by_id:
+            add_duplicates(by_id[representative].metadata, duplicate_ids)
+        else:
+            merged[representative] = duplicate_ids
+
+    collapsed = len(chunks) - len(kept)
+    report = {
+        'chunks': len(chunks),
+        'stored': len(kept),
+        'collapsed': collapsed,
+    }
+    return kept, merged, report
+
+
+def load_fingerprints(chroma_path):
+    """{chunk_id: fingerprint} saved with a shard version, {} if there are none"""
+    try:
+        with open(os.path.join(chroma_path, FINGERPRINT_IDS_FILE), encoding="utf-8") as f:
+            ids = f.read().splitlines()
+        records = np.fromfile(os.path.join(chroma_path, FINGERPRINTS_FILE), dtype=_FINGERPRINT)
+    except FileNotFoundError:
+        return {}
+    if len(ids) != len(records):
+        # Written by an interrupted ingest, start over from the chunk texts.
+        return {}
+    return {chunk_id: (record['signature'], int(record['text']), int(record['numbers']))
+            for chunk_id, record in zip(ids, records)}
+
+
+def save_fingerprints(chroma_path, fingerprints, append=True):
+    """Append {chunk_id: fingerprint}, or replace the saved ones with append=False"""
+    if not fingerprints and append:
+        return
+    records = np.zeros(len(fingerprints), dtype=_FINGERPRINT)
+    for record, (signature, text_hash, number_hash) in zip(records, fingerprints.values()):
+        record['signature'], record['text'], record['numbers'] = signature, text_hash, number_hash
+    mode = "a" if append else "w"
+    with open(os.path.join(chroma_path, FINGERPRINTS_FILE), mode + "b") as f:
+        records.tofile(f)
+    with open(os.path.join(chroma_path, FINGERPRINT_IDS_FILE), mode, encoding="utf-8") as f:
+        f.write("".join(f"{chunk_id}\n" for chunk_id in fingerprints))
+
+
+def add_duplicates(metadata, duplicate_ids):
+    """Record collapsed copies in a representative's metadata, in place"""
+    # Re-adding a file that was collapsed before must not list its copies twice.
+    ids = list(dict.fromkeys(json.loads(metadata.get("duplicate_ids", "[]")) + list(duplicate_ids)))
+    sources = json.loads(metadata.get("sources", "[]")) or [metadata.get("source")]
+    for chunk_id in duplicate_ids:
+        if chunk_source(chunk_id) not in sources:
+            sources.append(chunk_source(chunk_id))
+    metadata["duplicate_ids"] = json.dumps(ids)
+    metadata["sources"] = json.dumps(sources)
+    metadata["duplicate_count"] = len(ids)
+    return metadata
+
+
+def copy_metadata(metadata, chunk_id):
+    """A collapsed copy's metadata: the representative's, with the copy's ID, file and page"""
+    source, page, _index = chunk_id.rsplit(":", 2)
+    metadata = dict(metadata, id=chunk_id, source=source, page=int(page) if page.isdigit() else page)
+    if "filename" in metadata:
+        metadata["filename"] = source.replace("\\", "/").rsplit("/", 1)[-1]
+    return metadata
+
+
+def copy_locations(metadata):
+    """Metadata of a stored chunk and of every copy collapsed into it"""
+    yield metadata
+    for chunk_id in json.loads(metadata.get("duplicate_ids", "[]")):
+        yield copy_metadata(metadata, chunk_id)
+
+
+def without_sources(chunk_id, metadata, removed_sources):
+    """A collapsed chunk's (chunk_id, metadata) after some sources are deleted
+
+    If the chunk's own source is removed, the first surviving copy takes
+    over as the representative under its own ID. Returns None when no copy
+    survives.
+    """
+    removed_sources = set(removed_sources)
+    survivors = [duplicate for duplicate in json.loads(metadata.get("duplicate_ids", "[]"))
+                 if chunk_source(duplicate) not in removed_sources]
+
+    metadata = dict(metadata)
+    if metadata.get("source") in removed_sources:
+        if not survivors:
+            return None
+        chunk_id = survivors.pop(0)
+        metadata = copy_metadata(metadata, chunk_id)
+
+    # Reset rather than drop the keys: Chroma merges updated metadata.
+    metadata.update({'duplicate_ids': "[]", 'sources': json.dumps([metadata.get("source")]), 'duplicate_count': 0})
+    add_duplicates(metadata, survivors)
+    return chunk_id, metadata
@@ -1,16 +1,59 @@
 import os
+import threading
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
+from singleflight import SingleFlight
 
 load_dotenv()
 
+# Vectors from different models are not comparable, snapshots record this.
+EMBEDDING_MODEL = "models/embedding-001"
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Wraps an embeddings backend so the same text is never embedded twice at once
+
+    Duplicate texts within a batch (repeated headers and footers) are sent
+    once, and identical requests made concurrently share a single call.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.flight = SingleFlight()
+        self.stats = {'texts': 0, 'duplicate_texts': 0}
+
+    def embed_documents(self, texts, **kwargs):
+        unique = list(dict.fromkeys(texts))
+        # Query and prefetch threads embed at once; count under the in-flight table's lock.
+        with self.flight._lock:
+            self.stats['texts'] += len(texts)
+            self.stats['duplicate_texts'] += len(texts) - len(unique)
+
+        key = ("documents", tuple(unique), tuple(sorted(kwargs.items())))
+        vectors = self.flight.do(key, lambda _abandoned: self.embeddings.embed_documents(unique, **kwargs))
+        by_text = dict(zip(unique, vectors))
+        return [by_text[text] for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        key = ("query", text, tuple(sorted(kwargs.items())))
+        return self.flight.do(key, lambda _abandoned: self.embeddings.embed_query(text, **kwargs))
+
+
 def embedding_function():
+    # One shared client, so concurrent callers can share in-flight requests.
+    global _embeddings
     api_key = os.environ.get('GEMINI_API_KEY')
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
-    
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=api_key
-    )
-    return embeddings
\ No newline at end of file
+
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = CoalescingEmbeddings(GoogleGenerativeAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                google_api_key=api_key
+            ))
+    return _embeddings
@@ -0,0 +1,144 @@
+import inspect
+import re
+import time
+
+from shards import list_shards, search_shards_by_vectors
+
+EXPANSION_COUNT = 3
+# Reciprocal rank fusion constant; 60 is the usual choice and damps the
+# influence of any single list's top ranks.
+RRF_K = 60
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "of", "on", "or", "please", "tell", "that", "the", "this", "to",
+    "was", "were", "what", "when", "where", "which", "who", "why", "with", "you",
+}
+
+# Cheap reformulations, filled with the question's keywords.
+TEMPLATES = (
+    "{keywords}",
+    "What does the document say about {keywords}?",
+    "Details, results and evaluation of {keywords}",
+    "Definition and description of {keywords}",
+    "{keywords} methods data tables",
+)
+
+EXPANSION_PROMPT = """
+Rewrite the question below in {count} different ways that could match different passages of a
+medical or scientific document. Use different wording and terminology. Write one rewrite per
+line, with no numbering or extra text.
+
+Question: {question}
+"""
+
+
+def question_keywords(query_text):
+    words = re.findall(r"[\w-]+", query_text.lower())
+    return " ".join(word for word in words if word not in STOPWORDS) or query_text
+
+
+def template_expansions(query_text, count=EXPANSION_COUNT):
+    keywords = question_keywords(query_text)
+    return [template.format(keywords=keywords) for template in TEMPLATES[:count]]
+
+
+def llm_expansions(query_text, llm, count=EXPANSION_COUNT):
+    """Ask the LLM for reformulations in a single call"""
+    response = llm.invoke(EXPANSION_PROMPT.format(count=count, question=query_text))
+    lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in response.content.splitlines()]
+    return [line for line in lines if line][:count]
+
+
+def expand_query(query_text, count=EXPANSION_COUNT, mode="template", llm=None):
+    """The question followed by up to `count` distinct reformulations"""
+    if mode == "llm":
+        if llm is None:
+            raise ValueError("LLM query expansion needs an llm")
+        expansions = llm_expansions(query_text, llm, count)
+    elif mode == "template":
+        expansions = template_expansions(query_text, count)
+    else:
+        raise ValueError(f"Unknown expansion mode: {mode}")
+
+    queries, seen = [], set()
+    for text in [query_text] + expansions:
+        key = " ".join(text.lower().split())
+        if key not in seen:
+            seen.add(key)
+            queries.append(text)
+    return queries
+
+
+def batches_queries(embeddings):
+    """Whether embed_documents can embed texts as queries (Gemini's task_type)"""
+    # CoalescingEmbeddings passes keyword arguments through to the backend it wraps.
+    backend = getattr(embeddings, "embeddings", embeddings)
+    try:
+        return "task_type" in inspect.signature(backend.embed_documents).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def embed_queries(embeddings, texts):
+    """Embed several questions, in one batched call where the backend allows it"""
+    if batches_queries(embeddings):
+        # Gemini embeds questions differently from the documents they should match.
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    # Embedding them as documents would quietly hurt retrieval, so one call each.
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """Fuse ranked (Document, distance) lists, deduplicating by chunk ID
+
+    Returns (Document, distance) pairs ordered by fused score; the distance
+    is the best one the chunk got in any list.
+    """
+    scores, best = {}, {}
+    for results in ranked_lists:
+        for rank, (doc, distance) in enumerate(results):
+            chunk_id = doc.metadata.get("id") or doc.page_content
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+            if chunk_id not in best or distance < best[chunk_id][1]:
+                best[chunk_id] = (doc, distance)
+    ranked = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], best[chunk_id][1]))
+    return [best[chunk_id] for chunk_id in ranked]
+
+
+def multi_query_search(query_text, embeddings, k=5, shards=None, root=None, where=None,
+                       count=EXPANSION_COUNT, mode="template", llm=None, stats=None):
+    """Search with the question and its reformulations, fused by reciprocal rank
+
+    All queries are embedded in one call and every (query, shard) search runs
+    concurrently, so the wall-clock cost stays close to a single search. When stats is given it receives the queries, per-stage
+    timings, the unique candidate count and 'overlap': the share of the fused
+    top-k that the original question alone also retrieved.
+    """
+    stats = stats if stats is not None else {}
+    if shards is None:
+        shards = list_shards(root)
+    if not shards:
+        return []
+
+    start = time.perf_counter()
+    queries = expand_query(query_text, count, mode, llm)
+    expanded = time.perf_counter()
+    vectors = embed_queries(embeddings, queries)
+    embedded = time.perf_counter()
+
+    ranked_lists = search_shards_by_vectors(vectors, embeddings, k, shards, root, where)
+    searched = time.perf_counter()
+
+    fused = reciprocal_rank_fusion(ranked_lists)[:k]
+    original = {doc.metadata.get("id") for doc, _distance in ranked_lists[0]}
+    stats.update({
+        'queries': queries,
+        'candidates': len({doc.metadata.get("id") for results in ranked_lists for doc, _distance in results}),
+        'overlap': sum(doc.metadata.get("id") in original for doc, _distance in fused) / max(1, len(fused)),
+        'expand_seconds': expanded - start,
+        'embed_seconds': embedded - expanded,
+        'search_seconds': searched - embedded,
+        'seconds': time.perf_counter() - start,
+    })
+    return fused
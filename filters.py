@@ -0,0 +1,125 @@
+# Query-side metadata filters. Each one maps onto metadata written at ingest
+# time, so Chroma applies it in its where clause before the vector search.
+from dedup import copy_locations
+
+TABLE_MARKERS = ("[TABLE ", "[POTENTIAL_TABLE_SECTION]")
+
+
+def chunk_has_table(text):
+    return any(marker in text for marker in TABLE_MARKERS)
+
+
+def parse_page_range(text):
+    """Parse "7", "3-7", "3-" or "-7" into a 1-based inclusive (first, last) pair"""
+    text = (text or "").strip()
+    if not text:
+        return None
+
+    first, separator, last = text.partition("-")
+    try:
+        first = int(first) if first.strip() else None
+        last = int(last) if last.strip() else None
+    except ValueError:
+        raise ValueError(f"Invalid page range '{text}'. Use e.g. 5, 3-7, 3- or -7")
+
+    if not separator:
+        last = first
+    if (first is not None and first < 1) or (first is not None and last is not None and last < first):
+        raise ValueError(f"Invalid page range '{text}'")
+
+    return first, last
+
+
+def build_where(filenames=None, page_range=None, tables_only=False):
+    """Build a Chroma where clause, or None when nothing is filtered
+
+    filenames: PDF file names (not paths) to restrict the search to.
+    page_range: 1-based inclusive (first, last) pair; either end may be None.
+    tables_only: only chunks that contain an extracted table.
+    """
+    conditions = []
+
+    if filenames:
+        filenames = list(filenames)
+        if len(filenames) == 1:
+            conditions.append({"filename": filenames[0]})
+        else:
+            conditions.append({"filename": {"$in": filenames}})
+
+    if page_range:
+        # Pages are stored 0-based.
+        first, last = page_range
+        if first is not None:
+            conditions.append({"page": {"$gte": first - 1}})
+        if last is not None:
+            conditions.append({"page": {"$lte": last - 1}})
+
+    if tables_only:
+        conditions.append({"chunk_has_table": True})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def with_collapsed(where):
+    """A where clause that also lets through chunks with collapsed copies
+
+    A collapsed chunk is stored with the file and page of its first copy
+    only, so its other copies are checked by matches_copies afterwards.
+    """
+    if not where:
+        return where
+    return {"$or": [where, {"duplicate_count": {"$gt": 0}}]}
+
+
+def matches_copies(metadata, where):
+    """Whether a stored chunk or any copy collapsed into it matches the where clause"""
+    return any(matches_where(location, where) for location in copy_locations(metadata))
+
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma where clause against one metadata dict in Python
+
+    Used by stores that can't push the filter down, such as index snapshots.
+    Supports $and/$or and the $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte operators.
+    """
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches_where(metadata, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(matches_where(metadata, clause) for clause in where["$or"])
+
+    for field, condition in where.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if not _compare(value, operator, operand):
+                return False
+    return True
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator {operator}")
@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from shards import (list_shards, new_shard_version, open_shard, publish_shard_version, release_shards, shard_lock,
+                    shard_path)
+from snapshot_store import SNAPSHOT_FILE
+
+# HNSW settings used for every Chroma collection created from now on.
+# `python index_tuning.py` measures the corpus and rewrites this file.
+INDEX_CONFIG_PATH = "index_config.json"
+# Chroma's own defaults, used until the index has been tuned.
+DEFAULT_INDEX_CONFIG = {'space': 'l2', 'M': 16, 'construction_ef': 100, 'search_ef': 100}
+SPACES = ("l2", "cosine", "ip")
+
+M_VALUES = (8, 16, 32)
+CONSTRUCTION_EF_VALUES = (64, 128, 256)
+SEARCH_EF_VALUES = (10, 20, 40, 80, 160, 320)
+TUNING_SAMPLE = 200
+TUNING_K = 5
+TARGET_RECALL = 0.95
+COPY_BATCH_SIZE = 1000
+
+
+def load_index_config(path=None):
+    """The tuned HNSW settings, or Chroma's defaults if none were written"""
+    config = dict(DEFAULT_INDEX_CONFIG)
+    try:
+        with open(path or INDEX_CONFIG_PATH, encoding="utf-8") as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return config
+    config.update({key: stored[key] for key in DEFAULT_INDEX_CONFIG if key in stored})
+    return config
+
+
+def collection_metadata(config=None):
+    """Chroma collection metadata that creates an index with these settings
+
+    Chroma only reads it when a collection is created; existing
+    collections keep the settings they were built with.
+    """
+    config = config or load_index_config()
+    return {
+        'hnsw:space': config['space'],
+        'hnsw:M': config['M'],
+        'hnsw:construction_ef': config['construction_ef'],
+        'hnsw:search_ef': config['search_ef'],
+    }
+
+
+def index_settings(db):
+    """The settings an open Chroma store's index was built with"""
+    hnsw = (getattr(db._collection, "configuration", None) or {}).get("hnsw") or {}
+    return {
+        'space': hnsw.get("space", DEFAULT_INDEX_CONFIG['space']),
+        'M': hnsw.get("max_neighbors", DEFAULT_INDEX_CONFIG['M']),
+        'construction_ef': hnsw.get("ef_construction", DEFAULT_INDEX_CONFIG['construction_ef']),
+        'search_ef': hnsw.get("ef_search", DEFAULT_INDEX_CONFIG['search_ef']),
+    }
+
+
+def mismatched_spaces(space, shards=None, root=None):
+    """Shards that would keep measuring distance differently from `space`
+
+    search_shards merges shards by raw distance, which only ranks correctly
+    when they all use one space. Imported snapshot shards are always L2;
+    when only some shards are given, the others keep their own space.
+    """
+    mismatched = []
+    for shard in list_shards(root):
+        if os.path.exists(os.path.join(shard_path(shard, root), SNAPSHOT_FILE)):
+            current = "l2"
+        elif shards and shard not in shards:
+            current = index_settings(open_shard(shard, root=root))['space']
+        else:
+            continue
+        if current != space:
+            mismatched.append(shard)
+    return mismatched
+
+
+def check_space(space, shards=None, root=None):
+    mismatched = mismatched_spaces(space, shards, root)
+    if mismatched:
+        raise ValueError(f"Can't use the {space} space while shard(s) {', '.join(mismatched)} measure distance "
+                         f"differently, their scores could not be ranked together. Rebuild or remove them first.")
+
+
+def stored_vectors(shards=None, root=None):
+    """Every stored chunk embedding of the given shards, as one float32 array"""
+    vectors = []
+    for shard in shards or list_shards(root):
+        stored = open_shard(shard, root=root).get(include=["embeddings"])["embeddings"]
+        if len(stored):
+            vectors.append(np.asarray(stored, dtype=np.float32))
+    return np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+def exact_distances(vectors, queries, space="l2"):
+    """Distances from every query to every vector, as Chroma reports them"""
+    if space == "l2":
+        return np.einsum("ij,ij->i", vectors, vectors)[None, :] - 2 * (queries @ vectors.T) \
+            + np.einsum("ij,ij->i", queries, queries)[:, None]
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    return 1.0 - queries @ vectors.T
+
+
+def exact_neighbors(vectors, queries, k, space="l2"):
+    """(indices, distances) of each query's k nearest vectors, by brute force"""
+    indices, distances = [], []
+    for start in range(0, len(queries), 256):
+        block = exact_distances(vectors, queries[start:start + 256], space)
+        best = np.argpartition(block, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(best, np.take_along_axis(block, best, axis=1).argsort(axis=1), axis=1)
+        indices.append(best)
+        distances.append(np.take_along_axis(block, best, axis=1))
+    return np.concatenate(indices), np.concatenate(distances)
+
+
+def recall_at_k(found_distances, true_distances):
+    """Share of the true top-k found
+
+    A result counts when it is no farther than the true k-th neighbour, so
+    vectors tied at that distance are interchangeable.
+    """
+    hits = sum(int(np.sum(np.asarray(found) <= kth + 1e-4 * max(1.0, abs(kth))))
+               for found, kth in zip(found_distances, true_distances[:, -1]))
+    return hits / true_distances.size
+
+
+def build_trial_index(path, vectors, config):
+    db = Chroma(persist_directory=path, collection_metadata=collection_metadata(config))
+    for start in range(0, len(vectors), COPY_BATCH_SIZE):
+        batch = vectors[start:start + COPY_BATCH_SIZE]
+        db._collection.add(ids=[str(start + offset) for offset in range(len(batch))], embeddings=batch)
+    return db
+
+
+def measure(db, queries, truth, k):
+    """(recall@k, per-query latencies in seconds), querying one at a time like a user"""
+    for query in queries[:5]:
+        db._collection.query(query_embeddings=[query], n_results=k, include=[])
+
+    found, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = db._collection.query(query_embeddings=[query], n_results=k, include=["distances"])
+        timings.append(time.perf_counter() - start)
+        found.append(result["distances"][0])
+    return recall_at_k(found, truth), timings
+
+
+def set_search_ef(db, path, search_ef):
+    db._collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    # Chroma keeps the loaded index, and its search ef, until its client is dropped.
+    release_shards()
+    return Chroma(persist_directory=path)
+
+
+def pareto_front(trials):
+    """Trials no other trial beats on both latency and recall, fastest first"""
+    front, best_recall = [], -1.0
+    for trial in sorted(trials, key=lambda trial: (trial['mean_ms'], -trial['recall'])):
+        if trial['recall'] > best_recall:
+            front.append(trial)
+            best_recall = trial['recall']
+    return front
+
+
+def choose_trial(front, target_recall=TARGET_RECALL):
+    """The fastest Pareto trial reaching the target recall, else the most accurate"""
+    reaching = [trial for trial in front if trial['recall'] >= target_recall]
+    return reaching[0] if reaching else front[-1]
+
+
+def tune_index(shards=None, root=None, k=TUNING_K, sample=TUNING_SAMPLE, space=None,
+               target_recall=TARGET_RECALL, m_values=M_VALUES, construction_ef_values=CONSTRUCTION_EF_VALUES,
+               search_ef_values=SEARCH_EF_VALUES, seed=0, config_path=None, question_vectors=None, progress=None):
+    """Sweep HNSW settings over the stored embeddings and save the best one
+
+    A random sample of stored chunk embeddings is held out as queries and
+    their exact top-k over the remaining vectors is found by brute force.
+    Every (M, construction ef) pair is built once from the remaining
+    vectors and searched at each search ef. The fastest setting on the
+    latency/recall Pareto front that reaches target_recall is written to
+    the config file with every measured curve; ingestion and rebuilt
+    shards then use it. Returns the written config.
+
+    question_vectors: embeddings of real questions, searched alongside the
+    held-out chunks. Short questions can sit far from every chunk, where
+    the graph search finds the true neighbours less reliably.
+    """
+    space = space or load_index_config(config_path)['space']
+    if space not in SPACES:
+        raise ValueError(f"Unknown distance space: {space}")
+    # New shards are built with the written config, whether or not it is applied.
+    check_space(space, root=root)
+
+    vectors = stored_vectors(shards, root)
+    sample = min(sample, len(vectors) // 5)
+    if sample < 1 or len(vectors) - sample < k:
+        raise ValueError("Not enough stored chunks to tune the index, ingest some documents first")
+
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    queries, indexed = vectors[order[:sample]], vectors[order[sample:]]
+    if question_vectors is not None and len(question_vectors):
+        queries = np.concatenate([queries, np.asarray(question_vectors, dtype=np.float32)])
+    _indices, truth = exact_neighbors(indexed, queries, k, space)
+    print(f"🎯 Tuning on {len(indexed)} vectors with {len(queries)} queries, recall@{k} target {target_recall:.0%}")
+
+    curves, trials = [], []
+    builds = [(m, construction_ef) for m in m_values for construction_ef in construction_ef_values]
+    for index, (m, construction_ef) in enumerate(builds):
+        config = {'space': space, 'M': m, 'construction_ef': construction_ef, 'search_ef': search_ef_values[0]}
+        with tempfile.TemporaryDirectory(prefix="rag_tuning_") as path:
+            start = time.perf_counter()
+            db = build_trial_index(path, indexed, config)
+            curve = {'M': m, 'construction_ef': construction_ef,
+                     'build_seconds': time.perf_counter() - start, 'points': []}
+
+            for search_ef in search_ef_values:
+                if search_ef != config['search_ef']:
+                    db = set_search_ef(db, path, search_ef)
+                recall, timings = measure(db, queries, truth, k)
+                point = {'search_ef': search_ef, 'recall': recall,
+                         'mean_ms': 1000 * sum(timings) / len(timings),
+                         'p95_ms': 1000 * float(np.percentile(timings, 95))}
+                curve['points'].append(point)
+                trials.append({'space': space, 'M': m, 'construction_ef': construction_ef, **point})
+            release_shards()
+        curves.append(curve)
+        print(format_curve(curve, k))
+        if progress is not None:
+            progress(index + 1, len(builds))
+
+    front = pareto_front(trials)
+    chosen = choose_trial(front, target_recall)
+    config = {key: chosen[key] for key in DEFAULT_INDEX_CONFIG}
+    config['tuning'] = {
+        'tuned_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'vectors': len(indexed),
+        'queries': len(queries),
+        'k': k,
+        'target_recall': target_recall,
+        'recall': chosen['recall'],
+        'mean_ms': chosen['mean_ms'],
+        'p95_ms': chosen['p95_ms'],
+        'pareto': front,
+        'curves': curves,
+    }
+    with open(config_path or INDEX_CONFIG_PATH, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    print(f"✅ Chose M={chosen['M']}, construction ef={chosen['construction_ef']}, search ef={chosen['search_ef']}: "
+          f"recall@{k} {chosen['recall']:.3f} at {chosen['mean_ms']:.2f} ms per query")
+    return config
+
+
+def format_curve(curve, k):
+    """One line per search ef of a latency versus recall curve"""
+    lines = [f"📈 M={curve['M']}, construction ef={curve['construction_ef']} "
+             f"(built in {curve['build_seconds']:.2f}s)"]
+    for point in curve['points']:
+        lines.append(f"   search ef {point['search_ef']:>4}: recall@{k} {point['recall']:.3f}, "
+                     f"{point['mean_ms']:.2f} ms mean, {point['p95_ms']:.2f} ms p95")
+    return "\n".join(lines)
+
+
+def apply_index_config(config=None, shards=None, root=None):
+    """Bring existing Chroma shards in line with the index settings
+
+    Shards whose space, M or construction ef differ are rebuilt into a new
+    version from their stored vectors, so nothing is re-embedded. When only
+    the search ef differs it is changed in place. Imported snapshot shards
+    are searched exactly and are left alone. Returns the shards changed.
+    """
+    config = config or load_index_config()
+    check_space(config['space'], shards, root)
+    changed = []
+    for shard in shards or list_shards(root):
+        # The same lock as a rebuild, the GUI or watcher may be ingesting into it.
+        with shard_lock(shard, root):
+            if apply_to_shard(shard, config, root):
+                changed.append(shard)
+
+    # Open clients keep the old index and search ef loaded.
+    release_shards()
+    return changed
+
+
+def apply_to_shard(shard, config, root=None):
+    """Rebuild or adjust one shard's index; returns whether it changed"""
+    live = shard_path(shard, root)
+    if os.path.exists(os.path.join(live, SNAPSHOT_FILE)):
+        return False
+
+    db = Chroma(persist_directory=live)
+    current = index_settings(db)
+    if all(current[key] == config[key] for key in ('space', 'M', 'construction_ef')):
+        if current['search_ef'] == config['search_ef']:
+            return False
+        db._collection.modify(configuration={"hnsw": {"ef_search": config['search_ef']}})
+        return True
+
+    print(f"🔧 Rebuilding the index of shard '{shard}' with M={config['M']}, "
+          f"construction ef={config['construction_ef']}")
+    version = new_shard_version(shard, root)
+    try:
+        copy_shard(db, version, config)
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+    publish_shard_version(shard, version, root)
+    return True
+
+
+def copy_shard(db, path, config):
+    """Copy every chunk of a Chroma store, vectors included, into a new index"""
+    target = Chroma(persist_directory=path, collection_metadata=collection_metadata(config))
+    count = db._collection.count()
+    for offset in range(0, count, COPY_BATCH_SIZE):
+        batch = db._collection.get(limit=COPY_BATCH_SIZE, offset=offset,
+                                   include=["embeddings", "documents", "metadatas"])
+        target._collection.add(ids=batch["ids"], embeddings=batch["embeddings"],
+                               documents=batch["documents"], metadatas=batch["metadatas"])
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the vector index for the latency/recall trade-off.")
+    parser.add_argument("--shard", action="append", help="Tune on this shard only (repeatable).")
+    parser.add_argument("-k", type=int, default=TUNING_K, help=f"Results per query (default {TUNING_K}).")
+    parser.add_argument("--sample", type=int, default=TUNING_SAMPLE,
+                        help=f"Stored chunks held out as queries (default {TUNING_SAMPLE}).")
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL,
+                        help=f"Recall@k the chosen setting must reach (default {TARGET_RECALL}).")
+    parser.add_argument("--questions", help="Text file of real questions, one per line, to tune with as well.")
+    parser.add_argument("--space", choices=SPACES, help="Distance space (default: the current one).")
+    parser.add_argument("--no-apply", action="store_true", help="Only write the config, leave built shards alone.")
+    args = parser.parse_args()
+
+    question_vectors = None
+    if args.questions:
+        from embedding_function import embedding_function
+        from expansion import embed_queries
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        # Embedded as queries, the way retrieval embeds real questions.
+        question_vectors = embed_queries(embedding_function(), questions)
+
+    config = tune_index(shards=args.shard, k=args.k, sample=args.sample, space=args.space,
+                        target_recall=args.target_recall, question_vectors=question_vectors)
+    if not args.no_apply:
+        changed = apply_index_config(config)
+        print(f"✅ Applied to {len(changed)} shard(s)" if changed else "✅ Every shard already uses these settings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import fitz
+
+# Pages whose text layer has fewer characters than this are treated as scans.
+MIN_TEXT_CHARS = 20
+OCR_DPI = 300
+OCR_LANGUAGE = "eng"
+OCR_CACHE_PATH = "ocr_cache"
+OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+_pool = None
+_tesseract_missing_reported = False
+
+
+def needs_ocr(text):
+    return len((text or "").strip()) < MIN_TEXT_CHARS
+
+
+def tesseract_ocr(png_bytes):
+    """Default OCR engine, runs in a worker process"""
+    import pytesseract
+    from PIL import Image
+    return pytesseract.image_to_string(Image.open(io.BytesIO(png_bytes)), lang=OCR_LANGUAGE)
+
+
+# Any picklable callable taking PNG bytes and returning text.
+OCR_ENGINE = tesseract_ocr
+
+
+def tesseract_available():
+    global _tesseract_missing_reported
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        if not _tesseract_missing_reported:
+            print("    📝 Tesseract not available, scanned pages will be indexed without text")
+            _tesseract_missing_reported = True
+        return False
+
+
+def _get_pool():
+    # One pool for the whole process, worker start-up is too slow to pay per PDF.
+    # Never forked straight from this process, the GUI runs threads in it.
+    global _pool
+    if _pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def _reset_pool():
+    # A worker that crashed (tesseract segfault, OOM kill) breaks the whole pool.
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _read_cache(cache_path, key):
+    try:
+        with open(os.path.join(cache_path, f"{key}.txt"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cache(cache_path, key, text):
+    os.makedirs(cache_path, exist_ok=True)
+    path = os.path.join(cache_path, f"{key}.txt")
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def _ocr_page(pdf_path, page_num, engine, cache_path):
+    """Render, hash and OCR one page in a worker process
+
+    Returns (text, served_from_cache).
+    """
+    with fitz.open(pdf_path) as document:
+        pixmap = document.load_page(page_num).get_pixmap(dpi=OCR_DPI)
+
+    # Hash the raw pixels, PNG encoding is only worth paying for on a miss.
+    engine_id = getattr(engine, "__qualname__", None) or getattr(getattr(engine, "func", None), "__qualname__", "engine")
+    digest = hashlib.sha256(f"{engine_id}:{OCR_LANGUAGE}:{pixmap.width}x{pixmap.height}x{pixmap.n}:".encode())
+    digest.update(pixmap.samples_mv)
+    key = digest.hexdigest()
+    cached = _read_cache(cache_path, key)
+    if cached is not None:
+        return cached, True
+
+    text = engine(pixmap.tobytes("png"))
+    _write_cache(cache_path, key, text)
+    return text, False
+
+
+def ocr_document(pdf_path, engine=None, cache_path=None, stats=None, cancel_event=None):
+    """OCR only the pages of a PDF that have no usable text layer
+
+    Text-less pages are found with PyMuPDF, then rendered and OCR'd in a
+    process pool. Results are cached by a hash of the rendered page image, so
+    an unchanged page is never OCR'd twice, even across rebuilds or when the
+    same page appears in another PDF.
+
+    Returns {page_index: text} for the pages that needed OCR. When stats is
+    given, its 'pages', 'cache_hits' and 'ocr_runs' counters are updated.
+    """
+    cache_path = cache_path or OCR_CACHE_PATH
+    engine = engine or OCR_ENGINE
+    stats = stats if stats is not None else {}
+    for counter in ("pages", "cache_hits", "ocr_runs"):
+        stats.setdefault(counter, 0)
+
+    texts = {}
+    if engine is tesseract_ocr and not tesseract_available():
+        return texts
+
+    with fitz.open(pdf_path) as document:
+        scanned_pages = [page_num for page_num in range(len(document))
+                         if needs_ocr(document.load_page(page_num).get_text())]
+    if not scanned_pages:
+        return texts
+
+    # Pages lost to a crashed worker are retried once on a fresh pool.
+    for attempt in range(2):
+        crashed = []
+        try:
+            pool = _get_pool()
+            futures = {page_num: pool.submit(_ocr_page, pdf_path, page_num, engine, cache_path)
+                       for page_num in scanned_pages}
+        except BrokenProcessPool:
+            _reset_pool()
+            continue
+        for page_num, future in futures.items():
+            if cancel_event is not None and cancel_event.is_set():
+                for pending in futures.values():
+                    pending.cancel()
+                return texts
+            try:
+                text, from_cache = future.result()
+            except BrokenProcessPool:
+                crashed.append(page_num)
+                continue
+            except Exception as e:
+                print(f"    ⚠️ OCR failed for page {page_num + 1}: {e}")
+                continue
+            texts[page_num] = text
+            stats["pages"] += 1
+            stats["cache_hits" if from_cache else "ocr_runs"] += 1
+
+        if not crashed:
+            break
+        _reset_pool()
+        print(f"    ⚠️ OCR worker crashed on {len(crashed)} page(s)"
+              + (", retrying" if attempt == 0 else ", giving up on them"))
+        scanned_pages = crashed
+
+    return texts
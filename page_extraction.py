@@ -0,0 +1,363 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+import fitz
+from file_lock import file_lock
+
+try:
+    import resource
+except ImportError:  # Windows, worker memory is not capped
+    resource = None
+
+PAGE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# A page still being extracted after this long is killed and falls back.
+PAGE_TIMEOUT_SECONDS = 60
+# Plain text of a page that fell back; after this long the page is left empty.
+FALLBACK_TIMEOUT_SECONDS = 10
+# Address space a worker may grow by past its start-up size (MB), None for no limit.
+PAGE_MEMORY_LIMIT_MB = 2048
+# After this many failed pages the rest of the file skips the workers.
+MAX_PAGE_FAILURES = 3
+QUARANTINE_PATH = "quarantine.json"
+
+# Never forked straight from this process: the GUI and query engine run
+# threads in it. A fork server (Unix) makes replacing a killed worker cheap,
+# as long as it has already imported the main script: otherwise every new
+# worker imports it (and Chroma, LangChain...) again.
+_context = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+if _context.get_start_method() == "forkserver":
+    _context.set_forkserver_preload(["__main__", "page_extraction", "pdfplumber"])
+# Sent to idle workers after a file so they don't keep it open.
+_RELEASE = "release"
+
+
+def extract_page(pdf, page_num):
+    """Default extractor, runs in a worker: text and tables of one pdfplumber page"""
+    page = pdf.pages[page_num]
+    try:
+        return {'text': page.extract_text() or "", 'tables': page.extract_tables() or []}
+    finally:
+        # Drop the parsed layout objects, big pages hold on to a lot of memory.
+        page.close()
+
+
+# Any picklable callable taking (pdfplumber PDF, page index) and returning
+# {'text': str, 'tables': list}.
+PAGE_EXTRACTOR = extract_page
+
+
+def _address_space_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _limit_memory(limit_mb):
+    if resource is None or not limit_mb:
+        return
+    # Spawned workers re-import the parent's main module, so their baseline
+    # varies; the cap is headroom on top of it.
+    limit = _address_space_bytes() + limit_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn, extractor, memory_limit_mb):
+    """Extract pages sent over conn until told to stop
+
+    The last opened PDF is kept open, pages of one file usually arrive
+    together.
+    """
+    import pdfplumber
+    _limit_memory(memory_limit_mb)
+
+    # Page deadlines start from here, not from the slow spawn and imports.
+    conn.send(('ready', None))
+    opened_path, pdf = None, None
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        if task == _RELEASE:
+            if pdf is not None:
+                pdf.close()
+                opened_path, pdf = None, None
+            continue
+
+        file_path, page_num, fallback = task
+        try:
+            if fallback:
+                conn.send(('ok', fallback_page(file_path, page_num)))
+                continue
+            if file_path != opened_path:
+                if pdf is not None:
+                    pdf.close()
+                    opened_path, pdf = None, None
+                pdf = pdfplumber.open(file_path)
+                opened_path = file_path
+            conn.send(('ok', extractor(pdf, page_num)))
+        except MemoryError:
+            # The heap may be left fragmented; exit so a fresh worker takes over.
+            conn.send(('memory', f"ran out of memory ({memory_limit_mb} MB limit)"))
+            break
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    if pdf is not None:
+        pdf.close()
+
+
+class _Worker:
+    def __init__(self, extractor, memory_limit_mb):
+        self.conn, child_conn = _context.Pipe()
+        self.process = _context.Process(target=_worker_main, args=(child_conn, extractor, memory_limit_mb),
+                                        name="page-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.page = None
+        self.fallback = False
+        self.started = 0.0
+        self.timeout = 0.0
+
+    def assign(self, file_path, page_num, timeout, fallback=False):
+        self.conn.send((file_path, page_num, fallback))
+        self.page = page_num
+        self.fallback = fallback
+        self.started = time.monotonic()
+        self.timeout = timeout
+
+    def release(self):
+        try:
+            self.conn.send(_RELEASE)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2)
+        self.kill()
+
+
+def fallback_page(file_path, page_num):
+    """Plain text of a page from PyMuPDF, used when full extraction failed
+
+    Runs on a worker as well: a page that broke pdfplumber can hang PyMuPDF too.
+    """
+    with fitz.open(file_path) as document:
+        return {'text': document.load_page(page_num).get_text(), 'tables': []}
+
+
+class PageExtractor:
+    """Extracts PDF pages on supervised worker processes
+
+    Every page runs with a deadline and each worker with a memory cap. A
+    worker that times out, runs out of memory or crashes is replaced, and
+    only that page falls back to plain text, read on a worker under its own
+    deadline; the rest of the document is unaffected. Use as a context
+    manager so the workers are shut down.
+    """
+
+    def __init__(self, workers=None, timeout=None, memory_limit_mb=None, extractor=None, max_failures=None):
+        # Defaults are read now so the module settings can be changed at runtime.
+        self.workers = max(1, workers or PAGE_WORKERS)
+        self.timeout = timeout or PAGE_TIMEOUT_SECONDS
+        self.memory_limit_mb = memory_limit_mb if memory_limit_mb is not None else PAGE_MEMORY_LIMIT_MB
+        self.extractor = extractor or PAGE_EXTRACTOR
+        self.max_failures = max_failures or MAX_PAGE_FAILURES
+        self._pool = []
+        self.stats = {'pages': 0, 'fallbacks': 0, 'timeouts': 0, 'restarts': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for worker in self._pool:
+            worker.stop()
+        self._pool = []
+
+    def _replace(self, worker):
+        worker.kill()
+        self._pool.remove(worker)
+        self.stats['restarts'] += 1
+
+    def extract(self, file_path, page_count, cancel_event=None, on_page=None):
+        """Extract every page of a PDF
+
+        Returns (pages, failures): one {'text', 'tables', 'extraction'} dict
+        per page, in order, and a list of {'page', 'reason', 'detail',
+        'seconds'} dicts for pages that fell back. Stops early, with pages
+        missing, once cancel_event is set. on_page(done, total) reports
+        progress.
+        """
+        results, failures = {}, {}
+        pending, fallbacks = deque(range(page_count)), deque()
+
+        def fail(page_num, reason, detail, seconds=0.0, fallback=False):
+            if fallback:
+                results[page_num] = {'text': "", 'tables': [], 'extraction': 'failed'}
+                failures[page_num]['detail'] += f"; fallback failed: {detail}"
+                return
+            failures[page_num] = {'page': page_num, 'reason': reason, 'detail': detail, 'seconds': round(seconds, 3)}
+            if reason == 'timeout':
+                self.stats['timeouts'] += 1
+            fallbacks.append(page_num)
+            self.stats['fallbacks'] += 1
+
+        while pending or fallbacks or any(worker.page is not None for worker in self._pool):
+            if cancel_event is not None and cancel_event.is_set():
+                # Workers may be mid-page; only fresh ones can be trusted with the next file.
+                for worker in list(self._pool):
+                    self._replace(worker)
+                break
+
+            # One bad file must not hold up the rebuild page after page.
+            if pending and len(failures) >= self.max_failures:
+                detail = f"{len(failures)} pages of this file already failed"
+                while pending:
+                    fail(pending.popleft(), 'skipped', detail)
+
+            while (pending or fallbacks) and len(self._pool) < self.workers:
+                self._pool.append(_Worker(self.extractor, self.memory_limit_mb))
+            for worker in self._pool:
+                if worker.ready and worker.page is None:
+                    if fallbacks:
+                        worker.assign(file_path, fallbacks.popleft(), FALLBACK_TIMEOUT_SECONDS, fallback=True)
+                    elif pending:
+                        worker.assign(file_path, pending.popleft(), self.timeout)
+
+            starting = [worker for worker in self._pool if not worker.ready]
+            busy = [worker for worker in self._pool if worker.page is not None]
+            next_deadline = min([worker.started + worker.timeout for worker in busy],
+                                default=time.monotonic() + 0.2)
+            ready = wait([worker.conn for worker in starting + busy]
+                         + [worker.process.sentinel for worker in starting + busy],
+                         timeout=min(max(0.0, next_deadline - time.monotonic()), 0.2))
+
+            for worker in starting:
+                if worker.conn in ready:
+                    try:
+                        worker.ready = worker.conn.recv()[0] == 'ready'
+                    except (EOFError, OSError):
+                        pass
+                if not worker.ready and worker.process.sentinel in ready:
+                    worker.process.join(timeout=1)
+                    exitcode = worker.process.exitcode
+                    # Not left in the pool, the next file starts a fresh worker.
+                    self._pool.remove(worker)
+                    worker.kill()
+                    raise RuntimeError(f"Page worker failed to start (exit code {exitcode})")
+
+            for worker in busy:
+                page_num, fallback, seconds = worker.page, worker.fallback, time.monotonic() - worker.started
+                if worker.conn in ready:
+                    try:
+                        status, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        worker.process.join(timeout=1)
+                        status, payload = 'crashed', f"worker exited with code {worker.process.exitcode}"
+                    worker.page = None
+                    if status == 'ok':
+                        results[page_num] = dict(payload, extraction='fallback' if fallback else 'full')
+                    else:
+                        fail(page_num, status, payload, seconds, fallback)
+                    if status in ('memory', 'crashed'):
+                        self._replace(worker)
+                elif worker.process.sentinel in ready or not worker.process.is_alive():
+                    # Killed by the OS, typically out of memory, or a crash in native code.
+                    worker.page = None
+                    worker.process.join(timeout=1)
+                    fail(page_num, 'crashed', f"worker exited with code {worker.process.exitcode}", seconds, fallback)
+                    self._replace(worker)
+                elif seconds > worker.timeout:
+                    worker.page = None
+                    fail(page_num, 'timeout', f"no result after {worker.timeout}s", seconds, fallback)
+                    self._replace(worker)
+                else:
+                    continue
+                if on_page is not None:
+                    on_page(len(results), page_count)
+
+        for worker in self._pool:
+            if worker.ready and worker.page is None:
+                worker.release()
+        self.stats['pages'] += len(results)
+        pages = [results[page_num] for page_num in range(page_count) if page_num in results]
+        return pages, [failures[page_num] for page_num in sorted(failures)]
+
+
+_shared = None
+_shared_settings = None
+_shared_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def shared_extractor():
+    """The process's PageExtractor, kept between files and loads
+
+    Starting workers takes longer than extracting a small PDF, so every
+    load reuses the same ones. Only one file is extracted at a time; the
+    extractor is replaced when the module settings change.
+    """
+    global _shared, _shared_settings
+    with _shared_lock:
+        settings = (PAGE_WORKERS, PAGE_TIMEOUT_SECONDS, PAGE_MEMORY_LIMIT_MB, PAGE_EXTRACTOR, MAX_PAGE_FAILURES)
+        if _shared is not None and settings != _shared_settings:
+            _shared.close()
+            _shared = None
+        if _shared is None:
+            _shared, _shared_settings = PageExtractor(), settings
+        yield _shared
+
+
+def load_quarantine(path=None):
+    try:
+        with open(path or QUARANTINE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def update_quarantine(file_path, failures, path=None):
+    """Record the pages of a file that fell back, or clear it once it extracts cleanly"""
+    path = path or QUARANTINE_PATH
+    # The GUI, the watcher and the CLI may all be loading files at once.
+    with file_lock(f"{path}.lock"):
+        quarantine = load_quarantine(path)
+        if failures:
+            quarantine[file_path] = {'checked': time.strftime("%Y-%m-%d %H:%M:%S"), 'pages': failures}
+        elif file_path not in quarantine:
+            return quarantine
+        else:
+            del quarantine[file_path]
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(quarantine, f, indent=2)
+        os.replace(temporary, path)
+    return quarantine
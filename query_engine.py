@@ -0,0 +1,213 @@
+import queue
+import threading
+import time
+
+from rag_system import QueryCancelled, generate_answer, retrieve
+
+QUERY_WORKERS = 2
+MAX_PENDING_QUERIES = 8
+
+
+class QueryQueueFull(Exception):
+    """Raised by QueryEngine.submit when too many questions are waiting"""
+
+
+class QueryJob:
+    """One submitted question and, once it finishes, its outcome"""
+
+    def __init__(self, job_id, query, k, shards, where, prefetch, expand=0, expand_mode="template"):
+        self.id = job_id
+        self.query = query
+        self.k = k
+        self.shards = shards
+        self.where = where
+        self.prefetch = prefetch
+        self.expand = expand
+        self.expand_mode = expand_mode
+        self.cancel_event = threading.Event()
+        self.status = 'queued'  # then 'running', 'done', 'failed' or 'cancelled'
+        self.response = None
+        self.retrieved = None
+        self.expansion = None  # multi-query stats, when expand was used
+        self.error = None
+        self.seconds = 0.0
+        self.saved = 0.0
+        self._delivered = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise QueryCancelled()
+
+    def wait(self, timeout=None):
+        """Block until the job has been delivered; True unless timed out"""
+        return self._delivered.wait(timeout)
+
+
+class QueryEngine:
+    """Answers questions on a fixed pool of worker threads
+
+    At most `max_pending` questions may wait for a worker; submit() raises
+    QueryQueueFull beyond that. Finished jobs are handed to on_done in
+    submission order, whatever order they complete in, so answers never
+    overtake each other. Cancelling a job skips it if it hasn't started, or
+    stops it between retrieval and generation or mid-stream otherwise.
+
+    on_done(job) is called from a worker thread.
+    """
+
+    def __init__(self, workers=QUERY_WORKERS, max_pending=MAX_PENDING_QUERIES, on_done=None,
+                 chroma_path=None, embeddings=None, llm=None):
+        self.workers = workers
+        self.on_done = on_done
+        self.chroma_path = chroma_path
+        self.embeddings = embeddings
+        self.llm = llm
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._delivery_lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self._next_id = 0
+        self._next_delivery = 0
+        self._outstanding = {}  # job id -> job, until delivered
+        self._finished = {}     # job id -> job, finished but waiting for earlier jobs
+        self.stats = {'submitted': 0, 'done': 0, 'failed': 0, 'cancelled': 0, 'rejected': 0}
+        self._start_workers()
+
+    @property
+    def outstanding(self):
+        """Questions submitted but not delivered yet"""
+        with self._lock:
+            return len(self._outstanding)
+
+    def submit(self, query, k=5, shards=None, where=None, prefetch=None, supersede=False,
+               expand=0, expand_mode="template"):
+        """Queue a question and return its QueryJob
+
+        prefetch: optional callable run on the worker before retrieval,
+        returning (results, seconds saved) or None, e.g. a bound
+        SpeculativeRetriever.take.
+        supersede: cancel every earlier question that hasn't been delivered.
+        expand, expand_mode: multi-query expansion, see rag_system.retrieve.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Query engine has been shut down")
+            if supersede:
+                for job in self._outstanding.values():
+                    job.cancel()
+
+            job = QueryJob(self._next_id, query, k, shards, where, prefetch, expand, expand_mode)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.stats['rejected'] += 1
+                raise QueryQueueFull(f"{self._queue.maxsize} questions are already waiting")
+            self._next_id += 1
+            self._outstanding[job.id] = job
+            self.stats['submitted'] += 1
+        return job
+
+    def cancel_all(self):
+        """Cancel every question that hasn't been delivered"""
+        with self._lock:
+            jobs = list(self._outstanding.values())
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def set_workers(self, workers):
+        """Change the number of questions answered in parallel"""
+        with self._lock:
+            self.workers = max(1, workers)
+        self._start_workers()
+
+    def shutdown(self, wait=False):
+        self.cancel_all()
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers and not self._closed:
+                thread = threading.Thread(target=self._worker, name="query-worker", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                # Surplus workers retire after set_workers() lowered the count.
+                if self._closed or len(self._threads) > self.workers:
+                    self._threads.remove(threading.current_thread())
+                    return
+            try:
+                job = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        start = time.perf_counter()
+        try:
+            job.check_cancelled()
+            job.status = 'running'
+
+            retrieved = None
+            if job.prefetch is not None:
+                prefetched = job.prefetch()
+                if prefetched is not None:
+                    retrieved, job.saved = prefetched
+            job.check_cancelled()
+            if retrieved is None:
+                expansion = {}
+                retrieved = retrieve(job.query, k=job.k, chroma_path=self.chroma_path,
+                                     embeddings=self.embeddings, shards=job.shards, where=job.where,
+                                     expand=job.expand, expand_mode=job.expand_mode, llm=self.llm,
+                                     stats=expansion)
+                job.expansion = expansion or None
+            job.retrieved = retrieved
+            job.check_cancelled()
+
+            job.response = generate_answer(job.query, retrieved, llm=self.llm, cancel_event=job.cancel_event)
+            job.status = 'done'
+        except QueryCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = e
+        job.seconds = time.perf_counter() - start
+        self._deliver(job)
+
+    def _deliver(self, job):
+        # Held while calling on_done too, so deliveries never interleave.
+        with self._delivery_lock:
+            with self._lock:
+                self._finished[job.id] = job
+                ready = []
+                while self._next_delivery in self._finished:
+                    ready.append(self._finished.pop(self._next_delivery))
+                    self._outstanding.pop(self._next_delivery, None)
+                    self._next_delivery += 1
+                for finished in ready:
+                    self.stats[finished.status] += 1
+
+            for finished in ready:
+                if self.on_done is not None:
+                    try:
+                        self.on_done(finished)
+                    except Exception as e:
+                        print(f"⚠️ Query callback failed: {e}")
+                finished._delivered.set()
@@ -7,10 +7,20 @@ from datetime import datetime
 import json
 
 # Import your existing modules
-from rag_system import query_rag
-from database import main as build_database, clear_database
-from embedding_function import embedding_function
-from langchain_community.vectorstores import Chroma
+from rag_system import format_expansion, retrieve
+from expansion import EXPANSION_COUNT
+from query_engine import QUERY_WORKERS, QueryEngine, QueryQueueFull
+from database import build_database, clear_database, RebuildCancelled
+from filters import build_where, parse_page_range
+from shards import CHROMA_PATH, list_shards, open_shard
+from watcher import ContentWatcher
+from speculative import SpeculativeRetriever
+from snapshot import export_snapshot, import_snapshot
+from chat_history import ChatHistory
+from chat_view import ChatView
+
+ALL_SHARDS = "All shards"
+ALL_DOCUMENTS = "All documents"
 
 class RAGSystemGUI:
     def __init__(self, root):
@@ -34,9 +44,14 @@ class RAGSystemGUI:
             'dark': '#343A40'
         }
         
+        # Persisted as it grows, only a window of it is ever shown
+        self.chat_history = ChatHistory()
+        self.chat_matches = []
+        self.chat_match = -1
+        
         self.setup_styles()
         self.create_widgets()
-        self.chat_history = []
+        self.chat_view.show_latest()
         
     def setup_styles(self):
         """Configure custom styles for the application"""
@@ -140,14 +155,28 @@ class RAGSystemGUI:
         self.query_entry.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 10))
         self.query_entry.bind('<Return>', lambda e: self.submit_query())
         
+        # Retrieve in the background while the user pauses typing
+        self.speculative = SpeculativeRetriever(self._speculative_retrieve)
+        self.query_var.trace_add('write', lambda *args: self._on_query_typed())
+        
         # Submit button
         submit_btn = ttk.Button(input_frame, text="Ask", style='Primary.TButton',
                                command=self.submit_query)
         submit_btn.grid(row=0, column=1)
         
+        # Stop button, cancels every unanswered question
+        self.stop_btn = ttk.Button(input_frame, text="⏹ Stop", style='Danger.TButton',
+                                  command=self.stop_queries, state=tk.DISABLED)
+        self.stop_btn.grid(row=0, column=2, padx=(10, 0))
+        
+        # Questions are answered on a bounded worker pool and shown in the order asked
+        self.query_engine = QueryEngine(
+            on_done=lambda job: self.root.after(0, self._query_finished, job)
+        )
+        
         # Sample questions section
         samples_frame = ttk.LabelFrame(input_frame, text="Sample Questions (Click to Use)", padding="5")
-        samples_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        samples_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
         samples_frame.columnconfigure(0, weight=1)
         
         # Sample questions
@@ -186,7 +215,7 @@ class RAGSystemGUI:
         
         # Advanced options
         advanced_frame = ttk.Frame(input_frame)
-        advanced_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        advanced_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
         
         # Number of results
         ttk.Label(advanced_frame, text="Results:").grid(row=0, column=0, sticky=tk.W)
@@ -195,10 +224,44 @@ class RAGSystemGUI:
                                   textvariable=self.results_var)
         results_spin.grid(row=0, column=1, padx=(5, 20), sticky=tk.W)
         
+        # Shard selection
+        ttk.Label(advanced_frame, text="Search in:").grid(row=0, column=2, sticky=tk.W)
+        self.shard_var = tk.StringVar(value=ALL_SHARDS)
+        self.shard_combo = ttk.Combobox(advanced_frame, textvariable=self.shard_var, width=20,
+                                        values=[ALL_SHARDS], state='readonly')
+        self.shard_combo.grid(row=0, column=3, padx=(5, 20), sticky=tk.W)
+        
         # Clear chat button
         clear_btn = ttk.Button(advanced_frame, text="Clear Chat", 
                               command=self.clear_chat)
-        clear_btn.grid(row=0, column=2, sticky=tk.E)
+        clear_btn.grid(row=0, column=4, sticky=tk.E)
+        
+        # Metadata filters
+        ttk.Label(advanced_frame, text="Document:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        self.document_var = tk.StringVar(value=ALL_DOCUMENTS)
+        self.document_combo = ttk.Combobox(advanced_frame, textvariable=self.document_var, width=30,
+                                           values=[ALL_DOCUMENTS], state='readonly')
+        self.document_combo.grid(row=1, column=1, columnspan=2, padx=(5, 20), pady=(5, 0), sticky=tk.W)
+        
+        ttk.Label(advanced_frame, text="Pages:").grid(row=1, column=3, sticky=tk.W, pady=(5, 0))
+        self.pages_var = tk.StringVar()
+        pages_entry = ttk.Entry(advanced_frame, textvariable=self.pages_var, width=8)
+        pages_entry.grid(row=1, column=4, padx=(5, 20), pady=(5, 0), sticky=tk.W)
+        
+        self.tables_only_var = tk.BooleanVar(value=False)
+        tables_check = ttk.Checkbutton(advanced_frame, text="Only chunks with tables",
+                                       variable=self.tables_only_var)
+        tables_check.grid(row=1, column=5, pady=(5, 0), sticky=tk.W)
+        
+        self.prefetch_var = tk.BooleanVar(value=True)
+        prefetch_check = ttk.Checkbutton(advanced_frame, text="⚡ Prefetch while typing",
+                                         variable=self.prefetch_var)
+        prefetch_check.grid(row=0, column=5, sticky=tk.W)
+        
+        self.expand_var = tk.BooleanVar(value=False)
+        expand_check = ttk.Checkbutton(advanced_frame, text="🔀 Also search reworded questions",
+                                       variable=self.expand_var)
+        expand_check.grid(row=2, column=5, pady=(5, 0), sticky=tk.W)
         
         # Chat history
         chat_frame = ttk.LabelFrame(query_frame, text="Chat History", padding="10")
@@ -216,14 +279,24 @@ class RAGSystemGUI:
         self.chat_display.tag_configure("assistant", foreground=self.colors['dark'])
         self.chat_display.tag_configure("sources", foreground=self.colors['secondary'], font=('Arial', 9, 'italic'))
         self.chat_display.tag_configure("timestamp", foreground='gray', font=('Arial', 8))
+        self.chat_view = ChatView(self.chat_display, self.chat_history)
         
-        # Export chat button
+        # Search and export chat
         export_frame = ttk.Frame(query_frame)
         export_frame.grid(row=2, column=0, sticky=tk.E, pady=(10, 0))
         
+        self.chat_search_var = tk.StringVar()
+        self.chat_search_var.trace_add("write", lambda *args: self.chat_matches.clear())
+        search_entry = ttk.Entry(export_frame, textvariable=self.chat_search_var, width=25)
+        search_entry.grid(row=0, column=0, padx=(0, 5))
+        search_entry.bind('<Return>', lambda e: self.find_in_chat())
+        
+        find_btn = ttk.Button(export_frame, text="🔍 Find", command=self.find_in_chat)
+        find_btn.grid(row=0, column=1, padx=(0, 10))
+        
         export_btn = ttk.Button(export_frame, text="Export Chat", 
                                command=self.export_chat)
-        export_btn.grid(row=0, column=0)
+        export_btn.grid(row=0, column=2)
         
     def create_database_tab(self):
         """Create the database management tab"""
@@ -240,7 +313,7 @@ class RAGSystemGUI:
         info_frame.columnconfigure(1, weight=1)
         
         # Database stats
-        self.db_info_text = tk.Text(info_frame, height=3, font=('Arial', 9), state=tk.DISABLED)
+        self.db_info_text = tk.Text(info_frame, height=4, font=('Arial', 9), state=tk.DISABLED)
         self.db_info_text.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E))
         
         # Refresh info button
@@ -263,10 +336,40 @@ class RAGSystemGUI:
         add_docs_btn.grid(row=0, column=0, padx=(0, 10))
         
         # Rebuild database button
-        rebuild_btn = ttk.Button(btn_frame, text="🔄 Rebuild Database", 
-                                style='Warning.TButton',
-                                command=self.rebuild_database)
-        rebuild_btn.grid(row=0, column=1, padx=(0, 10))
+        self.rebuild_btn = ttk.Button(btn_frame, text="🔄 Rebuild Database", 
+                                     style='Warning.TButton',
+                                     command=self.rebuild_database)
+        self.rebuild_btn.grid(row=0, column=1, padx=(0, 10))
+        
+        # Cancel rebuild button
+        self.cancel_rebuild_btn = ttk.Button(btn_frame, text="⏹ Cancel Rebuild", 
+                                            style='Danger.TButton',
+                                            command=self.cancel_rebuild, state=tk.DISABLED)
+        self.cancel_rebuild_btn.grid(row=0, column=2, padx=(0, 10))
+        self.rebuild_cancel_event = None
+        
+        # Auto-ingest toggle
+        self.watcher = None
+        self.auto_ingest_var = tk.BooleanVar(value=False)
+        auto_ingest_check = ttk.Checkbutton(btn_frame, text="👁️ Auto-ingest new PDFs",
+                                            variable=self.auto_ingest_var,
+                                            command=self.toggle_auto_ingest)
+        auto_ingest_check.grid(row=0, column=3, padx=(10, 10))
+        
+        self.watcher_label = ttk.Label(btn_frame, text="", foreground='gray')
+        self.watcher_label.grid(row=0, column=4, sticky=tk.W)
+        
+        # Snapshot buttons
+        snapshot_frame = ttk.Frame(doc_frame)
+        snapshot_frame.grid(row=1, column=0, sticky=tk.W, pady=(10, 0))
+        
+        export_snapshot_btn = ttk.Button(snapshot_frame, text="📦 Export Snapshot", 
+                                        command=self.export_snapshot)
+        export_snapshot_btn.grid(row=0, column=0, padx=(0, 10))
+        
+        import_snapshot_btn = ttk.Button(snapshot_frame, text="📥 Import Snapshot", 
+                                        command=self.import_snapshot)
+        import_snapshot_btn.grid(row=0, column=1, padx=(0, 10))
         
         # Progress and logs
         log_frame = ttk.LabelFrame(db_frame, text="Process Logs", padding="10")
@@ -282,9 +385,13 @@ class RAGSystemGUI:
         # Progress bar
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(log_frame, variable=self.progress_var, 
-                                           mode='indeterminate')
+                                           mode='determinate', maximum=100)
         self.progress_bar.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
         
+        # Progress details
+        self.progress_label = ttk.Label(log_frame, text="", foreground='gray')
+        self.progress_label.grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        
     def create_settings_tab(self):
         """Create the settings tab"""
         settings_frame = ttk.Frame(self.notebook, padding="20")
@@ -319,12 +426,27 @@ class RAGSystemGUI:
         ttk.Label(paths_frame, text=content_path).grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
         
         ttk.Label(paths_frame, text="Database folder:").grid(row=1, column=0, sticky=tk.W)
-        chroma_path = os.path.abspath("chroma")
+        chroma_path = os.path.abspath(CHROMA_PATH)
         ttk.Label(paths_frame, text=chroma_path).grid(row=1, column=1, sticky=tk.W, padx=(10, 0))
         
+        # Query processing
+        queries_frame = ttk.LabelFrame(settings_frame, text="Query Processing", padding="10")
+        queries_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(queries_frame, text="Questions answered in parallel:").grid(row=0, column=0, sticky=tk.W)
+        self.workers_var = tk.IntVar(value=QUERY_WORKERS)
+        workers_spin = ttk.Spinbox(queries_frame, from_=1, to=8, width=5, textvariable=self.workers_var,
+                                  command=lambda: self.query_engine.set_workers(self.workers_var.get()))
+        workers_spin.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+        
+        self.supersede_var = tk.BooleanVar(value=False)
+        supersede_check = ttk.Checkbutton(queries_frame, text="A new question cancels unanswered ones",
+                                          variable=self.supersede_var)
+        supersede_check.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
         # About
         about_frame = ttk.LabelFrame(settings_frame, text="About", padding="10")
-        about_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        about_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         
         about_text = """Ezz Medical RAG System v1.0
         
@@ -349,24 +471,50 @@ Features:
             return
             
         # Check if database exists
-        if not os.path.exists("chroma"):
+        if not list_shards():
             messagebox.showerror("Error", "Database not found. Please build the database first.")
             return
             
+        # Read the options here, Tk variables must not be touched from worker threads
+        try:
+            options = self._query_options()
+        except ValueError as e:
+            messagebox.showwarning("Warning", str(e))
+            return
+        self.speculative.reserve(query, options)
+        
+        # Queue the question, reusing a speculative prefetch of it if there is one
+        k, shards, where, expand = options
+        try:
+            self.query_engine.submit(query, k=k, shards=list(shards) if shards else None,
+                                     where=json.loads(where), expand=expand,
+                                     prefetch=lambda: self.speculative.take(query, options),
+                                     supersede=self.supersede_var.get())
+        except QueryQueueFull as e:
+            messagebox.showwarning("Warning", f"Please wait for earlier answers: {e}")
+            return
+            
         # Clear query entry
         self.query_var.set("")
         
         # Add user message to chat
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.add_to_chat(f"[{timestamp}] You: {query}", "user")
+        self.add_to_chat(query, "user", label="You")
         
         # Update status
-        self.update_status("Processing query...", 'warning')
+        self._update_query_status()
         
-        # Start query in separate thread
-        thread = threading.Thread(target=self._process_query, args=(query,))
-        thread.daemon = True
-        thread.start()
+    def stop_queries(self):
+        """Cancel every question that hasn't been answered yet"""
+        if self.query_engine.cancel_all():
+            self.stop_btn.config(state=tk.DISABLED)
+            self.update_status("Stopping...", 'warning')
+            
+    def _update_query_status(self):
+        """Show how many questions are still being answered"""
+        waiting = self.query_engine.outstanding
+        self.stop_btn.config(state=tk.NORMAL if waiting else tk.DISABLED)
+        if waiting:
+            self.update_status(f"Processing {waiting} question(s)...", 'warning')
         
     def use_sample_question(self, question):
         """Use a sample question by setting it in the query field"""
@@ -374,58 +522,96 @@ Features:
         # Optionally auto-submit the query
         # self.submit_query()
         
-    def _process_query(self, query):
-        """Process query in background thread"""
+    def _query_options(self):
+        """Collect the search options as a hashable (k, shards, where, expand) tuple"""
+        k = self.results_var.get()
+        shard = self.shard_var.get()
+        shards = None if shard == ALL_SHARDS else (shard,)
+        
+        document = self.document_var.get()
+        where = build_where(
+            filenames=None if document == ALL_DOCUMENTS else [document],
+            page_range=parse_page_range(self.pages_var.get()),
+            tables_only=self.tables_only_var.get()
+        )
+        expand = EXPANSION_COUNT if self.expand_var.get() else 0
+        return k, shards, json.dumps(where, sort_keys=True), expand
+        
+    def _speculative_retrieve(self, query, options):
+        """Retrieval run by the speculative prefetcher"""
+        k, shards, where, expand = options
+        return retrieve(query, k=k, shards=list(shards) if shards else None, where=json.loads(where),
+                        expand=expand)
+        
+    def _on_query_typed(self):
+        """Start a speculative prefetch once typing pauses"""
+        if not self.prefetch_var.get():
+            self.speculative.cancel()
+            return
         try:
-            # Query the RAG system
-            response = query_rag(query)
-            
-            # Update UI in main thread
-            self.root.after(0, self._handle_query_response, response, query)
-            
-        except Exception as e:
-            self.root.after(0, self._handle_query_error, str(e))
+            options = self._query_options()
+        except (ValueError, tk.TclError):
+            return
+        if list_shards():
+            self.speculative.update(self.query_var.get(), options)
+        
+    def _query_finished(self, job):
+        """Show a finished question, called in the order questions were asked"""
+        if job.status == 'done':
+            self._handle_query_response(job.response, job.query, job.seconds, job.saved)
+            if job.expansion:
+                self.add_to_chat(format_expansion(job.expansion), "sources")
+        elif job.status == 'cancelled':
+            self.add_to_chat(job.query, "sources", label="Stopped")
+            self.update_status("Stopped", 'warning')
+        else:
+            self._handle_query_error(str(job.error))
+        self._update_query_status()
             
-    def _handle_query_response(self, response, query):
+    def _handle_query_response(self, response, query, elapsed=None, saved=0.0):
         """Handle successful query response"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        # Add response to chat, the query goes with it for exports
+        self.add_to_chat(response.content, "assistant", label="Assistant", query=query)
         
-        # Add response to chat
-        self.add_to_chat(f"[{timestamp}] Assistant: {response.content}", "assistant")
-        
-        # Add to chat history
-        self.chat_history.append({
-            'timestamp': timestamp,
-            'query': query,
-            'response': response.content
-        })
-        
-        self.update_status("Ready", 'success')
+        if saved > 0:
+            self.update_status(f"Ready ({elapsed:.1f}s, ⚡ prefetch saved {saved:.1f}s)", 'success')
+        else:
+            self.update_status("Ready", 'success')
         
     def _handle_query_error(self, error):
         """Handle query error"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.add_to_chat(f"[{timestamp}] Error: {error}", "sources")
+        self.add_to_chat(str(error), "sources", label="Error")
         self.update_status("Error occurred", 'danger')
         
-    def add_to_chat(self, text, tag):
-        """Add text to chat display"""
-        self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, text + "\n\n", tag)
-        self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+    def add_to_chat(self, text, tag, label=None, **fields):
+        """Save a message to the chat history and show it"""
+        self.chat_view.append(self.chat_history.append(text, tag, label=label, **fields))
         
     def clear_chat(self):
         """Clear the chat history"""
         if messagebox.askyesno("Confirm", "Clear chat history?"):
-            self.chat_display.config(state=tk.NORMAL)
-            self.chat_display.delete(1.0, tk.END)
-            self.chat_display.config(state=tk.DISABLED)
             self.chat_history.clear()
+            self.chat_view.clear()
+            self.chat_matches.clear()
+            
+    def find_in_chat(self):
+        """Show the next older message containing the search text"""
+        text = self.chat_search_var.get().strip()
+        if not text:
+            return
+        if not self.chat_matches:
+            self.chat_matches.extend(self.chat_history.search(text))
+            if not self.chat_matches:
+                self.update_status(f"No messages contain '{text}'", 'warning')
+                return
+            self.chat_match = -1
+        self.chat_match = (self.chat_match + 1) % len(self.chat_matches)
+        self.chat_view.highlight(self.chat_matches[self.chat_match])
+        self.update_status(f"Match {self.chat_match + 1} of {len(self.chat_matches)}", 'success')
             
     def export_chat(self):
         """Export chat history to file"""
-        if not self.chat_history:
+        if not len(self.chat_history):
             messagebox.showinfo("Info", "No chat history to export.")
             return
             
@@ -436,17 +622,8 @@ Features:
         
         if filename:
             try:
-                if filename.endswith('.json'):
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        json.dump(self.chat_history, f, indent=2, ensure_ascii=False)
-                else:
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        for entry in self.chat_history:
-                            f.write(f"[{entry['timestamp']}]\n")
-                            f.write(f"Q: {entry['query']}\n")
-                            f.write(f"A: {entry['response']}\n\n")
-                            
-                messagebox.showinfo("Success", f"Chat history exported to {filename}")
+                count = self.chat_history.export(filename)
+                messagebox.showinfo("Success", f"{count} answers exported to {filename}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to export: {e}")
                 
@@ -476,7 +653,82 @@ Features:
                 files_text = "\n".join(copied_files)
                 messagebox.showinfo("Success", f"Added {len(copied_files)} file(s):\n{files_text}")
                 self.log(f"Added {len(copied_files)} documents to content folder")
+                if self.watcher is not None:
+                    self.log("They will be ingested automatically")
                 
+    def toggle_auto_ingest(self):
+        """Start or stop watching the content folder"""
+        if self.auto_ingest_var.get():
+            self.watcher = ContentWatcher(
+                on_batch=lambda changed, removed: self.root.after(0, self._auto_ingest_done, changed, removed),
+                on_error=lambda error: self.root.after(0, self.log, f"Auto-ingest failed: {error}")
+            )
+            self.watcher.start()
+            self.log(f"Auto-ingest enabled ({self.watcher.backend.name})")
+            self._update_watcher_status()
+        elif self.watcher is not None:
+            watcher, self.watcher = self.watcher, None
+            threading.Thread(target=watcher.stop, daemon=True).start()
+            self.watcher_label.config(text="")
+            self.log("Auto-ingest disabled")
+            
+    def _update_watcher_status(self):
+        """Show the auto-ingest queue depth while the watcher runs"""
+        if self.watcher is None:
+            return
+        self.watcher_label.config(text=f"Queue: {self.watcher.queue_depth} file(s)")
+        self.root.after(1000, self._update_watcher_status)
+        
+    def _auto_ingest_done(self, changed, removed):
+        """Handle a batch ingested by the watcher"""
+        self.speculative.clear()
+        for path in changed:
+            self.log(f"Auto-ingested {os.path.basename(path)}")
+        for path in removed:
+            self.log(f"Removed {os.path.basename(path)} from the database")
+        self.update_database_status()
+        
+    def export_snapshot(self):
+        """Export the index to a snapshot bundle"""
+        bundle = filedialog.asksaveasfilename(title="Export snapshot as", initialfile="rag_snapshot")
+        if not bundle:
+            return
+        self.log(f"Exporting snapshot to {bundle}...")
+        threading.Thread(target=self._run_snapshot_task, args=(export_snapshot, bundle, "exported"),
+                         daemon=True).start()
+        
+    def import_snapshot(self):
+        """Replace the index with a snapshot bundle"""
+        bundle = filedialog.askdirectory(title="Select snapshot bundle")
+        if not bundle:
+            return
+        if not messagebox.askyesno("Confirm",
+                                  "The snapshot's shards will replace the current ones. Continue?"):
+            return
+        self.log(f"Importing snapshot from {bundle}...")
+        threading.Thread(target=self._run_snapshot_task, args=(import_snapshot, bundle, "imported"),
+                         daemon=True).start()
+        
+    def _run_snapshot_task(self, task, bundle, verb):
+        """Export or import a snapshot in a background thread"""
+        try:
+            manifest = task(bundle)
+            total = sum(info['count'] for info in manifest['shards'].values())
+            self.root.after(0, self._snapshot_done, f"Snapshot {verb}: {total} chunks")
+        except Exception as e:
+            self.root.after(0, self._snapshot_failed, str(e))
+            
+    def _snapshot_done(self, message):
+        self.log(message)
+        self.update_status(message, 'success')
+        self.speculative.clear()
+        self.update_database_status()
+        
+    def _snapshot_failed(self, error):
+        self.log(f"Snapshot failed: {error}")
+        self.update_status("Snapshot failed", 'danger')
+        messagebox.showerror("Error", f"Snapshot failed: {error}")
+        
     def rebuild_database(self):
         """Rebuild the entire database"""
         if not messagebox.askyesno("Confirm", 
@@ -484,37 +736,96 @@ Features:
             return
             
         self.update_status("Rebuilding database...", 'warning')
-        self.progress_bar.start()
+        self.progress_var.set(0)
+        self.rebuild_btn.config(state=tk.DISABLED)
+        self.cancel_rebuild_btn.config(state=tk.NORMAL)
         
-        thread = threading.Thread(target=self._rebuild_database)
+        # Queries keep running against the current database while this builds
+        self.rebuild_cancel_event = threading.Event()
+        thread = threading.Thread(target=self._rebuild_database, args=(self.rebuild_cancel_event,))
         thread.daemon = True
         thread.start()
         
-    def _rebuild_database(self):
+    def cancel_rebuild(self):
+        """Ask the running rebuild to stop at its next checkpoint"""
+        if self.rebuild_cancel_event is not None:
+            self.rebuild_cancel_event.set()
+            self.cancel_rebuild_btn.config(state=tk.DISABLED)
+            self.progress_label.config(text="Cancelling...")
+            self.log("Cancelling database rebuild...")
+        
+    def _rebuild_database(self, cancel_event):
         """Rebuild database in background thread"""
         try:
             self.root.after(0, self.log, "Starting database rebuild...")
                 
             # Rebuild database
-            build_database()
+            build_database(progress=self._rebuild_progress, cancel_event=cancel_event)
             
             self.root.after(0, self._rebuild_complete)
             
+        except RebuildCancelled:
+            self.root.after(0, self._rebuild_cancelled)
         except Exception as e:
             self.root.after(0, self._rebuild_error, str(e))
             
+    def _rebuild_progress(self, stage, done, total, detail):
+        """Progress callback, called from the rebuild thread"""
+        self.root.after(0, self._show_rebuild_progress, stage, done, total, detail)
+        
+    def _show_rebuild_progress(self, stage, done, total, detail):
+        """Show a rebuild progress event"""
+        labels = {
+            'shard': "Shard",
+            'files': "File",
+            'pages': "Page",
+            'chunks': "Chunks",
+            'embedding': "Embedding batch",
+            'swap': "Published shard",
+        }
+        text = f"{labels.get(stage, stage)} {done}/{total}"
+        if detail:
+            text += f" - {detail}"
+        self.progress_label.config(text=text)
+        self.progress_var.set(100 * done / total if total else 100)
+        
+        if stage == 'shard':
+            self.log(f"Building shard '{detail}'")
+        elif stage == 'swap':
+            self.log(f"Shard '{detail}' is live")
+        
+    def _rebuild_finished(self):
+        """Reset the rebuild controls"""
+        self.rebuild_cancel_event = None
+        self.rebuild_btn.config(state=tk.NORMAL)
+        self.cancel_rebuild_btn.config(state=tk.DISABLED)
+        
     def _rebuild_complete(self):
         """Handle successful database rebuild"""
-        self.progress_bar.stop()
+        self._rebuild_finished()
+        self.progress_var.set(100)
+        self.progress_label.config(text="")
         self.update_status("Database rebuilt successfully", 'success')
         self.log("Database rebuild completed")
+        self.speculative.clear()
+        self.update_database_status()
+        
+    def _rebuild_cancelled(self):
+        """Handle a cancelled database rebuild"""
+        self._rebuild_finished()
+        self.progress_var.set(0)
+        self.progress_label.config(text="")
+        self.update_status("Database rebuild cancelled", 'warning')
+        self.log("Database rebuild cancelled, the previous database is still in use")
         self.update_database_status()
         
     def _rebuild_error(self, error):
         """Handle database rebuild error"""
-        self.progress_bar.stop()
+        self._rebuild_finished()
+        self.progress_label.config(text="")
         self.update_status("Database rebuild failed", 'danger')
         self.log(f"Database rebuild failed: {error}")
+        self.update_database_status()
         
     def clear_database_confirm(self):
         """Confirm and clear the database"""
@@ -531,25 +842,33 @@ Features:
     def update_database_status(self):
         """Update database status information"""
         try:
-            if os.path.exists("chroma"):
-                # Try to get database info
-                embeddings = embedding_function()
-                db = Chroma(persist_directory="chroma", embedding_function=embeddings)
-                
-                # Get document count
+            shards = list_shards()
+            self.shard_combo.config(values=[ALL_SHARDS] + shards)
+            if self.shard_var.get() not in shards:
+                self.shard_var.set(ALL_SHARDS)
+            
+            content_files = []
+            for _folder, _dirs, files in os.walk("content"):
+                content_files.extend(f for f in files if f.endswith('.pdf'))
+            self.document_combo.config(values=[ALL_DOCUMENTS] + sorted(set(content_files)))
+            if self.document_var.get() not in content_files:
+                self.document_var.set(ALL_DOCUMENTS)
+            
+            if shards:
+                # Get document count per shard
                 try:
-                    existing_items = db.get(include=[])
-                    doc_count = len(existing_items["ids"]) if existing_items["ids"] else 0
+                    shard_counts = {}
+                    for shard in shards:
+                        existing_items = open_shard(shard).get(include=[])
+                        shard_counts[shard] = len(existing_items["ids"]) if existing_items["ids"] else 0
+                    doc_count = sum(shard_counts.values())
+                    shard_summary = ", ".join(f"{shard}: {count}" for shard, count in shard_counts.items())
                     
-                    self.db_status_label.config(text=f"📊 {doc_count} documents")
+                    self.db_status_label.config(text=f"📊 {doc_count} documents in {len(shards)} shard(s)")
                     
                     # Update detailed info
-                    content_files = []
-                    if os.path.exists("content"):
-                        content_files = [f for f in os.listdir("content") if f.endswith('.pdf')]
-                    
                     info_text = f"""Database Status: ✅ Active
-Documents in database: {doc_count}
+Documents in database: {doc_count} ({shard_summary})
 PDF files in content folder: {len(content_files)}
 Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"""
                     
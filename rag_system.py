@@ -1,14 +1,23 @@
 import argparse
+import json
 import os
-from langchain_community.vectorstores import Chroma
 from langchain.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
+from dedup import copy_locations
 from embedding_function import embedding_function
+from expansion import EXPANSION_COUNT, multi_query_search
+from filters import build_where, parse_page_range
+from shards import CHROMA_PATH, list_shards, search_shards
+from singleflight import Cancelled, SingleFlight
 
 load_dotenv()
 
-CHROMA_PATH = "chroma"
+LLM_MODEL = "gemini-2.0-flash-exp"
+
+# Identical questions asked at the same time share one search and one answer.
+_retrievals = SingleFlight()
+_answers = SingleFlight()
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context:
@@ -24,39 +33,172 @@ Answer the question based on the above context: {question}
 def main():
     # Create CLI.
     parser = argparse.ArgumentParser()
-    parser.add_argument("query_text", type=str, help="The query text.")
+    parser.add_argument("query_text", type=str, nargs="+", help="One or more questions, answered in order.")
+    parser.add_argument("--shard", action="append",
+                        help="Only search this shard (repeatable). Defaults to every shard.")
+    parser.add_argument("-k", type=int, default=5, help="Number of chunks to retrieve.")
+    parser.add_argument("--file", action="append", dest="filenames",
+                        help="Only search this PDF file name (repeatable).")
+    parser.add_argument("--pages", type=parse_page_range,
+                        help="Only search these pages, e.g. 5, 3-7, 3- or -7.")
+    parser.add_argument("--tables-only", action="store_true",
+                        help="Only search chunks that contain a table.")
+    parser.add_argument("--workers", type=int, default=1, help="Questions answered in parallel.")
+    parser.add_argument("--expand", type=int, nargs="?", const=EXPANSION_COUNT, default=0,
+                        help=f"Also search with N reformulations of the question (default {EXPANSION_COUNT}).")
+    parser.add_argument("--expand-with", choices=["template", "llm"], default="template",
+                        help="Reformulate with fixed templates (free) or one extra LLM call.")
     args = parser.parse_args()
-    query_text = args.query_text
-    query_rag(query_text)
+    where = build_where(args.filenames, args.pages, args.tables_only)
+
+    from query_engine import QueryEngine
+
+    def print_answer(job):
+        if len(args.query_text) > 1:
+            print(f"Question: {job.query}")
+        if job.status == 'done':
+            if job.expansion:
+                print(format_expansion(job.expansion))
+            print(format_response(job.response, job.retrieved))
+        elif job.status == 'cancelled':
+            print("⏹ Cancelled")
+        else:
+            print(f"❌ {job.error}")
+
+    engine = QueryEngine(workers=args.workers, max_pending=len(args.query_text), on_done=print_answer)
+    jobs = [engine.submit(query_text, k=args.k, shards=args.shard, where=where, expand=args.expand,
+                          expand_mode=args.expand_with)
+            for query_text in args.query_text]
+    try:
+        for job in jobs:
+            # Short waits keep Ctrl+C responsive.
+            while not job.wait(0.5):
+                pass
+    except KeyboardInterrupt:
+        print("Stopping...")
+        engine.cancel_all()
+        for job in jobs:
+            job.wait()
+    engine.shutdown()
+    if any(job.status == 'failed' for job in jobs):
+        raise SystemExit(1)
+
+
+def query_rag(query_text: str, k=5, chroma_path=None, embeddings=None, llm=None, shards=None, where=None,
+              retrieved=None, expand=0, expand_mode="template"):
+    """Answer a question from the database
+
+    retrieved: results of an earlier retrieve() call for this question
+    (e.g. a speculative prefetch), which skips embedding and search.
+    """
+    if retrieved is None:
+        retrieved = retrieve(query_text, k=k, chroma_path=chroma_path, embeddings=embeddings,
+                             shards=shards, where=where, expand=expand, expand_mode=expand_mode, llm=llm)
+    response_text = generate_answer(query_text, retrieved, llm=llm)
+    print(format_response(response_text, retrieved))
+    return response_text
 
 
-def query_rag(query_text: str):
-    # Ensure the Chroma directory exists
-    if not os.path.exists(CHROMA_PATH):
-        raise FileNotFoundError(f"Database not found at {CHROMA_PATH}. Please build the database first using the Database tab in the GUI or run 'python database.py'")
-    
-    # Prepare the DB.
-    embeddings = embedding_function()
-    db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
+def retrieve(query_text: str, k=5, chroma_path=None, embeddings=None, shards=None, where=None,
+             expand=0, expand_mode="template", llm=None, stats=None):
+    """Embed the question and search the selected shards, returning (Document, distance) pairs
 
-    # Search the DB.
-    results = db.similarity_search_with_score(query_text, k=5)
+    expand: also search with this many reformulations of the question and
+    fuse the results (see expansion.multi_query_search, which fills stats).
+    """
+    chroma_path = chroma_path or CHROMA_PATH
 
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
+    # Ensure at least one shard has been built
+    available_shards = list_shards(chroma_path)
+    if not available_shards:
+        raise FileNotFoundError(f"Database not found at {chroma_path}. Please build the database first using the Database tab in the GUI or run 'python database.py'")
+
+    missing_shards = [shard for shard in shards or [] if shard not in available_shards]
+    if missing_shards:
+        raise ValueError(f"Unknown shard(s): {', '.join(missing_shards)}. Available: {', '.join(available_shards)}")
+
+    # Search the DB, fanning out across the selected shards.
+    embeddings = embeddings or embedding_function()
+    shards = shards or available_shards
 
+    def search(_abandoned):
+        if not expand:
+            return search_shards(query_text, embeddings, k=k, shards=shards, root=chroma_path, where=where), {}
+        expansion_llm = llm or (default_llm() if expand_mode == "llm" else None)
+        expansion = {}
+        results = multi_query_search(query_text, embeddings, k=k, shards=shards, root=chroma_path,
+                                     where=where, count=expand, mode=expand_mode, llm=expansion_llm,
+                                     stats=expansion)
+        return results, expansion
+
+    key = (query_text, k, os.path.abspath(chroma_path), tuple(shards), json.dumps(where, sort_keys=True),
+           id(embeddings), expand, expand_mode, id(llm) if expand and expand_mode == "llm" else None)
+    results, expansion = _retrievals.do(key, search)
+    if stats is not None:
+        stats.update(expansion)
+    return results
+
+
+def default_llm():
     api_key = os.environ.get('GEMINI_API_KEY')
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
-    
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", google_api_key=api_key)
-    response_text = llm.invoke(prompt)
 
-    sources = [doc.metadata.get("id", None) for doc, _score in results]
-    formatted_response = f"Response: {response_text.content}\nSources: {sources}"
-    print(formatted_response)
-    return response_text
+    return ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=api_key)
+
+
+class QueryCancelled(Exception):
+    """Raised when a question is cancelled before its answer is complete"""
+
+
+def generate_answer(query_text: str, results, llm=None, cancel_event=None):
+    """Build the prompt from retrieved chunks and ask the LLM
+
+    With a cancel_event the answer is streamed, so setting the event stops
+    generation between tokens. Identical prompts sent at the same time share
+    one LLM call; it only stops early once every caller has cancelled.
+    """
+    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
+    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+    prompt = prompt_template.format(context=context_text, question=query_text)
+
+    def ask(abandoned):
+        model = llm or default_llm()
+        if cancel_event is None:
+            return model.invoke(prompt)
+
+        response = None
+        for chunk in model.stream(prompt):
+            if abandoned():
+                raise QueryCancelled()
+            response = chunk if response is None else response + chunk
+        return response
+
+    try:
+        response = _answers.do((prompt, id(llm) if llm is not None else LLM_MODEL), ask, cancel_event)
+    except Cancelled:
+        raise QueryCancelled()
+    # Someone else still wanted the shared answer, but this caller doesn't.
+    if cancel_event is not None and cancel_event.is_set():
+        raise QueryCancelled()
+    return response
+
+
+def coalescing_stats():
+    """Counters of the shared in-flight retrieval and answer calls"""
+    return {'retrieval': dict(_retrievals.stats), 'answers': dict(_answers.stats)}
+
+
+def format_expansion(stats):
+    return (f"🔀 Searched {len(stats['queries'])} phrasings: {stats['candidates']} candidates, "
+            f"{stats['overlap']:.0%} of the fused top-k also found by the original question, "
+            f"{stats['seconds'] * 1000:.0f} ms")
+
+
+def format_response(response, results):
+    # A collapsed chunk stands for its copies in other files too.
+    sources = [location.get("id") for doc, _score in results for location in copy_locations(doc.metadata)]
+    return f"Response: {response.content}\nSources: {sources}"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,248 @@
+import contextlib
+import heapq
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from chromadb.api.client import SharedSystemClient
+from langchain_community.vectorstores import Chroma
+from file_lock import file_lock
+from filters import matches_copies, with_collapsed
+from snapshot_store import SNAPSHOT_FILE, SnapshotStore
+
+# Every shard is its own Chroma directory under CHROMA_PATH, e.g. chroma/cardiology.
+# Rebuilt shards are versioned: chroma/cardiology/CURRENT names the live
+# version directory, and a rebuild publishes a new one by rewriting CURRENT.
+CHROMA_PATH = "chroma"
+DEFAULT_SHARD = "default"
+MAX_SHARD_WORKERS = 8
+
+CHROMA_DB_FILE = "chroma.sqlite3"
+CURRENT_FILE = "CURRENT"
+# Versions this shard has published, oldest first. Only these are ever
+# deleted, a version still being built elsewhere is never listed here.
+PUBLISHED_FILE = "PUBLISHED"
+LOCK_FILE = "LOCK"
+VERSION_PREFIX = "v"
+
+
+def shard_dir(shard=DEFAULT_SHARD, root=None):
+    """Return the directory that holds every version of a shard"""
+    return os.path.join(root or CHROMA_PATH, shard)
+
+
+def shard_path(shard=DEFAULT_SHARD, root=None):
+    """Return the live Chroma directory of a shard"""
+    directory = shard_dir(shard, root)
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            return os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        # Not versioned yet, the Chroma database sits in the shard directory itself.
+        return directory
+
+
+def valid_shard_name(name):
+    """Whether name can be a shard: a single, visible path component"""
+    return (isinstance(name, str) and bool(name) and not name.startswith(".")
+            and not any(separator in name for separator in ("/", "\\", os.sep, os.altsep) if separator))
+
+
+def list_shards(root=None):
+    """List the names of all built shards, sorted"""
+    root = root or CHROMA_PATH
+    if not os.path.isdir(root):
+        return []
+
+    return sorted(
+        name for name in os.listdir(root)
+        if valid_shard_name(name) and is_built(shard_path(name, root))
+    )
+
+
+def is_built(path):
+    """Whether a directory holds a Chroma database or an imported snapshot"""
+    return (os.path.exists(os.path.join(path, CHROMA_DB_FILE))
+            or os.path.exists(os.path.join(path, SNAPSHOT_FILE)))
+
+
+@contextlib.contextmanager
+def shard_lock(shard, root=None):
+    """Hold a shard's build lock while building and publishing a version
+
+    Builds copy the live version and publish a new one, two concurrent builds
+    of a shard would silently drop one another's changes. It is a file lock,
+    so it also holds between the GUI, the watcher daemon and the CLI tools.
+    """
+    directory = shard_dir(shard, root)
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(os.path.join(directory, LOCK_FILE)):
+        yield
+
+
+def new_shard_version(shard, root=None):
+    """Reserve a fresh, unpublished version directory for a shard"""
+    directory = shard_dir(shard, root)
+    os.makedirs(directory, exist_ok=True)
+    version = f"{VERSION_PREFIX}{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    return os.path.join(directory, version)
+
+
+def shard_built_at(shard, root=None):
+    """When the build of a shard's live version started (epoch seconds), None if unversioned"""
+    version = os.path.basename(shard_path(shard, root))
+    try:
+        return time.mktime(time.strptime(version[len(VERSION_PREFIX):].split("-")[0], "%Y%m%d%H%M%S"))
+    except ValueError:
+        return None
+
+
+def _replace_file(path, text):
+    temporary = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def published_versions(shard, root=None):
+    """Names of the versions a shard has published, oldest first"""
+    try:
+        with open(os.path.join(shard_dir(shard, root), PUBLISHED_FILE), encoding="utf-8") as f:
+            return f.read().split()
+    except FileNotFoundError:
+        return []
+
+
+def publish_shard_version(shard, version_path, root=None):
+    """Atomically make a version directory the live one
+
+    Queries that already opened the previous version keep reading it; it is
+    kept until the next publish so they can finish. Versions published
+    before it are removed, unpublished ones are left to whoever builds them.
+    """
+    directory = shard_dir(shard, root)
+    previous = shard_path(shard, root)
+    version = os.path.basename(version_path)
+    superseded = [name for name in published_versions(shard, root)
+                  if name not in (version, os.path.basename(previous))]
+
+    kept = [version] if previous == directory else [os.path.basename(previous), version]
+    _replace_file(os.path.join(directory, PUBLISHED_FILE), "\n".join(kept) + "\n")
+    _replace_file(os.path.join(directory, CURRENT_FILE), version)
+
+    with _open_stores_lock:
+        _open_stores.pop(previous, None)
+
+    for name in superseded:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    if previous == directory:
+        # An unversioned database has now been superseded, drop its files.
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                if not name.startswith(VERSION_PREFIX):
+                    shutil.rmtree(path, ignore_errors=True)
+            elif name == CHROMA_DB_FILE:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+# Opening a Chroma store costs several times more than searching it, so
+# stores are kept open per directory and reused across queries.
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+# Shared by all queries so fan-out doesn't pay thread start-up every time.
+_executor = ThreadPoolExecutor(max_workers=MAX_SHARD_WORKERS, thread_name_prefix="shard-search")
+
+
+def open_shard(shard, embeddings=None, root=None):
+    """Return a cached store for a shard, for reads and searches by vector
+
+    Shards imported from a snapshot are served by a read-only SnapshotStore.
+    """
+    path = shard_path(shard, root)
+    with _open_stores_lock:
+        db = _open_stores.get(path)
+        if db is None:
+            if os.path.exists(os.path.join(path, SNAPSHOT_FILE)):
+                db = SnapshotStore(path)
+            else:
+                db = Chroma(persist_directory=path, embedding_function=embeddings)
+            _open_stores[path] = db
+    return db
+
+
+def release_shards():
+    """Drop every open store and Chroma's per-directory client cache.
+
+    Must be called before a shard directory is deleted or replaced, otherwise
+    later writes in this process go to the stale, deleted database files.
+    """
+    with _open_stores_lock:
+        _open_stores.clear()
+        SharedSystemClient.clear_system_cache()
+
+
+def search_shard(shard, query_embedding, k, embeddings, root=None, where=None):
+    db = open_shard(shard, embeddings, root)
+    if not where:
+        return db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+
+    # Collapsed chunks match when any of their copies does, which Chroma can't
+    # check, so fetch more until k of them pass or the shard runs out.
+    fetch = k
+    while True:
+        results = db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=fetch,
+                                                                       filter=with_collapsed(where))
+        matching = [(doc, distance) for doc, distance in results if matches_copies(doc.metadata, where)]
+        if len(matching) >= k or len(results) < fetch:
+            return matching[:k]
+        fetch *= 2
+
+
+def search_shards(query_text, embeddings, k=5, shards=None, root=None, where=None):
+    """Search one or more shards in parallel and merge the global top-k
+
+    Returns (Document, distance) pairs sorted by distance, like
+    Chroma.similarity_search_with_score. `where` is a Chroma metadata
+    filter (see filters.build_where) applied inside every shard.
+    """
+    if shards is None:
+        shards = list_shards(root)
+    if not shards:
+        return []
+
+    # Embed once and reuse the vector for every shard.
+    query_embedding = embeddings.embed_query(query_text)
+    return search_shards_by_vectors([query_embedding], embeddings, k, shards, root, where)[0]
+
+
+def search_shards_by_vectors(query_embeddings, embeddings, k=5, shards=None, root=None, where=None):
+    """Run every (query, shard) search concurrently
+
+    Returns one merged top-k list of (Document, distance) pairs per query
+    embedding, in the same order.
+    """
+    if shards is None:
+        shards = list_shards(root)
+    if not shards:
+        return [[] for _ in query_embeddings]
+
+    if len(shards) * len(query_embeddings) == 1:
+        return [search_shard(shards[0], query_embeddings[0], k, embeddings, root, where)]
+
+    futures = [
+        [_executor.submit(search_shard, shard, query_embedding, k, embeddings, root, where) for shard in shards]
+        for query_embedding in query_embeddings
+    ]
+    return [
+        heapq.nsmallest(k, [result for future in per_query for result in future.result()],
+                        key=lambda result: result[1])
+        for per_query in futures
+    ]
@@ -0,0 +1,72 @@
+import threading
+
+# How often a waiting caller checks its own cancel event.
+CANCEL_POLL_SECONDS = 0.05
+
+
+class Cancelled(Exception):
+    """Raised by SingleFlight.do for a caller that cancelled while waiting"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancel_events = []
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls into one
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it runs wait and receive the same result (or exception).
+    Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'calls': 0, 'shared': 0, 'cancelled': 0}
+
+    def do(self, key, fn, cancel_event=None):
+        """Return fn(abandoned), shared with identical calls made while it runs
+
+        abandoned() turns True once every caller sharing the call has set its
+        cancel_event, so fn can stop early. A waiting caller whose event is
+        set gets Cancelled straight away; the caller running fn only stops
+        when everyone has cancelled.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['calls'] += 1
+            else:
+                self.stats['shared'] += 1
+            call.cancel_events.append(cancel_event)
+
+        if leader:
+            try:
+                call.result = fn(lambda: self._abandoned(call))
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            while not call.done.wait(CANCEL_POLL_SECONDS if cancel_event is not None else None):
+                if cancel_event.is_set():
+                    with self._lock:
+                        self.stats['cancelled'] += 1
+                    raise Cancelled()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _abandoned(self, call):
+        with self._lock:
+            return all(event is not None and event.is_set() for event in call.cancel_events)
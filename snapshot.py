@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from embedding_function import EMBEDDING_MODEL
+from shards import list_shards, new_shard_version, open_shard, publish_shard_version, shard_lock, valid_shard_name
+from snapshot_store import (OFFSETS_FILE, RECORDS_FILE, SNAPSHOT_FILE, SNAPSHOT_FORMAT,
+                            SNAPSHOT_VERSION, VECTORS_FILE, SnapshotStore)
+
+# A snapshot bundle is a directory that can be zipped and shipped as-is:
+#   manifest.json                  format, embedding model, checksums, ingest manifest
+#   shards/<shard>/vectors.npy     float32 vectors, memory-mapped on load
+#   shards/<shard>/records.jsonl   one {"id", "text", "metadata"} object per line
+#   shards/<shard>/offsets.npy     byte offset of every line in records.jsonl
+MANIFEST_FILE = "manifest.json"
+SHARD_FILES = (VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE)
+RESTORE_BATCH_SIZE = 1000
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_shard_files(directory, ids, embeddings, documents, metadatas):
+    """Write the vectors, records and offsets of one shard"""
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, VECTORS_FILE), np.asarray(embeddings, dtype=np.float32))
+
+    offsets = [0]
+    with open(os.path.join(directory, RECORDS_FILE), "wb") as f:
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            line = json.dumps({"id": chunk_id, "text": text, "metadata": metadata},
+                              ensure_ascii=False).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(directory, OFFSETS_FILE), np.asarray(offsets, dtype=np.int64))
+
+    return {name: file_checksum(os.path.join(directory, name)) for name in SHARD_FILES}
+
+
+def ingest_manifest(metadatas):
+    """Summarise which source PDFs went into the index"""
+    sources = {}
+    for metadata in metadatas:
+        source = metadata.get("source")
+        entry = sources.setdefault(source, {
+            'filename': metadata.get("filename", os.path.basename(source or "")),
+            'shard': metadata.get("shard"),
+            'chunks': 0,
+            'pages': set(),
+        })
+        entry['chunks'] += 1
+        entry['pages'].add(metadata.get("page"))
+
+    for source, entry in sources.items():
+        entry['pages'] = len(entry['pages'])
+        if source and os.path.isfile(source):
+            entry['sha256'] = file_checksum(source)
+    return sources
+
+
+def export_snapshot(bundle_path, shards=None, root=None, embedding_model=EMBEDDING_MODEL):
+    """Write the selected shards (default: all) to a new snapshot bundle"""
+    if os.path.exists(bundle_path):
+        raise FileExistsError(f"{bundle_path} already exists")
+
+    shards = shards or list_shards(root)
+    if not shards:
+        raise FileNotFoundError("No database to export. Please build the database first.")
+
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'embedding_model': embedding_model,
+        'distance': "l2",
+        'dimensions': None,
+        'shards': {},
+        'sources': {},
+    }
+
+    staging = f"{bundle_path}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        for shard in shards:
+            data = open_shard(shard, root=root).get(include=["embeddings", "documents", "metadatas"])
+            if not data["ids"]:
+                print(f"⚠️ Shard '{shard}' is empty, skipping")
+                continue
+
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            if manifest['dimensions'] is None:
+                manifest['dimensions'] = int(embeddings.shape[1])
+            elif manifest['dimensions'] != embeddings.shape[1]:
+                raise ValueError(f"Shard '{shard}' has {embeddings.shape[1]}-dimensional vectors, "
+                                 f"expected {manifest['dimensions']}")
+
+            checksums = write_shard_files(os.path.join(staging, "shards", shard), data["ids"], embeddings,
+                                          data["documents"], data["metadatas"])
+            manifest['shards'][shard] = {'count': len(data["ids"]), 'checksums': checksums}
+            manifest['sources'].update(ingest_manifest(data["metadatas"]))
+            print(f"📦 Exported shard '{shard}': {len(data['ids'])} chunks")
+
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(staging, bundle_path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"✅ Snapshot written to {os.path.abspath(bundle_path)}")
+    return manifest
+
+
+def verify_snapshot(bundle_path, embedding_model=EMBEDDING_MODEL):
+    """Check format, embedding model and every file checksum; return the manifest"""
+    manifest_path = os.path.join(bundle_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"{bundle_path} is not a snapshot bundle (no {MANIFEST_FILE})")
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{bundle_path} is not an index snapshot")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot format version {manifest['version']} is newer than this program supports")
+    if embedding_model and manifest.get("embedding_model") != embedding_model:
+        raise ValueError(f"Snapshot was built with {manifest.get('embedding_model')}, "
+                         f"but this system embeds questions with {embedding_model}")
+
+    # Shard names become directory names, never let one point outside the bundle or chroma/.
+    for shard in manifest["shards"]:
+        if not valid_shard_name(shard):
+            raise ValueError(f"Snapshot has an invalid shard name: {shard!r}")
+
+    for shard, info in manifest["shards"].items():
+        if set(info["checksums"]) != set(SHARD_FILES):
+            raise ValueError(f"Snapshot shard '{shard}' does not list the expected files")
+        for name, expected in info["checksums"].items():
+            path = os.path.join(bundle_path, "shards", shard, name)
+            if not os.path.exists(path) or file_checksum(path) != expected:
+                raise ValueError(f"Snapshot file {path} is missing or corrupted")
+    return manifest
+
+
+def import_snapshot(bundle_path, shards=None, root=None, embedding_model=EMBEDDING_MODEL):
+    """Verify a bundle and publish its shards as the live versions
+
+    Nothing is re-embedded: each shard becomes a new version served straight
+    from the memory-mapped snapshot files, and goes live atomically.
+    """
+    manifest = verify_snapshot(bundle_path, embedding_model)
+    selected = shards or list(manifest["shards"])
+    unknown = [shard for shard in selected if shard not in manifest["shards"]]
+    if unknown:
+        raise ValueError(f"Snapshot has no shard(s): {', '.join(unknown)}")
+
+    for shard in selected:
+        info = manifest["shards"][shard]
+        # The same lock as a rebuild, so the watcher can't publish over the import.
+        with shard_lock(shard, root):
+            import_shard(bundle_path, manifest, shard, root)
+        print(f"📥 Imported shard '{shard}': {info['count']} chunks")
+    return manifest
+
+
+def import_shard(bundle_path, manifest, shard, root=None):
+    """Copy one verified shard of a bundle into a new version and publish it"""
+    info = manifest["shards"][shard]
+    version = new_shard_version(shard, root)
+    try:
+        os.makedirs(version)
+        for name in SHARD_FILES:
+            shutil.copyfile(os.path.join(bundle_path, "shards", shard, name), os.path.join(version, name))
+        with open(os.path.join(version, SNAPSHOT_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                'format': manifest["format"],
+                'version': manifest["version"],
+                'created': manifest["created"],
+                'embedding_model': manifest["embedding_model"],
+                'distance': manifest["distance"],
+                'dimensions': manifest["dimensions"],
+                'count': info["count"],
+                'checksums': info["checksums"],
+            }, f, indent=2)
+        # Fail before publishing if the copy doesn't open cleanly.
+        SnapshotStore(version)
+    except BaseException:
+        shutil.rmtree(version, ignore_errors=True)
+        raise
+
+    publish_shard_version(shard, version, root)
+
+
+def restore_snapshot(snapshot_path, chroma_path, embeddings=None):
+    """Load a snapshot shard into a Chroma database, reusing its vectors
+
+    Used when new documents are ingested into a shard that was imported.
+    """
+    from langchain_community.vectorstores import Chroma
+    from index_tuning import collection_metadata
+
+    store = SnapshotStore(snapshot_path)
+    db = Chroma(persist_directory=chroma_path, embedding_function=embeddings,
+                collection_metadata=collection_metadata())
+    for start in range(0, len(store), RESTORE_BATCH_SIZE):
+        end = min(start + RESTORE_BATCH_SIZE, len(store))
+        records = [store.record(index) for index in range(start, end)]
+        db._collection.add(
+            ids=[record["id"] for record in records],
+            embeddings=np.asarray(store.vectors[start:end]),
+            documents=[record["text"] for record in records],
+            metadatas=[record["metadata"] for record in records],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a portable snapshot of the index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write the index to a snapshot bundle.")
+    export_parser.add_argument("bundle", help="Directory to create.")
+    export_parser.add_argument("--shard", action="append", help="Only export this shard (repeatable).")
+
+    import_parser = commands.add_parser("import", help="Load a snapshot bundle as the live index.")
+    import_parser.add_argument("bundle", help="Snapshot bundle directory.")
+    import_parser.add_argument("--shard", action="append", help="Only import this shard (repeatable).")
+
+    verify_parser = commands.add_parser("verify", help="Check a snapshot bundle's checksums.")
+    verify_parser.add_argument("bundle", help="Snapshot bundle directory.")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_snapshot(args.bundle, shards=args.shard)
+    elif args.command == "import":
+        import_snapshot(args.bundle, shards=args.shard)
+    else:
+        manifest = verify_snapshot(args.bundle)
+        total = sum(info["count"] for info in manifest["shards"].values())
+        print(f"✅ Snapshot OK: {len(manifest['shards'])} shard(s), {total} chunks, "
+              f"{len(manifest['sources'])} source file(s), model {manifest['embedding_model']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import json
+import mmap
+import os
+import numpy as np
+from langchain.schema.document import Document
+from filters import matches_where
+
+# A shard version directory holding these files is served from a snapshot
+# instead of a Chroma database. See snapshot.py for export and import.
+SNAPSHOT_FILE = "snapshot.json"
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.npy"
+SNAPSHOT_FORMAT = "rag-index-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotStore:
+    """Read-only vector store over a memory-mapped index snapshot
+
+    Opening only maps the files and checks their shapes against the manifest,
+    so it takes milliseconds regardless of corpus size. Searches are exact
+    (brute force) and return squared L2 distances, the same scores as
+    Chroma's default space, so results merge cleanly across shard types.
+    Chunk records are parsed on demand through a row offset index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, SNAPSHOT_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not an index snapshot")
+        if self.manifest.get("version", 0) > SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot format version {self.manifest['version']} is newer than this program supports")
+
+        count = self.manifest["count"]
+        dimensions = self.manifest["dimensions"]
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        if self.vectors.shape != (count, dimensions) or self.offsets.shape != (count + 1,):
+            raise ValueError(f"Snapshot at {path} does not match its manifest")
+
+        records_path = os.path.join(path, RECORDS_FILE)
+        if os.path.getsize(records_path) != int(self.offsets[-1]):
+            raise ValueError(f"Snapshot records at {path} are truncated")
+        with open(records_path, "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else b""
+
+        self._squared_norms = None
+        self._metadatas = None
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    def record(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return json.loads(self._records[start:end])
+
+    @property
+    def metadatas(self):
+        # Only needed for filtered searches; parsed once, on first use.
+        if self._metadatas is None:
+            self._metadatas = [self.record(index)["metadata"] for index in range(len(self))]
+        return self._metadatas
+
+    def _distances(self, query, rows=None):
+        if self._squared_norms is None:
+            self._squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        norms = self._squared_norms if rows is None else self._squared_norms[rows]
+        return norms - 2 * (vectors @ query) + float(query @ query)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        if not len(self):
+            return []
+        query = np.asarray(embedding, dtype=self.vectors.dtype)
+
+        rows = None
+        if filter:
+            rows = np.array([index for index, metadata in enumerate(self.metadatas)
+                             if matches_where(metadata, filter)], dtype=np.int64)
+            if not len(rows):
+                return []
+
+        distances = self._distances(query, rows)
+        k = min(k, len(distances))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.argsort(distances[best])]
+
+        results = []
+        for position in best:
+            index = int(rows[position]) if rows is not None else int(position)
+            record = self.record(index)
+            results.append((Document(page_content=record["text"], metadata=record["metadata"]),
+                            float(distances[position])))
+        return results
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs):
+        """Subset of Chroma.get: filter by ids/where, include metadatas, documents, embeddings"""
+        include = ["metadatas", "documents"] if include is None else include
+        wanted = set(ids) if ids is not None else None
+
+        result = {"ids": [], "metadatas": [], "documents": [], "embeddings": []}
+        for index in range(len(self)):
+            record = self.record(index)
+            if wanted is not None and record["id"] not in wanted:
+                continue
+            if where and not matches_where(record["metadata"], where):
+                continue
+            result["ids"].append(record["id"])
+            result["metadatas"].append(record["metadata"])
+            result["documents"].append(record["text"])
+            if "embeddings" in include:
+                result["embeddings"].append(self.vectors[index])
+
+        start = offset or 0
+        end = start + limit if limit is not None else None
+        for key in result:
+            result[key] = result[key][start:end]
+        for key in ("metadatas", "documents", "embeddings"):
+            if key not in include:
+                result[key] = None
+        return result
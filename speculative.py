@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEBOUNCE_SECONDS = 0.4
+MIN_QUERY_CHARS = 8
+CACHE_SIZE = 16
+# A submitted question may add up to this many characters to a prefetched
+# one (e.g. finishing the last word) and still reuse its results.
+MAX_EXTENSION_CHARS = 8
+
+
+def normalize_query(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", (text or "").lower()).strip()
+    return text.rstrip("?.!,;: ")
+
+
+class SpeculativeRetriever:
+    """Prefetch retrieval for the question being typed
+
+    Call update() whenever the text changes. Once typing pauses for
+    `debounce` seconds the current text is retrieved in the background and
+    cached. take() then returns results for a submitted question that
+    matches (or slightly extends) a prefetched one, waiting for an in-flight
+    prefetch if there is one, so the search doesn't run twice.
+
+    options is a hashable tuple of everything else that changes the results
+    (k, shards, filters); results are only reused when it matches exactly.
+    """
+
+    def __init__(self, retrieve_fn, debounce=DEBOUNCE_SECONDS, min_chars=MIN_QUERY_CHARS,
+                 cache_size=CACHE_SIZE, max_extension_chars=MAX_EXTENSION_CHARS):
+        self.retrieve_fn = retrieve_fn
+        self.debounce = debounce
+        self.min_chars = min_chars
+        self.cache_size = cache_size
+        self.max_extension_chars = max_extension_chars
+
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0
+        self._cache = OrderedDict()  # (normalized text, options) -> (results, seconds)
+        self._in_flight = {}         # (normalized text, options) -> Future
+        # One worker, so bursts of typing queue up instead of running in parallel;
+        # anything superseded by newer text is skipped before it starts.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+        self.stats = {'prefetches': 0, 'cancelled': 0, 'hits': 0, 'misses': 0, 'saved_seconds': 0.0}
+
+    def update(self, text, options=()):
+        """The question text changed; restart the debounce timer"""
+        key = (normalize_query(text), options)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if len(key[0]) < self.min_chars or key in self._cache or key in self._in_flight:
+                return
+            self._timer = threading.Timer(self.debounce, self._schedule, args=(key, text, generation))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def reserve(self, text, options=()):
+        """Keep an already scheduled prefetch of a submitted question alive
+
+        Call before clearing the input box, whose update() would otherwise
+        mark that prefetch as stale.
+        """
+        key = (normalize_query(text), options)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                future.wanted = True
+
+    def cancel(self):
+        """Drop pending speculative work, e.g. once a question is submitted"""
+        with self._lock:
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _schedule(self, key, text, generation):
+        with self._lock:
+            if generation != self._generation or key in self._in_flight:
+                return
+            future = self._executor.submit(self._prefetch, key, text, generation)
+            self._in_flight[key] = future
+
+    def _prefetch(self, key, text, generation):
+        try:
+            with self._lock:
+                # Superseded while queued, and nobody is waiting on it.
+                if generation != self._generation and not getattr(self._in_flight.get(key), 'wanted', False):
+                    self.stats['cancelled'] += 1
+                    return None
+                self.stats['prefetches'] += 1
+
+            start = time.perf_counter()
+            results = self.retrieve_fn(text, key[1])
+            seconds = time.perf_counter() - start
+
+            with self._lock:
+                self._cache[key] = (results, seconds)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return results, seconds
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _find(self, normalized, options):
+        """Exact match first, then the longest prefetched prefix within the allowed extension"""
+        if (normalized, options) in self._cache:
+            return (normalized, options), self._cache[(normalized, options)]
+        for candidate in sorted(self._cache, key=lambda item: -len(item[0])):
+            text, candidate_options = candidate
+            if (candidate_options == options and normalized.startswith(text)
+                    and len(normalized) - len(text) <= self.max_extension_chars):
+                return candidate, self._cache[candidate]
+        return None, None
+
+    def take(self, text, options=()):
+        """Return (results, seconds saved) for a submitted question, or None
+
+        Blocks only when the exact question is still being prefetched; the
+        saving is then the part of the retrieval that ran before submission.
+        """
+        normalized = normalize_query(text)
+        wait_start = time.perf_counter()
+        with self._lock:
+            key, hit = self._find(normalized, options)
+            future = None if hit else self._in_flight.get((normalized, options))
+            if future is not None:
+                future.wanted = True
+
+        if future is not None:
+            try:
+                prefetched = future.result()
+            except Exception:
+                prefetched = None
+            if prefetched is not None:
+                hit = prefetched
+                key = (normalized, options)
+
+        if hit is None:
+            self.stats['misses'] += 1
+            return None
+
+        results, seconds = hit
+        saved = max(0.0, seconds - (time.perf_counter() - wait_start))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['saved_seconds'] += saved
+        return results, saved
+
+    def clear(self):
+        """Forget prefetched results, e.g. after the database changed"""
+        with self._lock:
+            self._cache.clear()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,353 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from database import DATA_PATH, RebuildCancelled, indexed_sources, ingest_files
+from shards import list_shards, shard_built_at, shard_path, valid_shard_name
+from snapshot_store import SNAPSHOT_FILE
+
+DEBOUNCE_SECONDS = 2.0
+POLL_INTERVAL = 2.0
+# A batch that failed to ingest is retried after this, doubling up to RETRY_MAX_SECONDS.
+RETRY_SECONDS = 30.0
+RETRY_MAX_SECONDS = 600.0
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+# IN_MODIFY so every write of a slow copy restarts the debounce.
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def watched_folders(data_path):
+    """The content folder and its shard sub-folders"""
+    folders = [data_path]
+    for name in sorted(os.listdir(data_path)):
+        folder = os.path.join(data_path, name)
+        # Same rule as database.discover_shards, hidden folders are not shards.
+        if valid_shard_name(name) and os.path.isdir(folder):
+            folders.append(folder)
+    return folders
+
+
+def scan_pdfs(data_path):
+    """Map every PDF the ingest pipeline would see to its (mtime, size)"""
+    snapshot = {}
+    for folder in watched_folders(data_path):
+        for filename in os.listdir(folder):
+            path = os.path.join(folder, filename)
+            if filename.endswith('.pdf') and os.path.isfile(path):
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+class PollingBackend:
+    """Portable fallback, asks for a full rescan every interval"""
+
+    name = "polling"
+
+    def __init__(self, data_path, interval=POLL_INTERVAL):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(self.interval)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyBackend:
+    """Linux inotify through libc, reports only the paths that were touched"""
+
+    name = "inotify"
+
+    def __init__(self, data_path):
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.data_path = data_path
+        self.folders = {}
+        for folder in watched_folders(data_path):
+            self._watch(folder)
+
+    def _watch(self, folder):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {folder}")
+        self.folders[wd] = folder
+
+    def wait(self, timeout):
+        """Return the touched PDF paths, or None when a full rescan is needed"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        data = os.read(self.fd, 64 * 1024)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+            folder = self.folders.get(wd)
+            if folder is None or not name:
+                continue
+
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                # A new shard folder; watch it and pick up whatever is already inside.
+                if mask & (IN_CREATE | IN_MOVED_TO) and folder == self.data_path and valid_shard_name(name):
+                    self._watch(path)
+                    return None
+            elif name.endswith('.pdf'):
+                paths.add(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_backend(data_path, force_polling=False, poll_interval=POLL_INTERVAL):
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyBackend(data_path)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify unavailable ({e}), falling back to polling")
+    return PollingBackend(data_path, poll_interval)
+
+
+class ContentWatcher:
+    """Background auto-ingest for PDFs dropped into the content folder
+
+    File events are debounced per file, so a PDF is only ingested once it has
+    stopped changing for `debounce` seconds. Ready files are coalesced into
+    batches and handed to database.ingest_files on a separate thread, so a
+    slow ingest never makes the watcher miss events.
+    """
+
+    def __init__(self, data_path=None, debounce=DEBOUNCE_SECONDS, force_polling=False,
+                 poll_interval=POLL_INTERVAL, on_batch=None, on_error=None, ingest_kwargs=None):
+        self.data_path = data_path or DATA_PATH
+        self.debounce = debounce
+        self.force_polling = force_polling
+        self.poll_interval = poll_interval
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.ingest_kwargs = ingest_kwargs or {}
+
+        self.backend = None
+        self.stop_event = threading.Event()
+        self.batches = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}  # path -> (removed, time of last change)
+        self._queued_files = 0
+        self._failed_batches = 0
+        self._threads = []
+        self.stats = {'batches': 0, 'files_ingested': 0, 'files_removed': 0, 'errors': 0}
+
+    @property
+    def queue_depth(self):
+        """Files seen but not ingested yet, debouncing or waiting in a batch"""
+        with self._lock:
+            return len(self._pending) + self._queued_files
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        os.makedirs(self.data_path, exist_ok=True)
+        self.stop_event.clear()
+        self.backend = create_backend(self.data_path, self.force_polling, self.poll_interval)
+        self._snapshot = scan_pdfs(self.data_path)
+        self._threads = [
+            threading.Thread(target=self._watch_loop, name="content-watcher", daemon=True),
+            threading.Thread(target=self._ingest_loop, name="content-ingest", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"👁️ Watching '{self.data_path}' for PDFs ({self.backend.name})")
+
+    def stop(self, timeout=None):
+        """Stop watching; an ingest in progress is cancelled"""
+        self.stop_event.set()
+        self.batches.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.backend is not None:
+            self.backend.close()
+
+    def _check_paths(self, paths):
+        """Compare paths with the last snapshot and record what changed"""
+        now = time.monotonic()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature = (stat.st_mtime, stat.st_size)
+            except FileNotFoundError:
+                signature = None
+
+            if signature == self._snapshot.get(path):
+                continue
+            if signature is None:
+                self._snapshot.pop(path, None)
+            else:
+                self._snapshot[path] = signature
+            with self._lock:
+                self._pending[path] = (signature is None, now)
+
+    def _reconcile(self):
+        """Queue what changed while the watcher wasn't running
+
+        PDFs no shard holds, or changed after their shard was built, are
+        ingested; indexed PDFs that are gone are removed. Shards imported
+        from a snapshot are never emptied, their PDFs may live elsewhere.
+        """
+        chroma_root = self.ingest_kwargs.get("chroma_root")
+        indexed = {}
+        for shard in list_shards(chroma_root):
+            built_at = shard_built_at(shard, chroma_root)
+            imported = os.path.exists(os.path.join(shard_path(shard, chroma_root), SNAPSHOT_FILE))
+            for source in indexed_sources(shard, chroma_root):
+                indexed[os.path.normpath(source)] = (source, built_at, imported)
+
+        stale = {}
+        for path, (mtime, _size) in self._snapshot.items():
+            source, built_at, _imported = indexed.get(os.path.normpath(path), (None, None, False))
+            if source is None or (built_at is not None and mtime >= built_at):
+                stale[path] = False
+        folders = {os.path.normpath(folder) for folder in watched_folders(self.data_path)}
+        for key, (source, _built_at, imported) in indexed.items():
+            if not imported and os.path.dirname(key) in folders and not os.path.exists(source):
+                stale[source] = True
+
+        if stale:
+            print(f"🔄 {len(stale)} PDF(s) changed while the watcher was stopped")
+            now = time.monotonic()
+            with self._lock:
+                for path, removed in stale.items():
+                    self._pending.setdefault(path, (removed, now))
+
+    def _watch_loop(self):
+        try:
+            self._reconcile()
+        except Exception as e:
+            print(f"⚠️ Could not compare the content folder with the index: {e}")
+        while not self.stop_event.is_set():
+            paths = self.backend.wait(self.debounce / 2)
+            if paths is None:
+                paths = set(self._snapshot) | set(scan_pdfs(self.data_path))
+            self._check_paths(paths)
+
+            # Everything that has been quiet for the debounce period goes out as one batch.
+            now = time.monotonic()
+            with self._lock:
+                ready = {path: removed for path, (removed, changed_at) in self._pending.items()
+                         if now - changed_at >= self.debounce}
+                for path in ready:
+                    del self._pending[path]
+                self._queued_files += len(ready)
+            if ready:
+                self.batches.put(ready)
+
+    def _ingest_loop(self):
+        while not self.stop_event.is_set():
+            batch = self.batches.get()
+            if batch is None:
+                break
+
+            # Coalesce batches that piled up while the last ingest was running.
+            # A file queued in several of them counts once per batch.
+            queued = len(batch)
+            while True:
+                try:
+                    more = self.batches.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self.stop_event.set()
+                    break
+                queued += len(more)
+                batch.update(more)
+
+            changed = sorted(path for path, removed in batch.items() if not removed)
+            removed = sorted(path for path, removed in batch.items() if removed)
+            try:
+                ingest_files(changed, removed, data_path=self.data_path,
+                             cancel_event=self.stop_event, **self.ingest_kwargs)
+                self._failed_batches = 0
+                self.stats['batches'] += 1
+                self.stats['files_ingested'] += len(changed)
+                self.stats['files_removed'] += len(removed)
+                if self.on_batch:
+                    self.on_batch(changed, removed)
+            except RebuildCancelled:
+                break
+            except Exception as e:
+                self.stats['errors'] += 1
+                self._failed_batches += 1
+                delay = min(RETRY_SECONDS * 2 ** (self._failed_batches - 1), RETRY_MAX_SECONDS)
+                print(f"⚠️ Auto-ingest failed, retrying in {delay:.0f}s: {e}")
+                # Back to debouncing, a newer change to a file takes precedence.
+                retry_at = time.monotonic() + delay
+                with self._lock:
+                    for path, is_removed in batch.items():
+                        self._pending.setdefault(path, (is_removed, retry_at))
+                if self.on_error:
+                    self.on_error(e)
+            finally:
+                with self._lock:
+                    self._queued_files -= queued
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the content folder and ingest new or changed PDFs.")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS,
+                        help="Seconds a file must stay unchanged before it is ingested.")
+    parser.add_argument("--poll", action="store_true", help="Use polling instead of inotify.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Polling interval in seconds.")
+    args = parser.parse_args()
+
+    def report(changed, removed):
+        print(f"📥 Ingested {len(changed)} file(s), removed {len(removed)} "
+              f"(queue depth {watcher.queue_depth})")
+
+    watcher = ContentWatcher(debounce=args.debounce, force_polling=args.poll,
+                             poll_interval=args.interval, on_batch=report)
+    watcher.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping watcher...")
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()